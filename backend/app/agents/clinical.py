@@ -1,8 +1,19 @@
 from typing import TypedDict, List, Optional
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from .tools import rag_tool, web_search_tool, log_agent_event
+from .events import emit_event, REPLY_CONFIG
+from .context import build_context, context_event, content_text
+from .resilience import LLMUnavailable, UNAVAILABLE_REPLY
+from ..rag.answer_cache import answer_cache, context_key, SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_MIN_WORDS
+from ..rag.prefetch import retrieval_prefetch
+from ..concurrency import run_blocking
+from ..metrics import span, cache_lookups_total
+from ..patient_context import patient_context
+import asyncio
 import json
+import logging
+import os
+import time
 
 class AgentState(TypedDict):
     session_id: str
@@ -11,10 +22,22 @@ class AgentState(TypedDict):
     current_agent: str
     handoff_to_clinical: bool
     user_name: Optional[str]
+    conversation_summary: Optional[str]
+    summarized_count: int
+    summarized_tokens: int
 
 from .llm import get_llm
 
-llm = get_llm()
+logger = logging.getLogger(__name__)
+
+# Tools the clinical model may call, and how long each may take. All calls in one
+# model response run concurrently; one that times out is cancelled and reported
+# to the synthesis call as an error instead of holding up the others.
+TOOLS = {"rag_tool": rag_tool, "web_search_tool": web_search_tool}
+TOOL_TIMEOUTS = {
+    "rag_tool": float(os.environ.get("RAG_TOOL_TIMEOUT", "10")),
+    "web_search_tool": float(os.environ.get("WEB_SEARCH_TOOL_TIMEOUT", "8")),
+}
 
 CLINICAL_SYSTEM_PROMPT = """You are a Clinical AI assistant for nephrology patients.
 You have access to a RAG tool (nephrology reference) and a Web Search tool.
@@ -28,24 +51,20 @@ Rules:
 Patient Context: {patient_context}
 """
 
-def clinical_node(state: AgentState):
+async def clinical_node(state: AgentState):
     try:
-        return _clinical_node_impl(state)
+        return await _clinical_node_impl(state)
+    except LLMUnavailable as e:
+        logger.warning("Clinical agent unavailable: %s", e)
+        return {"messages": [{"role": "assistant", "content": UNAVAILABLE_REPLY, "agent": "clinical"}]}
     except Exception as e:
-        print(f"CRITICAL ERROR in clinical_node: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in clinical_node: %s", e)
         return {
             "messages": [{"role": "assistant", "content": f"I encountered a system error: {str(e)}. Please try again.", "agent": "clinical"}]
         }
 
-def _clinical_node_impl(state: AgentState):
+async def _clinical_node_impl(state: AgentState):
     messages = state['messages']
-    patient_data = state.get('patient_data')
-    
-    lc_messages = [SystemMessage(content=CLINICAL_SYSTEM_PROMPT.format(
-        patient_context=json.dumps(patient_data) if patient_data else "Unknown"
-    ))]
     
     # Filter out the last message if it is an assistant message (likely the handoff message)
     # so that the conversation ends with a user message, satisfying Gemini's requirement.
@@ -53,73 +72,186 @@ def _clinical_node_impl(state: AgentState):
     if conversation_messages and conversation_messages[-1]['role'] == 'assistant':
         conversation_messages.pop()
 
-    for m in conversation_messages:
-        if m['role'] == 'user':
-            lc_messages.append(HumanMessage(content=m['content']))
-        else:
-            lc_messages.append(AIMessage(content=m['content']))
+    # Same question (semantically) from the same patient after the same reply:
+    # reuse the answer and skip the summary, retrieval and both LLM calls
+    cached_answer, cache_vector, cache_key = await _cache_probe(state, conversation_messages)
+    if cached_answer is not None:
+        return {
+            "messages": [{"role": "assistant", "content": cached_answer, "agent": "clinical"}]
+        }
 
-    # Filter out empty messages just in case
-    lc_messages = [m for m in lc_messages if m.content and str(m.content).strip()]
-    
+    # Recent turns verbatim, older ones as a rolling summary
+    context = await build_context(get_llm(), state, _system_prompt(state), conversation_messages)
+    await log_agent_event(state['session_id'], "clinical", "prompt_context", context_event(context))
+
+    update = await _clinical_turn(state, context.messages, cache_vector, cache_key)
+    update.update(context.state_update)
+    return update
+
+def _system_prompt(state: AgentState) -> str:
+    # Cached per patient record version, so the prompt prefix is identical every turn
+    patient = patient_context(state.get('patient_data'))
+    return CLINICAL_SYSTEM_PROMPT.format(patient_context=f"\n{patient.clinical}" if patient else "Unknown")
+
+async def _cache_probe(state: AgentState, conversation: list):
+    """Returns (cached answer or None, vector, key) for the latest user question."""
+    if not conversation or conversation[-1]['role'] != 'user':
+        return None, None, None
+    question = content_text(conversation[-1]['content'])
+    if not SEMANTIC_CACHE_ENABLED or len(question.split()) < SEMANTIC_CACHE_MIN_WORDS:
+        return None, None, None
+    previous = next((content_text(m['content']) for m in reversed(conversation[:-1]) if m['role'] == 'assistant'), "")
+    key = context_key(state.get('patient_data'), state['session_id'], previous)
+    with span("cache", "semantic_answer") as cache_span:
+        try:
+            vector = await run_blocking(answer_cache.embed, question)
+        except Exception as e:
+            logger.warning("Semantic cache unavailable: %s", e)
+            return None, None, None
+        cached = answer_cache.lookup(vector, key)
+        cache_span.set(hit=cached is not None)
+    cache_lookups_total.inc(cache="semantic_answer", result="hit" if cached else "miss")
+    if cached:
+        answer, similarity = cached
+        await log_agent_event(state['session_id'], "clinical", "semantic_cache_hit", {
+            "question": question, "similarity": round(similarity, 4), "context_key": key
+        })
+        return answer, vector, key
+    return None, vector, key
+
+async def _clinical_turn(state: AgentState, lc_messages: list, cache_vector=None, cache_key=None):
+    messages = state['messages']
+    patient_data = state.get('patient_data')
+
+    llm = get_llm()
     llm_with_tools = llm.bind_tools([rag_tool, web_search_tool])
     
     try:
-        response = llm_with_tools.invoke(lc_messages)
+        with span("llm", "clinical") as llm_span:
+            response = await llm_with_tools.ainvoke(lc_messages, config=REPLY_CONFIG)
+            llm_span.record_usage(response)
+    except LLMUnavailable:
+        # Provider slow or down, already retried: a shorter prompt won't help
+        raise
     except Exception as e:
-        print(f"LLM Invoke Error: {e}")
+        logger.warning("LLM invoke error, retrying with the last user message only: %s", e)
         # Fallback: try sending just the last user message if history is causing issues
         user_msgs = [m for m in messages if m['role'] == 'user']
         if user_msgs:
             last_user_msg = user_msgs[-1]
             fallback_msgs = [
-                SystemMessage(content=CLINICAL_SYSTEM_PROMPT.format(
-                    patient_context=json.dumps(patient_data) if patient_data else "Unknown"
-                )),
+                SystemMessage(content=_system_prompt(state)),
                 HumanMessage(content=last_user_msg['content'])
             ]
-            response = llm_with_tools.invoke(fallback_msgs)
+            with span("llm", "clinical_fallback") as llm_span:
+                response = await llm_with_tools.ainvoke(fallback_msgs, config=REPLY_CONFIG)
+                llm_span.record_usage(response)
         else:
             raise e
     
     if response.tool_calls:
-        for tool_call in response.tool_calls:
-            tool_name = tool_call['name']
-            tool_args = tool_call['args']
-            
-            log_agent_event(state['session_id'], "clinical", tool_name, tool_args)
-            
-            if tool_name == 'rag_tool':
-                # Pass patient context to RAG
-                if patient_data:
-                    tool_args['patient_context'] = f"Diagnosis: {patient_data.get('diagnosis')}, Meds: {patient_data.get('medications')}"
-                
-                result_json = rag_tool.invoke(tool_args)
-                result = json.loads(result_json)
-                
-                # Generate final answer based on RAG result
-                rag_messages = lc_messages + [
-                    AIMessage(content="", tool_calls=[tool_call]),
-                    HumanMessage(content=f"Tool Output: {result_json}")
-                ]
-                final_response = llm.invoke(rag_messages)
-                return {
-                    "messages": [{"role": "assistant", "content": final_response.content, "agent": "clinical"}]
-                }
-
-            elif tool_name == 'web_search_tool':
-                result_json = web_search_tool.invoke(tool_args)
-                
-                web_messages = lc_messages + [
-                    AIMessage(content="", tool_calls=[tool_call]),
-                    HumanMessage(content=f"Tool Output: {result_json}")
-                ]
-                final_response = llm.invoke(web_messages)
-                return {
-                    "messages": [{"role": "assistant", "content": final_response.content, "agent": "clinical"}]
-                }
+        tool_calls = [_prepare_tool_call(tool_call, patient_data) for tool_call in response.tool_calls]
+        for tool_call in tool_calls:
+            await emit_event("tool_call", {"agent": "clinical", "tool": tool_call['name'], "args": dict(tool_call['args'])})
+
+        started = time.perf_counter()
+        prefetched = await _prefetched_results(state, tool_calls)
+        with span("tool", "parallel", tools=len(tool_calls)):
+            results = await asyncio.gather(*(
+                _done(prefetched[i]) if i in prefetched else _run_tool(tool_call)
+                for i, tool_call in enumerate(tool_calls)
+            ))
+        await log_agent_event(state['session_id'], "clinical", "tool_calls", {
+            "calls": [{k: v for k, v in result.items() if k != "output"} for result in results],
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+        # One synthesis call over every tool's output
+        synthesis_messages = lc_messages + [
+            AIMessage(content="", tool_calls=tool_calls),
+            HumanMessage(content=_tool_output_message(results))
+        ]
+        tools_used = ",".join(result["tool"] for result in results)
+        with span("llm", "clinical_answer", tool=tools_used) as llm_span:
+            final_response = await llm.ainvoke(synthesis_messages, config=REPLY_CONFIG)
+            llm_span.record_usage(final_response)
+        # Only answers grounded purely in the knowledge base are cached; web results go stale
+        kb_only = all(result["tool"] == "rag_tool" and result["status"] == "ok" for result in results)
+        if kb_only and cache_vector is not None and final_response.content:
+            answer_cache.store(cache_vector, cache_key, final_response.content)
+        return {
+            "messages": [{"role": "assistant", "content": final_response.content, "agent": "clinical"}]
+        }
 
     # If no tool called, just chat (but prompt says MUST use tools for medical stuff)
     return {
         "messages": [{"role": "assistant", "content": response.content, "agent": "clinical"}]
     }
+
+def _prepare_tool_call(tool_call: dict, patient_data: Optional[dict]) -> dict:
+    args = dict(tool_call['args'])
+    patient = patient_context(patient_data)
+    if tool_call['name'] == 'rag_tool' and patient:
+        # Pass patient context to RAG
+        args['patient_context'] = patient.rag
+    return {**tool_call, "args": args}
+
+async def _prefetched_results(state: AgentState, tool_calls: list) -> dict:
+    """Results staged by the retrieval prefetch for rag_tool calls, by tool call index."""
+    session_id = state['session_id']
+    rag_calls = [i for i, tool_call in enumerate(tool_calls) if tool_call['name'] == 'rag_tool']
+    if not rag_calls or not retrieval_prefetch.has_entries(session_id):
+        return {}
+    prefetched = {}
+    for i in rag_calls:
+        # Match the query the model actually issued, not the patient's whole message:
+        # "Can I take ibuprofen with lisinopril?" must not get the lisinopril passages
+        query = str(tool_calls[i]['args'].get('question', ''))
+        if not query:
+            continue
+        try:
+            query_vector = await run_blocking(answer_cache.embed, query)
+        except Exception as e:
+            logger.warning("Could not embed the rag_tool query for the retrieval prefetch: %s", e)
+            return prefetched
+        staged = retrieval_prefetch.lookup(session_id, query_vector)
+        if staged is not None:
+            prefetched[i] = {"tool": "rag_tool", "args": tool_calls[i]['args'], "status": "ok", "prefetched": True,
+                             "output": json.dumps(staged), "elapsed_ms": 0.0}
+    return prefetched
+
+async def _done(result: dict) -> dict:
+    return result
+
+async def _run_tool(tool_call: dict) -> dict:
+    """Runs one tool call under its timeout. Never raises; failures come back as status/error."""
+    name = tool_call['name']
+    result = {"tool": name, "args": tool_call['args'], "status": "ok"}
+    started = time.perf_counter()
+    tool = TOOLS.get(name)
+    if tool is None:
+        result.update(status="error", error=f"unknown tool {name}")
+    else:
+        try:
+            # Embedding + Chroma search is CPU/disk bound, keep it off the event loop.
+            # On timeout the await is cancelled; a thread already running finishes
+            # in the background and its result is dropped.
+            result["output"] = await asyncio.wait_for(
+                run_blocking(tool.invoke, tool_call['args']), timeout=TOOL_TIMEOUTS.get(name, 10.0))
+        except asyncio.TimeoutError:
+            logger.warning("Tool %s timed out after %.1fs", name, TOOL_TIMEOUTS.get(name, 10.0))
+            result.update(status="timeout", error="timed out")
+        except Exception as e:
+            logger.warning("Tool %s failed: %s", name, e)
+            result.update(status="error", error=str(e))
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+def _tool_output_message(results: list) -> str:
+    if len(results) == 1 and results[0]["status"] == "ok":
+        return f"Tool Output: {results[0]['output']}"
+    parts = []
+    for result in results:
+        output = result["output"] if result["status"] == "ok" else json.dumps({"error": result["error"]})
+        parts.append(f"[{result['tool']}] {output}")
+    return "Tool Output:\n" + "\n".join(parts)
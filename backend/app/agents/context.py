@@ -0,0 +1,135 @@
+import logging
+import os
+from dataclasses import dataclass
+
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+from ..metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Prompt context for the agent nodes: the most recent messages verbatim, within a
+# message and token budget, plus a rolling summary of everything older. The
+# summary lives in graph state and is extended a batch of messages at a time, so
+# the prompt stays roughly constant in size however long the session runs.
+CONTEXT_WINDOW_MESSAGES = int(os.environ.get("CONTEXT_WINDOW_MESSAGES", "12"))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "2000"))
+SUMMARY_BATCH_MESSAGES = int(os.environ.get("SUMMARY_BATCH_MESSAGES", "6"))
+
+SUMMARY_PROMPT = """You maintain a running summary of a chat between a post-discharge kidney patient and a hospital assistant.
+Merge the new messages into the existing summary. Keep what the assistant will need later: who the patient is,
+symptoms and concerns raised, questions already answered and the advice given.
+Write at most 120 words in the third person, with no preamble."""
+
+@dataclass
+class PromptContext:
+    messages: list       # LangChain messages to send to the model
+    state_update: dict   # summary fields to write back into the graph state
+    prompt_tokens: int   # estimated size of `messages`
+    history_tokens: int  # estimated size had the whole history been sent
+
+def content_text(content) -> str:
+    """Text of a message's content; Gemini may return a list of blocks, of which only text blocks count."""
+    if isinstance(content, list):
+        return " ".join(block["text"] for block in content
+                        if isinstance(block, dict) and block.get("type", "text") == "text" and block.get("text"))
+    return str(content or "")
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; close enough for budgeting
+    return (len(text) + 3) // 4
+
+def _to_lc_message(message: dict):
+    if message['role'] == 'user':
+        return HumanMessage(content=message['content'])
+    return AIMessage(content=message['content'])
+
+def _window_start(messages: list, start: int) -> int:
+    """Index of the oldest message kept verbatim, counting back from the newest."""
+    used = 0
+    index = len(messages)
+    while index > start and len(messages) - index < CONTEXT_WINDOW_MESSAGES:
+        cost = estimate_tokens(content_text(messages[index - 1]['content']))
+        # The newest message is always kept, even if it alone is over budget
+        if used + cost > CONTEXT_TOKEN_BUDGET and index < len(messages):
+            break
+        used += cost
+        index -= 1
+    # Gemini expects the conversation to open with a user turn
+    while index < len(messages) - 1 and messages[index]['role'] != 'user':
+        index += 1
+    return index
+
+async def _summarize(llm, summary: str, messages: list) -> str:
+    transcript = "\n".join(
+        f"{'Patient' if m['role'] == 'user' else 'Assistant'}: {content_text(m['content'])}" for m in messages
+    )
+    with span("llm", "summary") as llm_span:
+        response = await llm.ainvoke([
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content=f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}")
+        ])
+        llm_span.record_usage(response)
+    return content_text(response.content).strip()
+
+async def build_context(llm, state: dict, system_prompt: str, conversation: list) -> PromptContext:
+    """
+    Builds the prompt for a node. `conversation` is state['messages'] or a prefix
+    of it; messages before state['summarized_count'] are already in the summary.
+    """
+    summary = state.get("conversation_summary") or ""
+    summarized = min(state.get("summarized_count") or 0, len(conversation))
+    # Size of the messages compacted out of the state on earlier turns
+    summarized_tokens = state.get("summarized_tokens") or 0
+    history_tokens = estimate_tokens(system_prompt) + summarized_tokens + sum(
+        estimate_tokens(content_text(m['content'])) for m in state['messages']
+    )
+
+    window_start = _window_start(conversation, summarized)
+    # Fold in batches so the summary costs one extra LLM call every few turns
+    if window_start - summarized >= SUMMARY_BATCH_MESSAGES:
+        try:
+            folded = conversation[summarized:window_start]
+            summary = await _summarize(llm, summary, folded)
+            summarized = window_start
+            summarized_tokens += sum(estimate_tokens(content_text(m['content'])) for m in folded)
+        except Exception as e:
+            # Keep the unsummarized messages in the prompt and try again next turn
+            logger.warning("Conversation summary update failed: %s", e)
+
+    if summary:
+        system_prompt = f"{system_prompt}\nSummary of the earlier conversation:\n{summary}\n"
+    lc_messages = [SystemMessage(content=system_prompt)]
+    # Everything not yet in the summary goes out verbatim: the window, plus any
+    # older messages waiting for the next batch or left by a failed summary call
+    lc_messages += [_to_lc_message(m) for m in conversation[summarized:]]
+    # Filter out empty messages just in case
+    lc_messages = [m for m in lc_messages if m.content and str(m.content).strip()]
+
+    prompt_tokens = sum(estimate_tokens(content_text(m.content)) for m in lc_messages)
+    return PromptContext(
+        messages=lc_messages,
+        state_update={
+            "conversation_summary": summary,
+            "summarized_count": summarized,
+            "summarized_tokens": summarized_tokens,
+        },
+        prompt_tokens=prompt_tokens,
+        history_tokens=history_tokens,
+    )
+
+def context_event(context: PromptContext) -> dict:
+    """Details for the per-turn 'prompt_context' AgentEvent."""
+    return {
+        "prompt_tokens": context.prompt_tokens,
+        "history_tokens": context.history_tokens,
+        "prompt_messages": len(context.messages),
+        "summary_tokens": estimate_tokens(context.state_update["conversation_summary"]),
+    }
+
+def compact_state(state: dict) -> dict:
+    """Drops messages already folded into the summary before the state is stored."""
+    summarized = state.get("summarized_count") or 0
+    if not summarized:
+        return state
+    return {**state, "messages": state["messages"][summarized:], "summarized_count": 0}
@@ -0,0 +1,29 @@
+from langchain_core.callbacks.manager import adispatch_custom_event
+from langchain_core.runnables.config import ensure_config
+
+from .context import content_text
+
+# LLM calls whose tokens make up the user-facing reply carry this tag, so the
+# streaming endpoint can forward them and ignore any other model calls.
+REPLY_TAG = "agent_reply"
+REPLY_CONFIG = {"tags": [REPLY_TAG]}
+
+async def emit_event(name: str, data: dict):
+    """Publishes a typed event (tool_call, handoff, ...) to astream_events listeners."""
+    try:
+        await adispatch_custom_event(name, data)
+    except RuntimeError:
+        # No parent run, e.g. the node was called directly outside the graph
+        pass
+
+async def emit_reply_text(response, config):
+    """
+    Sends a reply that didn't stream from the model (cached, or a hedged duplicate
+    that ran untagged) as one "token" event, so the streaming endpoint still shows it.
+    """
+    if not config or REPLY_TAG not in config.get("tags", []):
+        return
+    text = content_text(response.content)
+    if text:
+        node = ensure_config(config).get("metadata", {}).get("langgraph_node")
+        await emit_event("token", {"agent": node, "text": text})
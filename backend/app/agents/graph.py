@@ -1,8 +1,13 @@
 from typing import TypedDict, List, Optional, Annotated
 from langgraph.graph import StateGraph, END, START
 from operator import add
-from .receptionist import receptionist_node
+import logging
+from .intent import intent_node
+from .receptionist import receptionist_node, patient_lookup_node
 from .clinical import clinical_node
+from ..metrics import traced_node
+
+logger = logging.getLogger(__name__)
 
 class AgentState(TypedDict):
     session_id: str
@@ -11,24 +16,53 @@ class AgentState(TypedDict):
     current_agent: str
     handoff_to_clinical: bool
     user_name: Optional[str]
+    # Rolling summary of messages no longer sent verbatim (see context.py)
+    conversation_summary: Optional[str]
+    summarized_count: int
+    summarized_tokens: int
+    # Result of the local intent stage for the current turn (see intent.py)
+    intent: Optional[dict]
 
 def router(state: AgentState):
     handoff = state.get("handoff_to_clinical")
-    print(f"DEBUG: Router called. Handoff state: {handoff}")
+    logger.debug("Router called. Handoff state: %s", handoff)
     if handoff:
         return "clinical"
     return "receptionist"
 
+def route_intent(state: AgentState):
+    if state.get("handoff_to_clinical"):
+        return "clinical"
+    intent = state.get("intent") or {}
+    if intent.get("kind") == "identify":
+        return "lookup"
+    return "receptionist"
+
+def route_lookup(state: AgentState):
+    # A name given with a medical question goes on to the clinical agent; the
+    # receptionist takes the turn back when no record matched
+    if state.get("handoff_to_clinical"):
+        return "clinical"
+    intent = state.get("intent") or {}
+    if intent.get("kind") == "identify":
+        return END
+    return "receptionist"
+
 workflow = StateGraph(AgentState)
 
-workflow.add_node("receptionist", receptionist_node)
-workflow.add_node("clinical", clinical_node)
+# Each node run is recorded as a span of the turn's trace (see metrics.py)
+workflow.add_node("intent", traced_node("intent", intent_node))
+workflow.add_node("lookup", traced_node("lookup", patient_lookup_node))
+workflow.add_node("receptionist", traced_node("receptionist", receptionist_node))
+workflow.add_node("clinical", traced_node("clinical", clinical_node))
 
-# Conditional entry point based on state
+# Every turn is classified locally first; only unplaced messages reach the receptionist LLM
+workflow.add_edge(START, "intent")
 workflow.add_conditional_edges(
-    START,
-    router,
+    "intent",
+    route_intent,
     {
+        "lookup": "lookup",
         "receptionist": "receptionist",
         "clinical": "clinical"
     }
@@ -43,6 +77,15 @@ workflow.add_conditional_edges(
     }
 )
 
+workflow.add_conditional_edges(
+    "lookup",
+    route_lookup,
+    {
+        END: END,
+        "receptionist": "receptionist",
+        "clinical": "clinical"
+    }
+)
 workflow.add_edge("clinical", END)
 
 graph = workflow.compile()
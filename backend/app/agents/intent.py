@@ -0,0 +1,270 @@
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from .events import emit_event
+from .tools import log_agent_event
+from ..concurrency import run_blocking
+from ..metrics import intent_total
+
+logger = logging.getLogger(__name__)
+
+# Local intent stage in front of the agents. Most turns are either a patient
+# giving their name or a medical question; both can be recognised without asking
+# Gemini, which saves the receptionist's LLM round-trip:
+#   identify -> deterministic patient lookup, no LLM
+#   medical  -> straight to the clinical agent
+#   other    -> receptionist LLM as before
+# Rules go first; messages they can't place go to a nearest-centroid classifier
+# over the same local MiniLM embeddings used for retrieval.
+INTENT_ROUTER_ENABLED = os.environ.get("INTENT_ROUTER_ENABLED", "1").lower() in ("1", "true", "yes")
+INTENT_EMBEDDINGS_ENABLED = os.environ.get("INTENT_EMBEDDINGS_ENABLED", "1").lower() in ("1", "true", "yes")
+INTENT_MEDICAL_THRESHOLD = float(os.environ.get("INTENT_MEDICAL_THRESHOLD", "0.45"))
+INTENT_MARGIN = 0.05
+
+@dataclass
+class Intent:
+    kind: str                    # 'identify' | 'medical' | 'other'
+    source: str                  # 'rule' | 'embedding' | 'default'
+    name: Optional[str] = None   # extracted patient name for 'identify'
+    score: float = 1.0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+# A single keyword isn't enough: "Yes, I'm taking my meds" or "drinking lots of
+# water" are answers to the receptionist's check-in, and the handoff to the
+# clinical agent is sticky. A message is medical when it describes a symptom, or
+# asks a question about a medical topic.
+SYMPTOM_TERMS = {
+    "pain", "painful", "ache", "aches", "aching", "hurt", "hurts", "hurting", "swelling", "swollen", "swell",
+    "edema", "bloating", "bloated", "nausea", "nauseous", "vomit", "vomiting", "dizzy", "dizziness", "faint",
+    "fainted", "fever", "itchy", "itching", "rash", "cramp", "cramps", "cough", "coughing", "breathless",
+    "fatigue", "headache", "bleeding", "numb", "numbness", "palpitations", "chills", "blurry",
+}
+SYMPTOM_PHRASES = ("short of breath", "hard to breathe", "can't breathe", "side effect", "warning sign",
+                   "feeling tired", "feel tired", "very tired", "so tired", "feeling weak", "feel weak",
+                   "blood in", "darker than usual")
+# Asked about, these are medical: "How much water should I drink?", "Can I take ibuprofen?"
+MEDICAL_TOPICS = {
+    "urine", "urinate", "urinating", "pee", "blood", "pressure", "bp", "sugar", "glucose", "diabetes",
+    "diet", "food", "foods", "fluid", "fluids", "water", "salt", "sodium", "potassium", "phosphorus",
+    "phosphate", "protein", "banana", "bananas", "alcohol", "coffee", "medication", "medications",
+    "medicine", "medicines", "meds", "pill", "pills", "dose", "dosage", "tablet", "tablets", "prescription",
+    "drug", "drugs", "ibuprofen", "painkiller", "painkillers", "kidney", "kidneys", "renal", "dialysis",
+    "ckd", "egfr", "creatinine", "transplant", "symptom", "symptoms", "weight", "exercise", "research",
+    "treatment", "treatments", "sglt2", "infection", "tired", "weak", "breath", "breathing",
+}
+QUESTION_WORDS = {"can", "could", "should", "is", "are", "am", "do", "does", "did", "what", "whats", "how",
+                  "why", "when", "which", "will", "would", "may", "any"}
+# Questions that are medical on their own
+MEDICAL_QUESTIONS = ("should i worry", "should i be worried", "is it normal to", "latest research")
+QUESTION_PHRASES = ("question about", "wondering", "tell me about", "want to know", "not sure if")
+NEGATIONS = {"no", "not", "without", "never", "any"}
+# Medication names from the discharge records also count as medical words
+MEDICATION_SUFFIXES = ("pril", "sartan", "olol", "dipine", "statin", "semide", "mide", "formin", "flozin", "triol")
+
+# Words that follow "I'm ..." but are not names
+NOT_NAME_WORDS = {
+    "feeling", "fine", "good", "great", "ok", "okay", "well", "better", "worse", "not", "so", "very", "really",
+    "just", "still", "also", "doing", "having", "getting", "taking", "trying", "going", "worried", "scared",
+    "back", "here", "calling", "wondering", "sorry", "sure", "glad", "happy", "sad", "a", "an", "the", "in",
+    "on", "at", "from", "with", "new", "patient", "home", "bit", "little", "kind", "sort", "looking", "asking",
+    "concerned", "confused", "alright", "all", "right", "thanks", "thank", "hoping", "afraid", "unable",
+    # greetings and short replies that would otherwise pass as a bare name
+    "hi", "hello", "hey", "yes", "yeah", "yep", "no", "nope", "morning", "afternoon", "evening", "bye",
+    "goodbye", "cheers", "normal", "that", "me", "what", "who", "why", "how", "can", "could", "is", "are", "do", "does",
+    "help", "test", "testing", "nothing", "something", "anything", "nobody", "someone", "everything", "please",
+    "urgent", "emergency", "question", "problem", "done", "ready", "late", "lost", "stuck", "busy", "awake",
+    # how people describe themselves or their condition
+    "diabetic", "anxious", "pregnant", "nervous", "ridiculous", "tired", "sick", "ill", "unwell", "dizzy",
+    "nauseous", "hungry", "thirsty", "stressed", "depressed", "upset", "frustrated", "angry", "annoyed",
+    "allergic", "hypertensive", "anemic", "bored", "cold", "hot", "weak", "exhausted", "sore", "swollen",
+    "old", "young", "alone", "married", "retired", "disabled", "recovering", "struggling", "okayish",
+    # "I'm his daughter", "I'm her carer"
+    "his", "her", "their", "my", "our", "your", "daughter", "son", "wife", "husband", "mother", "father",
+    "mum", "mom", "dad", "sister", "brother", "carer", "caregiver", "nurse", "doctor", "friend", "partner",
+}
+NAME_STOP_WORDS = {"and", "i", "my", "but", "here", "please", "thanks", "thank", "calling", "from", "how", "what"}
+NAME_WORD = r"[A-Za-z][A-Za-z.'-]*"
+# "I'm ..." and bare replies only count as names when written like one
+CAPITALIZED_WORD = r"[A-Z][A-Za-z.'-]*"
+NAME_INTRO = re.compile(
+    r"\b(?:my name is|my name's|name is|call me)\s+"
+    rf"(?P<name>{NAME_WORD}(?:\s+{NAME_WORD}){{0,3}})",
+    re.IGNORECASE,
+)
+SELF_INTRO = re.compile(rf"\b(?i:i am|i'm)\s+(?P<name>{CAPITALIZED_WORD}(?:\s+{CAPITALIZED_WORD}){{0,3}})")
+BARE_NAME = re.compile(rf"^\s*(?P<name>{CAPITALIZED_WORD}(?:\s+{CAPITALIZED_WORD}){{0,3}})\s*[.!]?\s*$")
+
+MEDICAL_EXAMPLES = [
+    "I have swelling in my legs, what should I do?",
+    "Is it okay to eat bananas with my kidney condition?",
+    "Can I take ibuprofen for my headache?",
+    "I've been feeling very tired and short of breath",
+    "How much water should I drink each day?",
+    "What are the side effects of my blood pressure pills?",
+    "My urine looks darker than usual",
+    "What is the latest research on SGLT2 inhibitors?",
+    "Should I be worried about this pain in my back?",
+    "What foods are high in potassium?",
+]
+OTHER_EXAMPLES = [
+    "Hello, how are you?",
+    "Thanks, that's all for today",
+    "Good morning",
+    "Yes, that's me",
+    "No, I'm doing fine thank you",
+    "Okay, goodbye",
+    "Who am I talking to?",
+    "Can you help me?",
+    "I'm doing well today",
+    "Great, thank you so much",
+]
+
+def _words(message: str):
+    return re.findall(r"[a-z0-9]+", message.lower())
+
+def _is_question(message: str) -> bool:
+    lowered = message.lower()
+    if "?" in message or any(phrase in lowered for phrase in QUESTION_PHRASES):
+        return True
+    # "Should I worry about it getting worse" without the question mark
+    for clause in re.split(r"[.,;!]", lowered):
+        words = _words(clause)
+        if words and words[0] in QUESTION_WORDS:
+            return True
+    return False
+
+def _has_symptom(message: str) -> bool:
+    lowered = message.lower()
+    if any(phrase in lowered for phrase in SYMPTOM_PHRASES):
+        return True
+    words = _words(message)
+    # "No pain at all" answers the check-in; it doesn't raise a symptom
+    return any(word in SYMPTOM_TERMS and (i == 0 or words[i - 1] not in NEGATIONS) for i, word in enumerate(words))
+
+def _has_medical_topic(message: str) -> bool:
+    return any(word in MEDICAL_TOPICS or word in SYMPTOM_TERMS or (len(word) > 5 and word.endswith(MEDICATION_SUFFIXES))
+               for word in _words(message))
+
+def is_medical(message: str) -> bool:
+    if _has_symptom(message) or any(phrase in message.lower() for phrase in MEDICAL_QUESTIONS):
+        return True
+    return _is_question(message) and _has_medical_topic(message)
+
+def _clean_name(candidate: str) -> Optional[str]:
+    words = []
+    for word in candidate.split():
+        bare = word.strip(".'-").lower()
+        if bare in NAME_STOP_WORDS:
+            break
+        words.append(word.strip(".,"))
+    if not words or words[0].strip(".'-").lower() in NOT_NAME_WORDS:
+        return None
+    if any(w.strip(".'-").lower() in NOT_NAME_WORDS for w in words):
+        return None
+    return " ".join(words)
+
+def extract_name(message: str, asked_for_name: bool) -> Optional[str]:
+    match = NAME_INTRO.search(message) or SELF_INTRO.search(message)
+    if match:
+        return _clean_name(match.group("name"))
+    # "John Smith" on its own, right after the assistant asked for a name
+    if asked_for_name and "?" not in message:
+        match = BARE_NAME.match(message)
+        if match:
+            return _clean_name(match.group("name"))
+    return None
+
+class _EmbeddingIntentClassifier:
+    """Nearest-centroid classifier over MiniLM embeddings of the example sentences."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._centroids = None
+        self.unavailable = False
+
+    def _load(self):
+        import numpy as np
+        from ..rag.retriever import get_shared_embeddings
+
+        embeddings = get_shared_embeddings()
+        centroids = {}
+        for kind, examples in (("medical", MEDICAL_EXAMPLES), ("other", OTHER_EXAMPLES)):
+            vectors = np.asarray(embeddings.embed_documents(examples), dtype=np.float32)
+            centroid = vectors.mean(axis=0)
+            centroids[kind] = centroid / np.linalg.norm(centroid)
+        return centroids
+
+    def classify(self, message: str) -> Intent:
+        import numpy as np
+        from ..rag.retriever import get_shared_embeddings
+
+        if self._centroids is None:
+            with self._lock:
+                if self._centroids is None:
+                    self._centroids = self._load()
+        vector = np.asarray(get_shared_embeddings().embed_query(message), dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        medical = float(np.dot(vector, self._centroids["medical"]))
+        other = float(np.dot(vector, self._centroids["other"]))
+        if medical >= INTENT_MEDICAL_THRESHOLD and medical - other >= INTENT_MARGIN:
+            return Intent("medical", "embedding", score=medical)
+        return Intent("other", "embedding", score=other)
+
+embedding_classifier = _EmbeddingIntentClassifier()
+
+def classify_by_rules(message: str, patient_identified: bool, asked_for_name: bool) -> Optional[Intent]:
+    # "Hi, I'm John Smith, I have a question about my medication": find the
+    # record first, the clinical agent needs it to answer
+    if not patient_identified:
+        name = extract_name(message, asked_for_name)
+        if name:
+            return Intent("identify", "rule", name=name)
+    if is_medical(message):
+        return Intent("medical", "rule")
+    return None
+
+def classify_intent(message: str, patient_identified: bool, asked_for_name: bool) -> Intent:
+    """Blocking (may run the embedding model); call through run_blocking from async code."""
+    intent = classify_by_rules(message, patient_identified, asked_for_name)
+    if intent:
+        return intent
+    if INTENT_EMBEDDINGS_ENABLED and not embedding_classifier.unavailable:
+        try:
+            return embedding_classifier.classify(message)
+        except Exception as e:
+            # Don't retry the model load on every turn; rules keep working without it
+            embedding_classifier.unavailable = True
+            logger.warning("Embedding intent classifier unavailable: %s", e)
+    return Intent("other", "default")
+
+def _asked_for_name(messages) -> bool:
+    for msg in reversed(messages[:-1]):
+        if msg.get("role") == "assistant":
+            return "name" in str(msg.get("content", "")).lower()
+    return True  # nothing said yet: a bare name is the expected opening
+
+async def intent_node(state):
+    messages = state["messages"]
+    if not INTENT_ROUTER_ENABLED or not messages or messages[-1].get("role") != "user":
+        return {"intent": None}
+    # Already with the clinical agent; nothing to route
+    if state.get("handoff_to_clinical"):
+        return {"intent": None}
+    message = str(messages[-1].get("content", ""))
+    intent = await run_blocking(classify_intent, message, bool(state.get("patient_data")), _asked_for_name(messages))
+    intent_total.inc(kind=intent.kind, source=intent.source)
+    logger.debug("Intent router: %s (%s, score=%.2f)", intent.kind, intent.source, intent.score)
+
+    update = {"intent": intent.as_dict()}
+    if intent.kind == "medical":
+        await emit_event("handoff", {"from": "receptionist", "to": "clinical", "reason": "intent_router"})
+        await log_agent_event(state["session_id"], "receptionist", "handoff",
+                        {"reason": "intent_router", "source": intent.source, "score": round(intent.score, 3)})
+        update["handoff_to_clinical"] = True
+    return update
@@ -1,18 +1,106 @@
+import logging
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Inference backend for the local embedding model. All of them run the same
+# all-MiniLM-L6-v2 weights (with the same pooling and normalization), so vectors
+# stay close enough to search an existing chroma_db:
+#   torch       full precision PyTorch (default)
+#   torch-int8  PyTorch with dynamic int8 quantization of the Linear layers
+#   onnx        ONNX Runtime, exported model from the model repo
+#   onnx-int8   ONNX Runtime, the repo's int8-quantized export (AVX2)
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch").lower()
+# Other ONNX exports in the model repo, e.g. onnx/model_qint8_avx512_vnni.onnx
+EMBEDDING_ONNX_FILE = os.environ.get("EMBEDDING_ONNX_FILE", "")
+ONNX_FILES = {"onnx": "onnx/model.onnx", "onnx-int8": "onnx/model_quint8_avx2.onnx"}
+
+CHAT_MODEL = "gemini-2.5-flash"
+CHAT_TEMPERATURE = 0
+
+# One chat model client per process, shared by every agent node. It is created on
+# first use (or by the FastAPI lifespan hook), not at import time, because the
+# Gemini SDK is slow to import and the client isn't needed until a turn runs.
+_llm = None
+_embeddings = None
+_lock = threading.Lock()
 
 def get_llm():
+    global _llm
+    if _llm is None:
+        with _lock:
+            if _llm is None:
+                _llm = _create_llm()
+    return _llm
+
+def set_llm(llm):
+    """Replaces the shared client, e.g. with a stub model in benchmarks."""
+    global _llm
+    _llm = llm
+
+def _create_llm():
+    from .llm_cache import LLM_CACHE, cached_chat_model
+    from .resilience import resilient_chat_model
+
+    # Part of the call cache key, so captured responses match whichever client made them
+    params = {"model": CHAT_MODEL, "temperature": CHAT_TEMPERATURE}
+    if LLM_CACHE == "replay":
+        # Offline: every answer comes from captured responses, no Gemini client needed
+        return cached_chat_model(None, params)
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
     if not os.environ.get("GOOGLE_API_KEY"):
-        print("WARNING: GOOGLE_API_KEY not found. Gemini will fail.")
+        logger.warning("GOOGLE_API_KEY not found. Gemini will fail.")
     
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0,
+    llm = ChatGoogleGenerativeAI(
+        model=CHAT_MODEL,
+        temperature=CHAT_TEMPERATURE,
         google_api_key=os.environ.get("GOOGLE_API_KEY"),
-        convert_system_message_to_human=True
+        convert_system_message_to_human=True,
+        # Retries, deadlines and the circuit breaker live in resilience.py
+        max_retries=0,
     )
+    # Cache hits skip the provider, so they never wait on retries or the breaker
+    return cached_chat_model(resilient_chat_model(llm), params)
 
 def get_embeddings():
+    """The process-wide embedding service: local MiniLM behind a micro-batcher."""
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                from ..rag.embedding_service import BatchingEmbeddings
+                _embeddings = BatchingEmbeddings(create_embedding_model())
+    return _embeddings
+
+def create_embedding_model(backend: str = None):
+    """Loads the local embedding model on the configured backend (EMBEDDING_BACKEND)."""
     # Use Local HuggingFace Embeddings to avoid Gemini API Rate Limits/Quotas
     from langchain_huggingface import HuggingFaceEmbeddings
-    return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+
+    backend = backend or EMBEDDING_BACKEND
+    if backend in ONNX_FILES:
+        try:
+            # sentence-transformers runs these through optimum + onnxruntime
+            return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, model_kwargs={
+                "backend": "onnx",
+                "model_kwargs": {"file_name": EMBEDDING_ONNX_FILE or ONNX_FILES[backend]},
+            })
+        except Exception as e:
+            logger.warning("Embedding backend %s unavailable, using torch: %s", backend, e)
+            backend = "torch"
+    elif backend not in ("torch", "torch-int8"):
+        logger.warning("Unknown EMBEDDING_BACKEND %r, using torch", backend)
+        backend = "torch"
+
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    if backend == "torch-int8":
+        import torch
+        embeddings._client = torch.quantization.quantize_dynamic(embeddings._client, {torch.nn.Linear}, dtype=torch.qint8)
+    return embeddings
+
+def embedding_stats() -> dict:
+    return _embeddings.stats() if _embeddings is not None else {}
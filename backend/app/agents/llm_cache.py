@@ -0,0 +1,265 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+from .events import emit_reply_text
+from ..concurrency import run_blocking
+from ..db import BACKEND_DIR
+from ..metrics import cache_lookups_total
+
+logger = logging.getLogger(__name__)
+
+# Exact-match cache for chat model calls. The model runs at temperature 0, so a
+# call with the same messages, bound tools and model parameters can reuse the
+# earlier response. The key is a SHA-256 over a canonical JSON form of those
+# three; tool call ids are left out since the model makes them up per call.
+#   off     - every call goes to the model
+#   memory  - per-process LRU (default)
+#   on      - LRU in front of a SQLite file shared by all workers on the host
+#   record  - every call goes to the model and its response is saved to the file
+#   replay  - responses come only from the file; a miss raises LLMCacheMiss and
+#             the model is never called, so benchmarks and tests run offline
+LLM_CACHE = os.environ.get("LLM_CACHE", "memory").lower()
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join(BACKEND_DIR, "llm_cache.db"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", "1024"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "100000"))
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", "86400"))
+
+MODES = ("off", "memory", "on", "record", "replay")
+
+class LLMCacheMiss(RuntimeError):
+    pass
+
+def _message_record(message) -> dict:
+    record = {"type": message.type, "content": message.content}
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        record["tool_calls"] = [{"name": c["name"], "args": c["args"]} for c in tool_calls]
+    if message.type == "tool":
+        record["name"] = getattr(message, "name", None)
+    return record
+
+def _tool_schema(tool) -> dict:
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+    return convert_to_openai_tool(tool)
+
+def cache_key(messages, tools, params: dict) -> str:
+    payload = {
+        "messages": [_message_record(m) for m in messages],
+        "tools": tools,
+        "params": params,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def model_params(llm) -> dict:
+    return {"model": getattr(llm, "model", type(llm).__name__), "temperature": getattr(llm, "temperature", None)}
+
+class LLMCallCache:
+    """In-memory LRU with an optional SQLite tier. Responses are stored as serialized messages."""
+
+    def __init__(self, mode: str, path: str, memory_entries: int, max_entries: int, ttl_seconds: float):
+        self.mode = mode
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        # Captured responses for replay don't expire
+        self.ttl_seconds = ttl_seconds if mode in ("memory", "on") else float("inf")
+        self._memory = OrderedDict()  # key -> (created_at, serialized message)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        if self.uses_disk:
+            conn = self._conn()
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_used_at ON llm_cache (used_at)")
+            conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def uses_disk(self) -> bool:
+        return self.mode in ("on", "record", "replay")
+
+    @property
+    def reads(self) -> bool:
+        # Recording refreshes every entry from the model
+        return self.mode in ("memory", "on", "replay")
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections must not be shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, data: str, created_at: float):
+        with self._lock:
+            self._memory[key] = (created_at, data)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_memory(self, key: str):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time() - self.ttl_seconds:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+        return entry[1]
+
+    def get_disk(self, key: str):
+        """Blocking; run it off the event loop."""
+        conn = self._conn()
+        row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time() - self.ttl_seconds:
+            return None
+        with conn:
+            conn.execute("UPDATE llm_cache SET used_at = ? WHERE key = ?", (time.time(), key))
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    def put(self, key: str, data: str):
+        """Blocking when the SQLite tier is on."""
+        now = time.time()
+        self._remember(key, data, now)
+        self.stores += 1
+        if not self.uses_disk:
+            return
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, data, now, now),
+            )
+        self._writes += 1
+        # Sweep occasionally rather than on every write
+        if self.mode == "on" and self._writes % 100 == 0:
+            self._evict()
+
+    def _evict(self):
+        conn = self._conn()
+        with conn:
+            expired = conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            overflow = conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        self.evictions += expired + overflow
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.uses_disk:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            memory = len(self._memory)
+        stats = {"mode": self.mode, "memory_entries": memory, "hits": self.hits, "disk_hits": self.disk_hits,
+                 "misses": self.misses, "stores": self.stores, "evictions": self.evictions}
+        if self.uses_disk:
+            stats["disk_entries"] = self._conn().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return stats
+
+class CachingChatModel:
+    """
+    Wraps a LangChain chat model (or the runnable bind_tools returns) with the
+    call cache. Supports what the agent nodes use: bind_tools and ainvoke.
+    """
+
+    def __init__(self, llm, cache: LLMCallCache, params: dict, tools: list = None):
+        self.llm = llm
+        self.cache = cache
+        self.params = params
+        self.tools = tools or []
+
+    def bind_tools(self, tools, **kwargs):
+        schemas = [_tool_schema(t) for t in tools]
+        if kwargs:
+            schemas.append({"bind_kwargs": kwargs})
+        bound = self.llm.bind_tools(tools, **kwargs) if self.llm is not None else None
+        return CachingChatModel(bound, self.cache, self.params, self.tools + schemas)
+
+    def _cacheable(self) -> bool:
+        # Sampling at a higher temperature is meant to vary; captures replay regardless
+        temperature = self.params.get("temperature")
+        return self.cache.enabled and (not temperature or self.cache.mode in ("record", "replay"))
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        if not self._cacheable():
+            return await self.llm.ainvoke(messages, config=config, **kwargs)
+        key = cache_key(messages, self.tools, self.params)
+
+        if self.cache.reads:
+            data = self.cache.get_memory(key)
+            if data is None and self.cache.uses_disk:
+                data = await run_blocking(self.cache.get_disk, key)
+                if data is not None:
+                    self.cache.disk_hits += 1
+            if data is not None:
+                self.cache.hits += 1
+                cache_lookups_total.inc(cache="llm", result="hit")
+                response = messages_from_dict([json.loads(data)])[0]
+                # No model stream events for a cached reply
+                await emit_reply_text(response, config)
+                return response
+            self.cache.misses += 1
+            cache_lookups_total.inc(cache="llm", result="miss")
+
+        if self.cache.mode == "replay" or self.llm is None:
+            raise LLMCacheMiss(f"No captured response for LLM call {key[:12]} in {self.cache.path}")
+
+        response = await self.llm.ainvoke(messages, config=config, **kwargs)
+        # Empty replies are usually a blocked or failed generation; don't pin them
+        if response.content or getattr(response, "tool_calls", None):
+            stored = response.model_copy(update={"usage_metadata": None, "id": None})
+            data = json.dumps(messages_to_dict([stored])[0], default=str)
+            if self.cache.uses_disk:
+                await run_blocking(self.cache.put, key, data)
+            else:
+                self.cache.put(key, data)
+        return response
+
+def create_llm_cache() -> LLMCallCache:
+    mode = LLM_CACHE
+    if mode not in MODES:
+        logger.warning("Unknown LLM_CACHE '%s', using memory.", mode)
+        mode = "memory"
+    return LLMCallCache(mode, LLM_CACHE_PATH, LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL)
+
+llm_cache = create_llm_cache()
+
+def cached_chat_model(llm, params: dict = None):
+    """Puts the shared call cache in front of a chat model (a no-op with LLM_CACHE=off)."""
+    if not llm_cache.enabled:
+        return llm
+    return CachingChatModel(llm, llm_cache, params or model_params(llm))
@@ -1,9 +1,15 @@
 from typing import TypedDict, List, Optional
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from .tools import patient_db_tool, log_agent_event
+from .events import emit_event, REPLY_CONFIG
+from .intent import is_medical
+from .context import build_context, context_event, content_text
+from .resilience import LLMUnavailable, UNAVAILABLE_REPLY
+from ..concurrency import run_blocking
+from ..metrics import span
+from ..patient_context import patient_context
+from ..rag.prefetch import retrieval_prefetch, PREFETCH_ENABLED
 import json
+import logging
 
 class AgentState(TypedDict):
     session_id: str
@@ -12,10 +18,14 @@ class AgentState(TypedDict):
     current_agent: str
     handoff_to_clinical: bool
     user_name: Optional[str]
+    conversation_summary: Optional[str]
+    summarized_count: int
+    summarized_tokens: int
+    intent: Optional[dict]
 
 from .llm import get_llm
 
-llm = get_llm()
+logger = logging.getLogger(__name__)
 
 RECEPTIONIST_SYSTEM_PROMPT = """You are a hospital receptionist AI for post-discharge kidney patients.
 Your goal is to identify the patient and check on their recovery.
@@ -31,53 +41,92 @@ Tasks:
 Current Patient Data: {patient_context}
 """
 
-def receptionist_node(state: AgentState):
-    messages = state['messages']
-    patient_data = state.get('patient_data')
-    
-    # Format messages for LLM
-    lc_messages = [SystemMessage(content=RECEPTIONIST_SYSTEM_PROMPT.format(
-        patient_context=json.dumps(patient_data) if patient_data else "Not identified yet"
-    ))]
+async def receptionist_node(state: AgentState):
+    try:
+        return await _receptionist_node_impl(state)
+    except LLMUnavailable as e:
+        logger.warning("Receptionist unavailable: %s", e)
+        return {
+            "messages": [{"role": "assistant", "content": UNAVAILABLE_REPLY, "agent": "receptionist"}],
+            "handoff_to_clinical": False
+        }
+    except Exception as e:
+        logger.exception("Error in receptionist_node: %s", e)
+        return {
+            "messages": [{"role": "assistant", "content": "Sorry, something went wrong on our side. Please try again.", "agent": "receptionist"}],
+            "handoff_to_clinical": False
+        }
+
+async def _receptionist_node_impl(state: AgentState):
+    llm = get_llm()
+    patient = patient_context(state.get('patient_data'))
     
-    for m in messages:
-        if m['role'] == 'user':
-            lc_messages.append(HumanMessage(content=m['content']))
-        else:
-            lc_messages.append(AIMessage(content=m['content']))
+    # Format messages for LLM: recent turns verbatim, older ones as a rolling summary
+    context = await build_context(llm, state, RECEPTIONIST_SYSTEM_PROMPT.format(
+        patient_context=f"\n{patient.receptionist}" if patient else "Not identified yet"
+    ), state['messages'])
+    await log_agent_event(state['session_id'], "receptionist", "prompt_context", context_event(context))
+
+    update = await _receptionist_turn(state, context.messages)
+    update.update(context.state_update)
+    return update
+
+def _lookup_reply(state: AgentState, result: dict):
+    if result.get("status") == "ok":
+        # Patient found. The next turn is likely a question about their diagnosis
+        # or medications: start retrieving those passages while they reply.
+        if PREFETCH_ENABLED:
+            retrieval_prefetch.schedule(state['session_id'], result)
+        return {
+            "patient_data": result,
+            "messages": [
+                {"role": "assistant", "content": f"I found your file, {result['name']}. You were discharged on {result['discharge_date']} for {result['diagnosis']}. How are you feeling today?"}
+            ]
+        }
+    elif result.get("status") == "multiple":
+        return {
+            "messages": [{"role": "assistant", "content": "I found multiple patients with that name. Could you please provide your full name or date of birth?"}]
+        }
+    else:
+        return {
+            "messages": [{"role": "assistant", "content": "I couldn't find a record with that name. Could you please double-check the spelling?"}]
+        }
+
+async def patient_lookup_node(state: AgentState):
+    """Runs the patient lookup for a name found by the intent router, without an LLM call."""
+    args = {"name": state["intent"]["name"]}
+    await emit_event("tool_call", {"agent": "receptionist", "tool": "patient_db_tool", "args": args})
+    result_json = await run_blocking(patient_db_tool.invoke, args)
+    await log_agent_event(state['session_id'], "receptionist", "db_lookup", {**args, "source": "intent_router"})
+    result = json.loads(result_json)
+    if result.get("status") == "not_found":
+        # Probably not a name after all ("I'm Sorry"); let the receptionist LLM answer
+        return {"intent": {**state["intent"], "kind": "other"}}
+    if result.get("status") == "ok" and is_medical(str(state["messages"][-1].get("content", ""))):
+        # Name and question in one message: the clinical agent answers it now, with the record
+        await emit_event("handoff", {"from": "receptionist", "to": "clinical", "reason": "intent_router"})
+        await log_agent_event(state['session_id'], "receptionist", "handoff", {"reason": "intent_router"})
+        return {"patient_data": result, "handoff_to_clinical": True}
+    return _lookup_reply(state, result)
 
+async def _receptionist_turn(state: AgentState, lc_messages: list):
     # Bind tools
-    llm_with_tools = llm.bind_tools([patient_db_tool])
+    llm_with_tools = get_llm().bind_tools([patient_db_tool])
     
     # Invoke
-    response = llm_with_tools.invoke(lc_messages)
+    with span("llm", "receptionist") as llm_span:
+        response = await llm_with_tools.ainvoke(lc_messages, config=REPLY_CONFIG)
+        llm_span.record_usage(response)
     
     # Handle tool calls
     if response.tool_calls:
         for tool_call in response.tool_calls:
             if tool_call['name'] == 'patient_db_tool':
                 # Execute tool
-                result_json = patient_db_tool.invoke(tool_call['args'])
-                result = json.loads(result_json)
-                
-                log_agent_event(state['session_id'], "receptionist", "db_lookup", tool_call['args'])
-                
-                if result.get("status") == "ok":
-                    # Patient found
-                    return {
-                        "patient_data": result,
-                        "messages": [
-                            {"role": "assistant", "content": f"I found your file, {result['name']}. You were discharged on {result['discharge_date']} for {result['diagnosis']}. How are you feeling today?"}
-                        ]
-                    }
-                elif result.get("status") == "multiple":
-                     return {
-                        "messages": [{"role": "assistant", "content": "I found multiple patients with that name. Could you please provide your full name or date of birth?"}]
-                    }
-                else:
-                    return {
-                        "messages": [{"role": "assistant", "content": "I couldn't find a record with that name. Could you please double-check the spelling?"}]
-                    }
+                await emit_event("tool_call", {"agent": "receptionist", "tool": "patient_db_tool", "args": tool_call['args']})
+                result_json = await run_blocking(patient_db_tool.invoke, tool_call['args'])
+                await log_agent_event(state['session_id'], "receptionist", "db_lookup", tool_call['args'])
+                return _lookup_reply(state, json.loads(result_json))
 
     # Check for handoff intent in text if no tool called
     # Simple heuristic or let LLM decide via a structured output/tool? 
@@ -85,26 +134,21 @@ def receptionist_node(state: AgentState):
     # Simpler: If LLM says "I will connect you to the Clinical Agent", we detect that.
     
     # Check for handoff intent in text if no tool called
-    content = response.content
-    
-    # Handle list content (e.g. from Gemini/Anthropic)
-    if isinstance(content, list):
-        content_text = " ".join([block["text"] for block in content if isinstance(block, dict) and block.get("type") == "text"])
-    else:
-        content_text = str(content)
+    reply_text = content_text(response.content)
 
     handoff = False
     
     # Robust handoff detection
-    content_lower = content_text.lower()
+    content_lower = reply_text.lower()
     if "clinical agent" in content_lower or "connect you" in content_lower:
         handoff = True
-        print(f"DEBUG: Handoff detected in receptionist. Content: {content_text[:50]}...")
-        log_agent_event(state['session_id'], "receptionist", "handoff", {"reason": "medical_query"})
+        logger.debug("Handoff detected in receptionist. Content: %.50s...", reply_text)
+        await emit_event("handoff", {"from": "receptionist", "to": "clinical", "reason": "medical_query"})
+        await log_agent_event(state['session_id'], "receptionist", "handoff", {"reason": "medical_query"})
     else:
-        print(f"DEBUG: No handoff detected. Content: {content_text[:50]}...")
+        logger.debug("No handoff detected. Content: %.50s...", reply_text)
 
     return {
-        "messages": [{"role": "assistant", "content": content_text, "agent": "receptionist"}],
+        "messages": [{"role": "assistant", "content": reply_text, "agent": "receptionist"}],
         "handoff_to_clinical": handoff
     }
@@ -0,0 +1,324 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.runnables.config import ensure_config, merge_configs
+
+from .events import emit_reply_text, REPLY_TAG
+from ..metrics import current_trace, llm_retries_total, llm_hedges_total, llm_breaker_total
+
+logger = logging.getLogger(__name__)
+
+# Tail-latency control for chat model calls:
+#   - every attempt has a deadline (LLM_CALL_TIMEOUT), and all attempts in one
+#     chat turn share a budget (LLM_TURN_BUDGET) counted from the turn's start
+#   - transient failures (timeouts, 429, 5xx) are retried with full-jitter
+#     exponential backoff while the budget allows
+#   - optionally (LLM_HEDGE), a call still running after the p95 latency of
+#     recent calls of the same kind gets a duplicate request; the first answer wins
+#   - a circuit breaker opens after LLM_BREAKER_FAILURES consecutive transient
+#     failures and fails calls fast for LLM_BREAKER_COOLDOWN seconds, then lets
+#     one trial call through
+# The Gemini client's own retries are turned off so these are the only ones.
+LLM_CALL_TIMEOUT = float(os.environ.get("LLM_CALL_TIMEOUT", "20"))
+LLM_TURN_BUDGET = float(os.environ.get("LLM_TURN_BUDGET", "45"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.environ.get("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.environ.get("LLM_RETRY_MAX_DELAY", "4"))
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "0").lower() in ("1", "true", "yes")
+LLM_HEDGE_AFTER_MS = float(os.environ.get("LLM_HEDGE_AFTER_MS", "0"))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+
+LATENCY_WINDOW = 200
+# Provider errors worth retrying; others (bad request, auth) fail straight away
+RETRYABLE_ERRORS = {"ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError",
+                    "TooManyRequests", "Unavailable", "ServerError", "Aborted"}
+
+class LLMUnavailable(RuntimeError):
+    """The provider is failing or slow: breaker open, or the turn's budget is spent."""
+
+UNAVAILABLE_REPLY = "I'm having trouble reaching the assistant service right now. Please try again in a moment."
+
+def is_transient(error: BaseException) -> bool:
+    # SDK errors are often wrapped (e.g. by langchain_google_genai); look a few levels down the chain
+    for _ in range(4):
+        if error is None:
+            return False
+        if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+            return True
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        if isinstance(code, int) and (code == 429 or 500 <= code < 600):
+            return True
+        if type(error).__name__ in RETRYABLE_ERRORS:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """Raises LLMUnavailable while open. In half-open, only one trial call goes through."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                self.state = "half_open"
+                self._trial_running = False
+            if self.state == "closed":
+                return
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return
+            self.rejected += 1
+        llm_breaker_total.inc(event="rejected")
+        raise LLMUnavailable("Chat model circuit breaker is open")
+
+    def abandon(self):
+        """The call was cancelled before the provider answered; let another trial through."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            closing = self.state != "closed"
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+        if closing:
+            logger.info("Chat model circuit breaker closed")
+            llm_breaker_total.inc(event="closed")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "closed" and self.failures < self.failure_threshold:
+                return
+            if self.state == "open":
+                return
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._trial_running = False
+            self.opened += 1
+        logger.warning("Chat model circuit breaker opened after %d failures", self.failures)
+        llm_breaker_total.inc(event="opened")
+
+    @property
+    def allows_hedge(self) -> bool:
+        return self.state == "closed"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "open": int(self.state != "closed"),
+                    "consecutive_failures": self.failures, "opened": self.opened, "rejected": self.rejected}
+
+class CallPolicy:
+    """Settings, breaker and latency history shared by every wrapped call in the process."""
+
+    def __init__(self):
+        self.call_timeout = LLM_CALL_TIMEOUT
+        self.turn_budget = LLM_TURN_BUDGET
+        self.max_retries = LLM_MAX_RETRIES
+        self.base_delay = LLM_RETRY_BASE_DELAY
+        self.max_delay = LLM_RETRY_MAX_DELAY
+        self.hedge = LLM_HEDGE
+        self.hedge_after = LLM_HEDGE_AFTER_MS / 1000
+        self.hedge_min_samples = LLM_HEDGE_MIN_SAMPLES
+        self.breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+        self._latencies = {}  # bound tool names -> recent successful call durations
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def deadline(self, started: float) -> float:
+        """perf_counter time by which this turn's LLM work must finish."""
+        trace = current_trace()
+        return (trace.started if trace is not None else started) + self.turn_budget
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def observe(self, kind: tuple, seconds: float):
+        with self._lock:
+            window = self._latencies.get(kind)
+            if window is None:
+                window = self._latencies[kind] = deque(maxlen=LATENCY_WINDOW)
+            window.append(seconds)
+
+    def hedge_delay(self, kind: tuple):
+        """Seconds after which a duplicate request is sent, or None for no hedging."""
+        if not self.hedge or not self.breaker.allows_hedge:
+            return None
+        if self.hedge_after:
+            return self.hedge_after
+        with self._lock:
+            window = sorted(self._latencies.get(kind, ()))
+        if len(window) < self.hedge_min_samples:
+            return None
+        return window[min(len(window) - 1, int(0.95 * len(window)))]
+
+    def stats(self) -> dict:
+        return {"retries": self.retries, "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+                **{f"breaker_{k}": v for k, v in self.breaker.stats().items()}}
+
+class _StreamWatch(AsyncCallbackHandler):
+    """Notices when the model starts streaming reply tokens to the client."""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+
+    async def on_llm_new_token(self, token: str, **kwargs):
+        if token:
+            self.started.set()
+
+def _with_watch(config, watch):
+    if watch is None:
+        return config
+    # merge_configs adds the handler to the inherited callback manager instead of replacing it
+    return merge_configs(ensure_config(config), {"callbacks": [watch]})
+
+def _untagged(config):
+    # A hedged duplicate must not stream a second copy of the reply
+    if not config:
+        return config
+    return {**config, "tags": [tag for tag in config.get("tags", []) if tag != REPLY_TAG]}
+
+async def _cancel(*tasks):
+    for task in tasks:
+        if task is not None and not task.done():
+            task.cancel()
+    for task in tasks:
+        if task is not None:
+            try:
+                await task
+            except BaseException:
+                pass
+
+class ResilientChatModel:
+    """
+    Wraps a LangChain chat model (or the runnable bind_tools returns) with
+    deadlines, retries, hedging and the circuit breaker. Supports bind_tools and ainvoke.
+    """
+
+    def __init__(self, llm, policy: CallPolicy, kind: tuple = ()):
+        self.llm = llm
+        self.policy = policy
+        self.kind = kind
+
+    def bind_tools(self, tools, **kwargs):
+        kind = tuple(getattr(t, "name", None) or getattr(t, "__name__", str(t)) for t in tools)
+        return ResilientChatModel(self.llm.bind_tools(tools, **kwargs), self.policy, kind)
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        policy = self.policy
+        started = time.perf_counter()
+        deadline = policy.deadline(started)
+        reply = bool(config) and REPLY_TAG in config.get("tags", [])
+        attempt = 0
+        while True:
+            # Budget first: before_call() may claim the half-open trial, which needs a result
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise LLMUnavailable(f"Chat model budget of {policy.turn_budget:g}s for this turn is spent")
+            policy.breaker.before_call()
+            watch = _StreamWatch() if reply else None
+            attempt_started = time.perf_counter()
+            try:
+                response = await self._attempt(messages, config, watch, min(policy.call_timeout, remaining), kwargs)
+            except asyncio.CancelledError:
+                policy.breaker.abandon()
+                raise
+            except Exception as e:
+                if not is_transient(e):
+                    # The provider answered; the request itself was rejected
+                    policy.breaker.record_success()
+                    raise
+                policy.breaker.record_failure()
+                reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                # Retrying after part of the reply reached the client would repeat it
+                streamed = watch is not None and watch.started.is_set()
+                delay = policy.backoff(attempt)
+                if attempt >= policy.max_retries or streamed or time.perf_counter() + delay >= deadline:
+                    raise LLMUnavailable(f"Chat model call failed after {attempt + 1} attempts ({reason})") from e
+                attempt += 1
+                policy.retries += 1
+                llm_retries_total.inc(reason=reason)
+                logger.warning("Chat model call failed (%s: %s), retry %d in %.2fs", reason, e, attempt, delay)
+                await asyncio.sleep(delay)
+                continue
+            policy.breaker.record_success()
+            policy.observe(self.kind, time.perf_counter() - attempt_started)
+            return response
+
+    async def _attempt(self, messages, config, watch, timeout: float, kwargs):
+        primary = asyncio.ensure_future(self.llm.ainvoke(messages, config=_with_watch(config, watch), **kwargs))
+        hedge_after = self.policy.hedge_delay(self.kind)
+        try:
+            if hedge_after is None or hedge_after >= timeout:
+                return await asyncio.wait_for(asyncio.shield(primary), timeout)
+            return await self._hedged(primary, messages, config, watch, hedge_after, timeout, kwargs)
+        finally:
+            await _cancel(primary)
+
+    async def _hedged(self, primary, messages, config, watch, hedge_after: float, timeout: float, kwargs):
+        end = time.perf_counter() + timeout
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done or (watch is not None and watch.started.is_set()):
+            return await asyncio.wait_for(asyncio.shield(primary), end - time.perf_counter())
+
+        policy = self.policy
+        policy.hedges += 1
+        llm_hedges_total.inc(outcome="sent")
+        hedge = asyncio.ensure_future(self.llm.ainvoke(messages, config=_untagged(config), **kwargs))
+        streaming = asyncio.ensure_future(watch.started.wait()) if watch is not None else None
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                waiting = pending | ({streaming} if streaming is not None else set())
+                done, _ = await asyncio.wait(waiting, timeout=end - time.perf_counter(),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError()
+                if streaming in done:
+                    # The original started streaming the reply: stay with it
+                    streaming = None
+                    if hedge in pending:
+                        pending.discard(hedge)
+                        await _cancel(hedge)
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is hedge:
+                        policy.hedge_wins += 1
+                        llm_hedges_total.inc(outcome="won")
+                        await emit_reply_text(task.result(), config)
+                    else:
+                        llm_hedges_total.inc(outcome="lost")
+                    return task.result()
+            raise error
+        finally:
+            await _cancel(hedge, streaming)
+
+call_policy = CallPolicy()
+
+def resilient_chat_model(llm):
+    return ResilientChatModel(llm, call_policy)
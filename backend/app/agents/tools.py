@@ -1,10 +1,18 @@
 from langchain_core.tools import tool
 from sqlalchemy.orm import Session
-from ..db import SessionLocal
-from ..models import Patient, AgentEvent
+from ..db import ReadSessionLocal
+from ..models import AgentEvent
+from ..patient_index import search_patients, best_matches
+from ..patient_context import patient_record
 from ..rag.retriever import rag_query
+from ..write_behind import write_behind
+from ..concurrency import run_blocking
+from ..metrics import span
 import json
 import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 @tool
 def patient_db_tool(name: str):
@@ -12,55 +20,35 @@ def patient_db_tool(name: str):
     Searches for a patient by name in the database.
     Returns patient details if found, or status 'not_found' or 'multiple'.
     """
-    db: Session = SessionLocal()
+    with span("tool", "patient_db_tool") as tool_span:
+        result = _patient_lookup(name)
+        tool_span.set(status=result["status"])
+        return json.dumps(result)
+
+def _patient_lookup(name: str) -> dict:
+    # Read-only engine: lookups don't queue behind transcript writes
+    db: Session = ReadSessionLocal()
     try:
-        print(f"DEBUG: Searching for patient: '{name}'")
-        # Clean the input name
-        clean_name = name.strip().replace(".", "").replace("  ", " ")
-        
-        # Case insensitive search
-        patients = db.query(Patient).filter(Patient.name.ilike(f"%{clean_name}%")).all()
-        
-        # If not found, try searching by parts (e.g. first name)
-        if not patients:
-            print(f"DEBUG: Exact match failed for '{clean_name}'. Trying parts.")
-            parts = clean_name.split()
-            if len(parts) > 0:
-                # Try searching for just the first name or last name
-                for part in parts:
-                    if len(part) > 2: # Avoid short words
-                         sub_results = db.query(Patient).filter(Patient.name.ilike(f"%{part}%")).all()
-                         if sub_results:
-                             print(f"DEBUG: Found match using part '{part}'")
-                             patients = sub_results
-                             break
+        logger.debug("Searching for patient: '%s'", name)
+        # Ranked lookup on the name token index (tolerates partial names and typos)
+        with span("db", "patient_search"):
+            patients = best_matches(search_patients(db, name))
 
         if not patients:
-            print("DEBUG: Patient not found.")
-            return json.dumps({"status": "not_found"})
+            logger.debug("Patient not found.")
+            return {"status": "not_found"}
         
         if len(patients) > 1:
-            print(f"DEBUG: Multiple patients found: {len(patients)}")
+            logger.debug("Multiple patients found: %d", len(patients))
             candidates = [{"id": p.id, "name": p.name, "discharge_date": str(p.discharge_date)} for p in patients]
-            return json.dumps({"status": "multiple", "candidates": candidates})
+            return {"status": "multiple", "candidates": candidates}
         
         p = patients[0]
-        print(f"DEBUG: Patient found: {p.name}")
-        patient_data = {
-            "status": "ok",
-            "id": p.id,
-            "name": p.name,
-            "discharge_date": str(p.discharge_date),
-            "diagnosis": p.primary_diagnosis,
-            "medications": p.medications,
-            "diet": p.dietary_restrictions,
-            "warning_signs": p.warning_signs,
-            "instructions": p.discharge_instructions
-        }
-        return json.dumps(patient_data)
+        logger.debug("Patient found: %s", p.name)
+        return patient_record(p)
     except Exception as e:
-        print(f"ERROR in patient_db_tool: {e}")
-        return json.dumps({"status": "error", "message": str(e)})
+        logger.error("Error in patient_db_tool: %s", e)
+        return {"status": "error", "message": str(e)}
     finally:
         db.close()
 
@@ -70,8 +58,9 @@ def rag_tool(question: str, patient_context: str = ""):
     Queries the nephrology reference material using RAG.
     Use this for medical questions, diet, symptoms, etc.
     """
-    results = rag_query(question, patient_context)
-    return json.dumps(results)
+    with span("tool", "rag_tool"):
+        results = rag_query(question, patient_context)
+        return json.dumps(results)
 
 @tool
 def web_search_tool(query: str):
@@ -79,44 +68,45 @@ def web_search_tool(query: str):
     Simulates a web search for latest research or news.
     Use this ONLY when the user asks for 'latest', 'new', '2024', etc.
     """
-    # STUB implementation
-    print(f"STUB WEB SEARCH: {query}")
+    with span("tool", "web_search_tool"):
+        # STUB implementation
+        logger.debug("Stub web search: %s", query)
+    
+        # Return dummy but realistic results based on keywords
+        if "sglt2" in query.lower():
+            return json.dumps([
+                {
+                    "title": "SGLT2 Inhibitors in CKD: 2024 Update",
+                    "snippet": "Dapagliflozin and Empagliflozin show continued benefit in reducing progression of CKD in non-diabetic patients.",
+                    "url": "https://www.nejm.org/dummy-article-sglt2"
+                },
+                {
+                    "title": "New Guidelines for SGLT2 use",
+                    "snippet": "KDIGO 2024 guidelines recommend SGLT2 inhibitors for all patients with eGFR > 20.",
+                    "url": "https://kdigo.org/guidelines"
+                }
+            ])
     
-    # Return dummy but realistic results based on keywords
-    if "sglt2" in query.lower():
         return json.dumps([
             {
-                "title": "SGLT2 Inhibitors in CKD: 2024 Update",
-                "snippet": "Dapagliflozin and Empagliflozin show continued benefit in reducing progression of CKD in non-diabetic patients.",
-                "url": "https://www.nejm.org/dummy-article-sglt2"
-            },
-            {
-                "title": "New Guidelines for SGLT2 use",
-                "snippet": "KDIGO 2024 guidelines recommend SGLT2 inhibitors for all patients with eGFR > 20.",
-                "url": "https://kdigo.org/guidelines"
+                "title": "Latest Nephrology News",
+                "snippet": "Recent studies focus on finerenone and combination therapies.",
+                "url": "https://www.kidney.org/news"
             }
         ])
-    
-    return json.dumps([
-        {
-            "title": "Latest Nephrology News",
-            "snippet": "Recent studies focus on finerenone and combination therapies.",
-            "url": "https://www.kidney.org/news"
-        }
-    ])
 
-def log_agent_event(session_id: str, agent_name: str, event_type: str, details: dict):
-    db: Session = SessionLocal()
-    try:
-        event = AgentEvent(
-            session_id=session_id,
-            agent=agent_name,
-            event_type=event_type,
-            details=details
-        )
-        db.add(event)
-        db.commit()
-    except Exception as e:
-        print(f"Failed to log event: {e}")
-    finally:
-        db.close()
+async def log_agent_event(session_id: str, agent_name: str, event_type: str, details: dict):
+    # Queued and committed in batches by the write-behind writer, off the request path
+    event = AgentEvent(
+        session_id=session_id,
+        agent=agent_name,
+        event_type=event_type,
+        details=details,
+        timestamp=datetime.datetime.utcnow()
+    )
+    if write_behind.sync:
+        # Sync mode commits in the caller's thread; keep that off the event loop
+        await run_blocking(write_behind.submit, event, True)
+    else:
+        # Telemetry: never block the loop on a full queue; the event is dropped and counted
+        write_behind.submit_nowait(event)
@@ -0,0 +1,21 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Bounded pool for blocking work (SQLAlchemy sessions, embedding forward passes)
+# so it never runs on the event loop and can't grow without limit under load.
+BLOCKING_POOL_SIZE = int(os.environ.get("BLOCKING_POOL_SIZE", "16"))
+
+_pool = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs a blocking callable on the shared pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (e.g. the active request trace) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_pool, functools.partial(context.run, func, *args, **kwargs))
+
+def shutdown_pool():
+    _pool.shutdown(wait=True)
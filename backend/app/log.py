@@ -0,0 +1,17 @@
+import logging
+import os
+
+# Leveled logging for the backend. Modules log through logging.getLogger(__name__)
+# with %-style arguments, so a disabled level costs one isEnabledFor() check and
+# the message is never formatted. LOG_LEVEL=DEBUG brings back the per-call traces.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+def configure_logging(level: str = LOG_LEVEL):
+    root = logging.getLogger("app")
+    root.setLevel(getattr(logging, level, logging.INFO))
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(handler)
+        root.propagate = False
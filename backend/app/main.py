@@ -1,18 +1,80 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-import os
+import logging
+import time
 
 # Load env vars before importing other modules that might rely on them
 load_dotenv()
 
+from .log import configure_logging
+configure_logging()
+
 from .routers import chat
-from .db import engine, Base
+from .db import engine, Base, SessionLocal, ensure_columns, ensure_indexes
+from .rag.retriever import warm_retriever, reload_retriever
+from .agents.llm import get_llm, embedding_stats
+from .agents.llm_cache import llm_cache
+from .agents.resilience import call_policy
+from .concurrency import shutdown_pool
+from .session_store import session_store
+from .patient_index import ensure_name_index
+from .write_behind import write_behind
+from .rag.answer_cache import answer_cache
+from .patient_context import patient_contexts
+from .rag.prefetch import retrieval_prefetch
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+registry.register_collector("session_store", session_store.stats)
+registry.register_collector("write_behind", write_behind.stats)
+registry.register_collector("answer_cache", answer_cache.stats)
+registry.register_collector("patient_context", patient_contexts.stats)
+registry.register_collector("retrieval_prefetch", retrieval_prefetch.stats)
+registry.register_collector("embeddings", embedding_stats)
+registry.register_collector("llm_cache", llm_cache.stats)
+registry.register_collector("llm_resilience", call_policy.stats)
+
+def _timed(label: str, func):
+    start = time.perf_counter()
+    func()
+    logger.info("Startup: %s took %.2fs", label, time.perf_counter() - start)
 
-# Create tables on startup
-Base.metadata.create_all(bind=engine)
+def _prepare_database():
+    # Create tables on startup
+    Base.metadata.create_all(bind=engine)
+    ensure_columns(engine)
+    ensure_indexes(engine)
+    db = SessionLocal()
+    try:
+        ensure_name_index(db)
+    finally:
+        db.close()
 
-app = FastAPI(title="Post Discharge AI Assistant")
+def _warm_retriever():
+    # Pay the embedding model / Chroma cold start once, before serving traffic
+    try:
+        warm_retriever()
+    except Exception as e:
+        logger.warning("Retriever warm-up failed, will retry on first query: %s", e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Importing app.main stays cheap; everything slow happens here, once per worker
+    _timed("database", _prepare_database)
+    _timed("LLM client", get_llm)
+    _timed("retriever", _warm_retriever)
+    yield
+    retrieval_prefetch.clear()
+    # Commit whatever transcript and event rows are still queued, while the pool
+    # is still up for anything those writes wait on
+    write_behind.stop()
+    shutdown_pool()
+
+app = FastAPI(title="Post Discharge AI Assistant", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,3 +89,38 @@ app.include_router(chat.router, prefix="/api")
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text format: turn/span latency histograms, LLM calls and tokens, cache hits
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/admin/reload-retriever")
+def reload_retriever_endpoint():
+    # Call after re-running app/rag/ingest.py so this worker picks up the new chroma_db
+    reload_retriever()
+    return {"status": "reloaded"}
+
+@app.get("/admin/session-store")
+def session_store_stats():
+    return session_store.stats()
+
+@app.get("/admin/write-behind")
+def write_behind_stats():
+    return write_behind.stats()
+
+@app.get("/admin/answer-cache")
+def answer_cache_stats():
+    return answer_cache.stats()
+
+@app.get("/admin/retrieval-prefetch")
+def retrieval_prefetch_stats():
+    return retrieval_prefetch.stats()
+
+@app.get("/admin/llm-cache")
+def llm_cache_stats():
+    return llm_cache.stats()
+
+@app.get("/admin/llm-resilience")
+def llm_resilience_stats():
+    return call_policy.stats()
@@ -0,0 +1,223 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Optional
+
+# In-process metrics and per-turn tracing.
+#
+# Counters and histograms live in a small registry rendered in the Prometheus
+# text format by GET /metrics. A Trace collects the spans of one chat turn
+# (graph nodes, tools, LLM calls, DB work); the active trace travels in a
+# contextvar, which asyncio tasks and run_blocking() both carry along. Spans
+# outside a turn (e.g. write-behind batches) still feed the histograms.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _label_key(labels: dict):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', f'{bound:g}')])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # (prefix, fn returning {name: value}) rendered as gauges
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, prefix: str, collect):
+        """collect() returns a flat dict of numbers, exported as gauges named <prefix>_<key>."""
+        self._collectors.append((prefix, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, collect in self._collectors:
+            try:
+                values = collect()
+            except Exception:
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {value:g}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+turn_seconds = registry.histogram("chat_turn_seconds", "End-to-end latency of a chat turn.")
+turns_total = registry.counter("chat_turns_total", "Chat turns handled, by endpoint and outcome.")
+span_seconds = registry.histogram("chat_span_seconds", "Duration of traced work inside a turn, by kind and name.")
+llm_calls_total = registry.counter("llm_calls_total", "Chat model calls, by call site.")
+llm_tokens_total = registry.counter("llm_tokens_total", "Chat model tokens, by call site and direction.")
+cache_lookups_total = registry.counter("cache_lookups_total", "Cache lookups, by cache and result.")
+intent_total = registry.counter("intent_decisions_total", "Intent router decisions, by kind and source.")
+llm_retries_total = registry.counter("llm_retries_total", "Chat model calls retried, by reason.")
+llm_hedges_total = registry.counter("llm_hedges_total", "Hedged duplicate chat model requests, by outcome.")
+llm_breaker_total = registry.counter("llm_breaker_events_total", "Chat model circuit breaker events (opened, rejected, closed).")
+
+class Span:
+    __slots__ = ("kind", "name", "attrs", "start", "duration")
+
+    def __init__(self, kind: str, name: str, attrs: dict):
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def record_usage(self, response):
+        """Copies token counts from a chat model response, when the provider reports them."""
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage:
+            self.attrs["input_tokens"] = usage.get("input_tokens", 0)
+            self.attrs["output_tokens"] = usage.get("output_tokens", 0)
+
+class Trace:
+    """Spans of a single chat turn."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> dict:
+        """Compact summary stored in AgentEvent.details."""
+        with self._lock:
+            spans = list(self.spans)
+        by_kind = {}
+        for s in spans:
+            by_kind[s.kind] = round(by_kind.get(s.kind, 0.0) + s.duration * 1000, 2)
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "by_kind_ms": by_kind,
+            "spans": [
+                {"kind": s.kind, "name": s.name, "start_ms": round((s.start - self.started) * 1000, 2),
+                 "ms": round(s.duration * 1000, 2), **s.attrs}
+                for s in sorted(spans, key=lambda s: s.start)
+            ],
+        }
+
+_current_trace = contextvars.ContextVar("chat_trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def start_trace(trace: Optional[Trace] = None):
+    """Makes trace (a new one by default) the active trace for the block."""
+    trace = trace or Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # A streaming generator closed from another context (client went away)
+            pass
+
+@contextmanager
+def span(kind: str, name: str, **attrs):
+    """Times the block into chat_span_seconds and, inside a turn, into its trace."""
+    current = Span(kind, name, attrs)
+    try:
+        yield current
+    except BaseException as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        span_seconds.observe(current.duration, kind=kind, name=name)
+        if kind == "llm":
+            llm_calls_total.inc(call=name)
+            for direction in ("input", "output"):
+                tokens = current.attrs.get(f"{direction}_tokens")
+                if tokens:
+                    llm_tokens_total.inc(tokens, call=name, direction=direction)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(current)
+
+def traced_node(name: str, node):
+    """Wraps an async graph node so each run is recorded as a 'node' span."""
+    async def run(state):
+        with span("node", name):
+            return await node(state)
+    run.__name__ = getattr(node, "__name__", name)
+    return run
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Text, JSON, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, Text, JSON, DateTime, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from .db import Base
@@ -9,6 +9,8 @@ class Patient(Base):
     __tablename__ = "patients"
 
     id = Column(Integer, primary_key=True, index=True)
+    # Stable record id from the hospital's discharge feed; bulk imports upsert on it
+    external_id = Column(String, unique=True, index=True)
     name = Column(String, nullable=False)
     discharge_date = Column(Date, nullable=False)
     primary_diagnosis = Column(Text, nullable=False)
@@ -18,6 +20,8 @@ class Patient(Base):
     warning_signs = Column(Text)
     discharge_instructions = Column(Text)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Row version: sessions holding a copy of the record compare it each turn
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
 class Session(Base):
     __tablename__ = "sessions"
@@ -37,6 +41,11 @@ class Interaction(Base):
     agent = Column(String) # 'receptionist' | 'clinical' | 'system'
     message = Column(Text, nullable=False)
 
+    __table_args__ = (
+        # Session history in order, and the tail after a snapshot cursor
+        Index("ix_interactions_session_timestamp", "session_id", "timestamp", "id"),
+    )
+
 class AgentEvent(Base):
     __tablename__ = "agent_events"
 
@@ -44,5 +53,24 @@ class AgentEvent(Base):
     session_id = Column(String, ForeignKey("sessions.id"))
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     agent = Column(String, nullable=False)
-    event_type = Column(String, nullable=False) # 'db_lookup', 'handoff', 'rag_query', 'web_search', 'error'
+    event_type = Column(String, nullable=False) # 'db_lookup', 'handoff', 'rag_query', 'web_search', 'semantic_cache_hit', 'turn_timing', 'error'
     details = Column(JSON)
+
+class PatientNameToken(Base):
+    __tablename__ = "patient_name_tokens"
+
+    # One row per (normalized name token, patient); kept in sync by app/patient_index.py
+    token = Column(String, primary_key=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"), primary_key=True, index=True)
+
+class SessionSnapshot(Base):
+    __tablename__ = "session_snapshots"
+
+    # Latest compact graph state per session, written after every turn by
+    # app/snapshots.py so a resume doesn't replay the whole transcript
+    session_id = Column(String, ForeignKey("sessions.id"), primary_key=True)
+    format_version = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False)  # bumped on every write
+    state = Column(JSON, nullable=False)
+    last_interaction_at = Column(DateTime, nullable=False)  # cursor: interactions up to here are in `state`
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
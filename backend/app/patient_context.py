@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from .metrics import cache_lookups_total
+
+# Patient context for prompts, rendered once per patient record and cached. The
+# record dict in graph state carries a `version` (a hash of the row's fields)
+# and the row's `updated_at`. A turn compares the latter with the row, so an
+# edited Patient reloads into the session and gets a new version and a fresh
+# rendering. The cache remembers when each patient was last compared, so that
+# is one small query per patient every PATIENT_VERSION_CHECK_INTERVAL seconds,
+# or right after an import invalidated the patient, not one per turn. Each agent gets only the fields it uses, in a fixed
+# order, so the system prompt is byte-identical on every turn of a session and
+# the provider's prompt cache can reuse it.
+PATIENT_CONTEXT_CACHE_SIZE = int(os.environ.get("PATIENT_CONTEXT_CACHE_SIZE", "4096"))
+PATIENT_VERSION_CHECK_INTERVAL = float(os.environ.get("PATIENT_VERSION_CHECK_INTERVAL", "60"))
+
+RECORD_FIELDS = ("name", "discharge_date", "diagnosis", "medications", "diet", "warning_signs", "instructions")
+
+# (label, record field) per agent, in prompt order
+RECEPTIONIST_FIELDS = (("Name", "name"), ("Discharged", "discharge_date"), ("Diagnosis", "diagnosis"),
+                       ("Medications", "medications"))
+CLINICAL_FIELDS = (("Diagnosis", "diagnosis"), ("Medications", "medications"), ("Diet", "diet"),
+                   ("Warning signs", "warning_signs"), ("Instructions", "instructions"),
+                   ("Discharged", "discharge_date"))
+
+def record_version(record: dict) -> str:
+    payload = json.dumps([record.get(field) for field in RECORD_FIELDS], separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+def row_version(updated_at) -> Optional[str]:
+    return updated_at.isoformat() if updated_at else None
+
+def patient_record(p) -> dict:
+    """The patient dict kept in graph state (patient_data), built from a Patient row."""
+    record = {
+        "status": "ok",
+        "id": p.id,
+        "name": p.name,
+        "discharge_date": str(p.discharge_date),
+        "diagnosis": p.primary_diagnosis,
+        "medications": p.medications,
+        "diet": p.dietary_restrictions,
+        "warning_signs": p.warning_signs,
+        "instructions": p.discharge_instructions,
+        "updated_at": row_version(p.updated_at),
+    }
+    record["version"] = record_version(record)
+    return record
+
+def _render(record: dict, fields) -> str:
+    lines = []
+    for label, field in fields:
+        value = record.get(field)
+        if not value:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ", ".join(str(v) for v in value)
+        lines.append(f"- {label}: {' '.join(str(value).split())}")
+    return "\n".join(lines)
+
+@dataclass(frozen=True)
+class PatientContext:
+    version: str
+    receptionist: str  # prompt block for the receptionist
+    clinical: str      # prompt block for the clinical agent
+    rag: str           # rag_tool patient_context (boost terms)
+
+def build_patient_context(record: dict, version: str) -> PatientContext:
+    medications = record.get("medications") or []
+    return PatientContext(
+        version=version,
+        receptionist=_render(record, RECEPTIONIST_FIELDS),
+        clinical=_render(record, CLINICAL_FIELDS),
+        rag=f"Diagnosis: {record.get('diagnosis')}, Meds: {medications}",
+    )
+
+class PatientContextCache:
+    """LRU of rendered contexts, one entry per patient id holding its latest version."""
+
+    def __init__(self, max_entries: int, check_interval: float):
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self._entries = OrderedDict()  # patient id -> PatientContext
+        self._checked = {}  # patient id -> monotonic time the row version was last compared
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.checks = 0
+
+    def get(self, record: dict) -> PatientContext:
+        # States saved before records carried a version compute it here
+        version = record.get("version") or record_version(record)
+        key = record.get("id")
+        with self._lock:
+            context = self._entries.get(key)
+            if context is not None and context.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                cache_lookups_total.inc(cache="patient_context", result="hit")
+                return context
+            self.misses += 1
+        cache_lookups_total.inc(cache="patient_context", result="miss")
+        context = build_patient_context(record, version)
+        if key is not None:
+            with self._lock:
+                self._entries[key] = context
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._checked.pop(evicted, None)
+        return context
+
+    def needs_check(self, record: dict) -> bool:
+        """
+        Whether the Patient row should be read to see if this copy of the record
+        is stale: never compared, compared too long ago, invalidated, or another
+        session already holds a newer version.
+        """
+        key = record.get("id")
+        version = record.get("version") or record_version(record)
+        with self._lock:
+            context = self._entries.get(key)
+            checked = self._checked.get(key)
+        if context is None or context.version != version or checked is None:
+            return True
+        return time.monotonic() - checked >= self.check_interval
+
+    def mark_checked(self, patient_id):
+        with self._lock:
+            self._checked[patient_id] = time.monotonic()
+            self.checks += 1
+
+    def invalidate(self, patient_id=None):
+        """Drops one patient's context (or all), e.g. after a bulk import rewrote rows."""
+        with self._lock:
+            if patient_id is None:
+                self._entries.clear()
+                self._checked.clear()
+            else:
+                self._entries.pop(patient_id, None)
+                self._checked.pop(patient_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "version_checks": self.checks}
+
+patient_contexts = PatientContextCache(PATIENT_CONTEXT_CACHE_SIZE, PATIENT_VERSION_CHECK_INTERVAL)
+
+def patient_context(record: Optional[dict]) -> Optional[PatientContext]:
+    return patient_contexts.get(record) if record else None
@@ -0,0 +1,230 @@
+import argparse
+import csv
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import bindparam, delete, select, update
+
+# Add backend directory to path when run as a script
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.db import engine as default_engine, Base, ensure_columns, ensure_indexes
+from app.models import Patient, PatientNameToken
+from app.patient_index import name_index_rows, vocabulary
+from app.patient_context import patient_contexts
+
+logger = logging.getLogger(__name__)
+
+# Streaming bulk import of discharge exports (CSV or JSONL). Rows are validated,
+# then upserted on external_id a chunk at a time: one transaction per chunk with
+# one SELECT for the chunk's existing ids and executemany INSERT/UPDATE for the
+# rest. patient_name_tokens is written in the same transaction, so a committed
+# patient is always searchable by name.
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "5000"))
+
+COLUMNS = ("name", "discharge_date", "primary_diagnosis", "medications", "dietary_restrictions", "follow_up",
+           "warning_signs", "discharge_instructions")
+REQUIRED = ("external_id", "name", "discharge_date", "primary_diagnosis")
+# Column names used by some exports
+ALIASES = {"id": "external_id", "mrn": "external_id", "diagnosis": "primary_diagnosis", "meds": "medications",
+           "diet": "dietary_restrictions", "instructions": "discharge_instructions"}
+MAX_REPORTED_ERRORS = 20
+
+class RowError(ValueError):
+    pass
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    rejected: int = 0
+    elapsed: float = 0.0
+    errors: list = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return (self.inserted + self.updated + self.unchanged) / self.elapsed if self.elapsed else 0.0
+
+def read_rows(path: str, fmt: str = None):
+    """Yields (line number, dict) from a CSV or JSONL export, one row at a time."""
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            # Line 1 is the header
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, RowError(f"invalid JSON: {e.msg}")
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def _medications(value):
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        return [str(m).strip() for m in value if str(m).strip()]
+    value = str(value).strip()
+    if value.startswith("["):
+        try:
+            return _medications(json.loads(value))
+        except json.JSONDecodeError:
+            raise RowError("medications is not a valid JSON list")
+    # CSV exports separate medications with semicolons
+    return [m.strip() for m in value.split(";") if m.strip()]
+
+def validate_row(raw: dict) -> dict:
+    """Normalizes one export row into Patient column values, or raises RowError."""
+    if not isinstance(raw, dict):
+        raise RowError("row is not an object")
+    row = {ALIASES.get(k.strip().lower(), k.strip().lower()): v for k, v in raw.items() if k}
+    missing = [c for c in REQUIRED if not _text(row.get(c))]
+    if missing:
+        raise RowError(f"missing {', '.join(missing)}")
+    try:
+        discharge_date = datetime.date.fromisoformat(_text(row["discharge_date"])[:10])
+    except ValueError:
+        raise RowError(f"bad discharge_date {row['discharge_date']!r}")
+    values = {column: _text(row.get(column)) for column in COLUMNS}
+    values.update(
+        external_id=_text(row["external_id"]),
+        name=" ".join(values["name"].split()),
+        discharge_date=discharge_date,
+        medications=_medications(row.get("medications")),
+    )
+    return values
+
+_insert_patients = Patient.__table__.insert()
+_insert_tokens = PatientNameToken.__table__.insert()
+_update_patients = (
+    update(Patient.__table__)
+    .where(Patient.__table__.c.id == bindparam("_id"))
+    .values({column: bindparam(column) for column in ("external_id",) + COLUMNS})
+)
+
+def _write_chunk(conn, chunk: list, stats: ImportStats):
+    # A record repeated within the chunk: the last one wins
+    by_external_id = {row["external_id"]: row for row in chunk}
+    table = Patient.__table__
+    existing = {
+        found.external_id: found
+        for found in conn.execute(
+            select(table.c.id, table.c.external_id, *(table.c[column] for column in COLUMNS))
+            .where(table.c.external_id.in_(list(by_external_id)))
+        )
+    }
+
+    inserts = [row for external_id, row in by_external_id.items() if external_id not in existing]
+    updates, renamed = [], []
+    for external_id, found in existing.items():
+        row = by_external_id[external_id]
+        # Unchanged rows keep their updated_at, so cached prompt contexts and
+        # answers keyed on the record version stay valid across re-imports
+        if all(row[column] == found._mapping[column] for column in COLUMNS):
+            stats.unchanged += 1
+            continue
+        updates.append({**row, "_id": found.id})
+        if row["name"] != found.name:
+            renamed.append(found.id)
+
+    tokens = []
+    if inserts:
+        conn.execute(_insert_patients, inserts)
+        new_ids = conn.execute(
+            select(Patient.id, Patient.external_id).where(Patient.external_id.in_([r["external_id"] for r in inserts]))
+        ).all()
+        names = {row["external_id"]: row["name"] for row in inserts}
+        for patient_id, external_id in new_ids:
+            tokens.extend(name_index_rows(patient_id, names[external_id]))
+    if updates:
+        conn.execute(_update_patients, updates)
+    if renamed:
+        conn.execute(delete(PatientNameToken).where(PatientNameToken.patient_id.in_(renamed)))
+        names = {u["_id"]: u["name"] for u in updates}
+        for patient_id in renamed:
+            tokens.extend(name_index_rows(patient_id, names[patient_id]))
+    if tokens:
+        conn.execute(_insert_tokens, tokens)
+
+    stats.inserted += len(inserts)
+    stats.updated += len(updates)
+    return tokens, [u["_id"] for u in updates]
+
+def import_patients(path: str, fmt: str = None, chunk_size: int = IMPORT_CHUNK_SIZE, bind=None,
+                    progress_every: int = 100000) -> ImportStats:
+    bind = bind or default_engine
+    Base.metadata.create_all(bind=bind)
+    ensure_columns(bind)
+    ensure_indexes(bind)
+
+    stats = ImportStats()
+    start = time.perf_counter()
+    chunk = []
+    next_report = progress_every
+
+    def flush():
+        with bind.begin() as conn:
+            tokens, updated_ids = _write_chunk(conn, chunk, stats)
+        # Only after the commit: searches in this process see the new names now
+        vocabulary.add(row["token"] for row in tokens)
+        for patient_id in updated_ids:
+            patient_contexts.invalidate(patient_id)
+        chunk.clear()
+
+    for line_no, raw in read_rows(path, fmt):
+        stats.read += 1
+        try:
+            if isinstance(raw, RowError):
+                raise raw
+            chunk.append(validate_row(raw))
+        except RowError as e:
+            stats.rejected += 1
+            if len(stats.errors) < MAX_REPORTED_ERRORS:
+                stats.errors.append(f"line {line_no}: {e}")
+            continue
+        if len(chunk) >= chunk_size:
+            flush()
+        if progress_every and stats.read >= next_report:
+            next_report += progress_every
+            elapsed = time.perf_counter() - start
+            print(f"  {stats.read} rows read, {stats.inserted + stats.updated} written "
+                  f"({(stats.inserted + stats.updated) / elapsed:.0f} rows/s)")
+    if chunk:
+        flush()
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+def print_report(stats: ImportStats):
+    print(f"Read {stats.read} rows: {stats.inserted} inserted, {stats.updated} updated, {stats.unchanged} unchanged, "
+          f"{stats.rejected} rejected "
+          f"in {stats.elapsed:.2f}s ({stats.rows_per_second:.0f} rows/s)")
+    for error in stats.errors:
+        print(f"  rejected {error}")
+    if stats.rejected > len(stats.errors):
+        print(f"  ... and {stats.rejected - len(stats.errors)} more")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import (upsert) patients from a CSV or JSONL discharge export.")
+    parser.add_argument("path", help="export file; columns external_id, name, discharge_date, primary_diagnosis, "
+                                     "medications (JSON list or ';'-separated), dietary_restrictions, follow_up, "
+                                     "warning_signs, discharge_instructions")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="rows per transaction")
+    args = parser.parse_args()
+    print_report(import_patients(args.path, args.format, args.chunk_size))
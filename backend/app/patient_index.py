@@ -0,0 +1,198 @@
+import bisect
+import difflib
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from sqlalchemy import case, delete, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from .models import Patient, PatientNameToken
+
+logger = logging.getLogger(__name__)
+
+# Name search over patient_name_tokens instead of ilike scans on patients.name.
+# Each patient's name is split into normalized tokens; a query is expanded to the
+# indexed tokens it probably means (exact, prefix, or a close typo) and all
+# candidates are ranked by one grouped lookup on the token index.
+
+MIN_TOKEN_LENGTH = 2
+FUZZY_CUTOFF = float(os.environ.get("NAME_SEARCH_FUZZY_CUTOFF", "0.75"))
+VOCAB_REFRESH_SECONDS = float(os.environ.get("NAME_SEARCH_VOCAB_REFRESH", "300"))
+
+PREFIX_WEIGHT = 0.9
+MAX_EXPANSIONS = 5
+FUZZY_CANDIDATES = 50
+MIN_MATCH_SCORE = 0.6
+
+def tokenize_name(name: str):
+    tokens = re.findall(r"[a-z0-9]+", (name or "").lower())
+    return [t for t in tokens if len(t) >= MIN_TOKEN_LENGTH]
+
+def _trigrams(token: str):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class _TokenVocabulary:
+    """
+    Distinct indexed tokens, kept in memory for prefix and typo expansion.
+
+    It is far smaller than the patient table (names repeat), so it is loaded once
+    and refreshed periodically to pick up rows inserted by other workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = set()
+        self._sorted = []
+        self._by_trigram = defaultdict(set)
+        self._loaded_at = None
+
+    def ensure_loaded(self, db: Session):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < VOCAB_REFRESH_SECONDS:
+            return
+        tokens = db.execute(select(PatientNameToken.token).distinct()).scalars().all()
+        with self._lock:
+            self._tokens = set()
+            self._by_trigram = defaultdict(set)
+            self._add_locked(tokens)
+            self._loaded_at = time.monotonic()
+
+    def add(self, tokens):
+        with self._lock:
+            self._add_locked(tokens)
+
+    def _add_locked(self, tokens):
+        for token in tokens:
+            if token in self._tokens:
+                continue
+            self._tokens.add(token)
+            for gram in _trigrams(token):
+                self._by_trigram[gram].add(token)
+        self._sorted = sorted(self._tokens)
+
+    def expand(self, query_token: str):
+        """Returns {indexed_token: weight} for the tokens query_token may refer to."""
+        with self._lock:
+            if query_token in self._tokens:
+                return {query_token: 1.0}
+
+            weights = {}
+            # Prefix: "abhi" -> "abhishek" (the old ilike '%part%' behaviour users rely on)
+            if len(query_token) >= 3:
+                start = bisect.bisect_left(self._sorted, query_token)
+                for token in self._sorted[start:start + MAX_EXPANSIONS]:
+                    if not token.startswith(query_token):
+                        break
+                    weights[token] = PREFIX_WEIGHT
+
+            # Typos: only compare against the tokens sharing the most trigrams
+            shared = Counter()
+            for gram in _trigrams(query_token):
+                shared.update(self._by_trigram.get(gram, ()))
+        candidates = [token for token, _ in shared.most_common(FUZZY_CANDIDATES)]
+        for token in difflib.get_close_matches(query_token, candidates, n=MAX_EXPANSIONS, cutoff=FUZZY_CUTOFF):
+            ratio = difflib.SequenceMatcher(None, query_token, token).ratio()
+            weights[token] = max(weights.get(token, 0.0), ratio)
+        return weights
+
+    def invalidate(self):
+        self._loaded_at = None
+
+vocabulary = _TokenVocabulary()
+
+def search_patients(db: Session, name: str, limit: int = 10):
+    """
+    Returns [(Patient, score)] best first. A score of len(tokens) means every
+    query token matched exactly.
+    """
+    query_tokens = tokenize_name(name)
+    if not query_tokens:
+        return []
+
+    vocabulary.ensure_loaded(db)
+
+    # One MAX(CASE ...) per query token, so a query token that expanded to several
+    # indexed tokens still contributes at most its best match.
+    terms = []
+    all_tokens = set()
+    for query_token in dict.fromkeys(query_tokens):
+        weights = vocabulary.expand(query_token)
+        if weights:
+            terms.append(func.coalesce(func.max(case(weights, value=PatientNameToken.token)), 0.0))
+            all_tokens.update(weights)
+    if not terms:
+        return []
+
+    score = sum(terms[1:], terms[0]).label("score")
+    ranked = (
+        select(PatientNameToken.patient_id, score)
+        .where(PatientNameToken.token.in_(all_tokens))
+        .group_by(PatientNameToken.patient_id)
+        .order_by(score.desc())
+        .limit(limit)
+        .subquery()
+    )
+    rows = db.execute(
+        select(Patient, ranked.c.score)
+        .join(ranked, Patient.id == ranked.c.patient_id)
+        .order_by(ranked.c.score.desc(), Patient.id)
+    ).all()
+    return [(patient, float(s)) for patient, s in rows if s >= MIN_MATCH_SCORE]
+
+def best_matches(results):
+    """Keeps only the candidates tied for the top score."""
+    if not results:
+        return []
+    top = results[0][1]
+    return [patient for patient, s in results if s >= top - 1e-9]
+
+def name_index_rows(patient_id: int, name: str):
+    return [{"token": token, "patient_id": patient_id} for token in dict.fromkeys(tokenize_name(name))]
+
+def rebuild_name_index(db: Session, batch_size: int = 5000):
+    """Re-creates patient_name_tokens from the patients table."""
+    db.execute(delete(PatientNameToken))
+    batch = []
+    for patient_id, name in db.execute(select(Patient.id, Patient.name)).yield_per(batch_size):
+        batch.extend(name_index_rows(patient_id, name))
+        if len(batch) >= batch_size:
+            db.execute(PatientNameToken.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.execute(PatientNameToken.__table__.insert(), batch)
+    db.commit()
+    vocabulary.invalidate()
+
+def ensure_name_index(db: Session):
+    """Backfills the index for databases created before it existed."""
+    has_patients = db.execute(select(Patient.id).limit(1)).first() is not None
+    has_tokens = db.execute(select(PatientNameToken.patient_id).limit(1)).first() is not None
+    if has_patients and not has_tokens:
+        start = time.perf_counter()
+        rebuild_name_index(db)
+        logger.info("Built patient name index in %.2fs", time.perf_counter() - start)
+
+# Keep the index in step with ORM writes to Patient. Bulk Core inserts bypass these
+# hooks and must call name_index_rows themselves.
+
+@event.listens_for(Patient, "after_insert")
+def _index_inserted_patient(mapper, connection, target):
+    rows = name_index_rows(target.id, target.name)
+    if rows:
+        connection.execute(PatientNameToken.__table__.insert(), rows)
+        vocabulary.add(row["token"] for row in rows)
+
+@event.listens_for(Patient, "after_update")
+def _index_updated_patient(mapper, connection, target):
+    if not inspect(target).attrs.name.history.has_changes():
+        return
+    connection.execute(delete(PatientNameToken).where(PatientNameToken.patient_id == target.id))
+    _index_inserted_patient(mapper, connection, target)
+
+@event.listens_for(Patient, "after_delete")
+def _unindex_deleted_patient(mapper, connection, target):
+    connection.execute(delete(PatientNameToken).where(PatientNameToken.patient_id == target.id))
@@ -0,0 +1,112 @@
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from .retriever import get_shared_embeddings, kb_version, on_reload
+
+# Semantic cache of final clinical answers. Patients ask the same few questions
+# in many phrasings ("can I eat bananas", "are bananas ok for me"), so an answer
+# is reused when a new question embeds close enough to a cached one *and* it
+# comes from the same patient, after the same assistant reply (see context_key).
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.93"))
+SEMANTIC_CACHE_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+# Very short messages ("why?", "and that one?") depend on the conversation
+SEMANTIC_CACHE_MIN_WORDS = 3
+
+def context_key(patient_data: Optional[dict], session_id: str, previous_reply: str = "") -> str:
+    """
+    Which answers a question may reuse. Answers quote the patient's name and
+    record, so they are never shared between patients (or, before the patient
+    is identified, between sessions). Follow-ups ("what about the second one?")
+    depend on the reply before them, so that is part of the key too.
+    """
+    if patient_data and patient_data.get("id") is not None:
+        owner = f"patient:{patient_data['id']}:{patient_data.get('version', '')}"
+    else:
+        owner = f"session:{session_id}"
+    previous = hashlib.sha1(previous_reply.encode("utf-8")).hexdigest()[:16]
+    return f"{owner}|{previous}"
+
+class SemanticAnswerCache:
+    def __init__(self, threshold: float, ttl_seconds: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._entries = OrderedDict()  # entry id -> (context key, unit vector, answer, expires_at)
+        self._by_context = {}          # context key -> set of entry ids
+        self._kb_version = kb_version()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def embed(self, question: str):
+        vector = np.asarray(get_shared_embeddings().embed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def lookup(self, vector, key: str):
+        """Returns (answer, similarity) for the closest fresh entry above the threshold, else None."""
+        self._check_kb_version()
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_context.get(key, ())):
+                _, cached_vector, _, expires_at = self._entries[entry_id]
+                if expires_at < now:
+                    self._remove(entry_id)
+                    self.evictions += 1
+                    continue
+                score = float(np.dot(vector, cached_vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2], best_score
+
+    def store(self, vector, key: str, answer):
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (key, vector, answer, time.monotonic() + self.ttl_seconds)
+            self._by_context.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _remove(self, entry_id):
+        key = self._entries.pop(entry_id)[0]
+        ids = self._by_context.get(key)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._by_context[key]
+
+    def _check_kb_version(self):
+        # Catches a re-ingest done by another process without a reload call
+        version = kb_version()
+        if version != self._kb_version:
+            self._kb_version = version
+            self.clear()
+
+answer_cache = SemanticAnswerCache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_MAX_ENTRIES)
+on_reload(answer_cache.clear)
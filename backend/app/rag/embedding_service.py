@@ -0,0 +1,121 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Concurrent embed calls (rag_query, the semantic cache, the intent router, ingest)
+# are coalesced into micro-batches: a single worker thread takes the first
+# waiting text, collects more for up to EMBED_BATCH_WAIT_MS or until
+# EMBED_BATCH_MAX_SIZE, and runs them as one forward pass. Single query
+# embeddings are also memoized, since one turn embeds the same user message for
+# the intent router and the answer cache.
+EMBED_BATCH_MAX_SIZE = int(os.environ.get("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_WAIT_MS = float(os.environ.get("EMBED_BATCH_WAIT_MS", "5"))
+EMBED_CACHE_SIZE = int(os.environ.get("EMBED_CACHE_SIZE", "2048"))
+
+class BatchingEmbeddings(Embeddings):
+    """Wraps a LangChain Embeddings model; safe to share between threads."""
+
+    def __init__(self, base: Embeddings, max_batch_size: int = EMBED_BATCH_MAX_SIZE,
+                 max_wait_ms: float = EMBED_BATCH_WAIT_MS, cache_size: int = EMBED_CACHE_SIZE):
+        self.base = base
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self._queue = queue.Queue()
+        self._cache = OrderedDict()  # query text -> vector
+        self._cache_lock = threading.Lock()
+        # One forward pass at a time, whether from the worker or a large direct batch
+        self._model_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.batched_texts = 0
+        self.cache_hits = 0
+
+    def embed_query(self, text: str):
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.cache_hits += 1
+                return vector
+        vector = self._submit([text])[0].result()
+        if self.cache_size:
+            with self._cache_lock:
+                self._cache[text] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return vector
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if len(texts) >= self.max_batch_size:
+            # Already a full batch (ingest): no point waiting for company
+            with self._model_lock:
+                self.batches += 1
+                self.batched_texts += len(texts)
+                return self.base.embed_documents(texts)
+        return [future.result() for future in self._submit(texts)]
+
+    def _submit(self, texts):
+        self._ensure_started()
+        futures = []
+        for text in texts:
+            future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        self.requests += len(texts)
+        return futures
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            texts = [text for text, _ in batch]
+            try:
+                with self._model_lock:
+                    vectors = self.base.embed_documents(texts)
+            except Exception as e:
+                logger.warning("Embedding batch of %d failed: %s", len(batch), e)
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_texts += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        with self._cache_lock:
+            cached = len(self._cache)
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_texts / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+            "cache_entries": cached,
+            "cache_hits": self.cache_hits,
+        }
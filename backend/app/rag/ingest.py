@@ -1,15 +1,20 @@
+import argparse
+import hashlib
+import json
+import math
 import os
 import sys
+import time
 from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
 
 # Add backend directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from app.agents.llm import get_embeddings
+from app.rag.vector_index import build_index, current_build
 
 load_dotenv()
 
@@ -17,33 +22,161 @@ load_dotenv()
 if not os.environ.get("GOOGLE_API_KEY"):
     print("WARNING: GOOGLE_API_KEY not found in environment.")
 
-DATA_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'nephrology_reference.txt')
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'chroma_db')
+MANIFEST_PATH = os.path.join(DB_PATH, 'ingest_manifest.json')
 
-def ingest_data():
-    if not os.path.exists(DATA_PATH):
-        print(f"Data file not found at {DATA_PATH}")
+SUPPORTED_EXTENSIONS = (".txt", ".md")
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "64"))
+
+# Memory-mapped copy of the store for VECTOR_STORE=mmap, rebuilt after every
+# ingest that changes anything. Chroma stays the incremental build store.
+VECTOR_INDEX_PATH = os.path.join(DB_PATH, 'vector_index')
+# float16 halves the file; exact search over it is slower (no BLAS), so pair it with IVF
+VECTOR_INDEX_DTYPE = os.environ.get("VECTOR_INDEX_DTYPE", "float32")
+# Corpora at least this large get IVF partitions (sqrt(chunks) of them)
+VECTOR_INDEX_IVF_MIN_CHUNKS = int(os.environ.get("VECTOR_INDEX_IVF_MIN_CHUNKS", "50000"))
+
+# The manifest records, per source file, the file hash and the ids of its chunks.
+# Chunk ids are content hashes, so an edited file only re-embeds the chunks whose
+# text actually changed, and re-running with nothing changed does no work at all.
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return None
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+def _save_manifest(manifest):
+    os.makedirs(DB_PATH, exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def _source_files(data_dir: str):
+    files = []
+    for root, _, names in os.walk(data_dir):
+        for name in sorted(names):
+            if name.endswith(SUPPORTED_EXTENSIONS):
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+def _chunk_file(path: str, rel_path: str, splitter):
+    """Splits one file and assigns each chunk a stable content-hash id."""
+    chunks = splitter.split_documents(TextLoader(path, encoding="utf-8").load())
+    seen = {}
+    ids = []
+    for chunk in chunks:
+        digest = _sha256(f"{rel_path}\n{chunk.page_content}")
+        # The same text twice in one file still needs two ids
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        chunk_id = digest if occurrence == 0 else f"{digest}-{occurrence}"
+        chunk.metadata["chunk_id"] = chunk_id
+        ids.append(chunk_id)
+    return chunks, ids
+
+def _add_in_batches(vector_store, chunks, ids, batch_size: int, label: str):
+    for start in range(0, len(chunks), batch_size):
+        batch_start = time.perf_counter()
+        vector_store.add_documents(chunks[start:start + batch_size], ids=ids[start:start + batch_size])
+        done = min(start + batch_size, len(chunks))
+        print(f"  {label}: embedded {done}/{len(chunks)} chunks ({time.perf_counter() - batch_start:.2f}s)")
+
+def _build_vector_index(vector_store):
+    start = time.perf_counter()
+    data = vector_store.get(include=["embeddings", "documents", "metadatas"])
+    count = len(data["ids"])
+    nlist = int(math.sqrt(count)) if count >= VECTOR_INDEX_IVF_MIN_CHUNKS else 0
+    build_dir = build_index(VECTOR_INDEX_PATH, data["ids"], data["documents"], data["metadatas"],
+                            data["embeddings"], dtype=VECTOR_INDEX_DTYPE, nlist=nlist)
+    print(f"Wrote vector index {os.path.basename(build_dir)}: {count} chunks, {VECTOR_INDEX_DTYPE}"
+          f"{f', {nlist} IVF partitions' if nlist else ''} ({time.perf_counter() - start:.2f}s)")
+
+def ingest_data(data_dir: str = DATA_DIR, batch_size: int = INGEST_BATCH_SIZE, full: bool = False):
+    if not os.path.isdir(data_dir):
+        print(f"Data directory not found at {data_dir}")
         return
 
-    loader = TextLoader(DATA_PATH)
-    documents = loader.load()
+    splitter_config = {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+    manifest = _load_manifest()
+    files = _source_files(data_dir)
+    current = {os.path.relpath(path, data_dir): path for path in files}
+
+    # Work out what changed before loading the embedding model
+    file_hashes = {}
+    for rel_path, path in current.items():
+        with open(path, "rb") as f:
+            file_hashes[rel_path] = hashlib.sha256(f.read()).hexdigest()
+
+    rebuild = full or manifest is None or manifest.get("splitter") != splitter_config
+    known = {} if rebuild else manifest.get("files", {})
+    changed = [p for p in current if known.get(p, {}).get("sha256") != file_hashes[p]]
+    removed = [p for p in known if p not in current]
+
+    if not rebuild and not changed and not removed:
+        if current_build(VECTOR_INDEX_PATH) is None:
+            # Stores ingested before the vector index existed
+            _build_vector_index(Chroma(persist_directory=DB_PATH, embedding_function=get_embeddings()))
+        print(f"Knowledge base is up to date ({len(current)} files).")
+        return
+
+    vector_store = Chroma(persist_directory=DB_PATH, embedding_function=get_embeddings())
+
+    if rebuild:
+        # Stores written before the manifest existed have random ids; start clean
+        existing = vector_store.get(include=[])["ids"]
+        if existing:
+            print(f"Rebuilding: removing {len(existing)} existing chunks.")
+            for start in range(0, len(existing), 5000):
+                vector_store.delete(ids=existing[start:start + 5000])
+        manifest = {"splitter": splitter_config, "files": {}}
+        _save_manifest(manifest)
+
+    splitter = RecursiveCharacterTextSplitter(**splitter_config)
+    added_total = deleted_total = 0
+
+    for rel_path in removed:
+        old_ids = manifest["files"].pop(rel_path)["chunk_ids"]
+        if old_ids:
+            vector_store.delete(ids=old_ids)
+        deleted_total += len(old_ids)
+        _save_manifest(manifest)
+        print(f"{rel_path}: removed, deleted {len(old_ids)} chunks")
+
+    for index, rel_path in enumerate(changed, start=1):
+        chunks, ids = _chunk_file(current[rel_path], rel_path, splitter)
+        old_ids = set(manifest["files"].get(rel_path, {}).get("chunk_ids", []))
+        new_ids = set(ids)
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    chunks = text_splitter.split_documents(documents)
+        stale = sorted(old_ids - new_ids)
+        if stale:
+            vector_store.delete(ids=stale)
+        to_add = [(chunk, chunk_id) for chunk, chunk_id in zip(chunks, ids) if chunk_id not in old_ids]
+        print(f"[{index}/{len(changed)}] {rel_path}: {len(chunks)} chunks, "
+              f"{len(to_add)} new, {len(stale)} deleted, {len(chunks) - len(to_add)} unchanged")
+        if to_add:
+            _add_in_batches(vector_store, [c for c, _ in to_add], [i for _, i in to_add], batch_size, rel_path)
 
-    print(f"Split into {len(chunks)} chunks.")
+        manifest["files"][rel_path] = {"sha256": file_hashes[rel_path], "chunk_ids": ids}
+        _save_manifest(manifest)
+        added_total += len(to_add)
+        deleted_total += len(stale)
 
-    # Use Gemini Embeddings
-    embeddings = get_embeddings()
-    
-    # Initialize Chroma
-    vector_store = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=DB_PATH
-    )
-    
-    print(f"Ingested {len(chunks)} chunks into ChromaDB at {DB_PATH}")
+    print(f"Ingested {added_total} new chunks and deleted {deleted_total} into ChromaDB at {DB_PATH}")
+    _build_vector_index(vector_store)
+    print("If the server is running, reload it: curl -X POST http://localhost:8000/admin/reload-retriever")
 
 if __name__ == "__main__":
-    ingest_data()
+    parser = argparse.ArgumentParser(description="Incrementally ingest reference documents into ChromaDB.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="directory of .txt/.md reference documents")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="chunks embedded per batch")
+    parser.add_argument("--full", action="store_true", help="drop everything and re-embed all files")
+    args = parser.parse_args()
+    ingest_data(args.data_dir, args.batch_size, args.full)
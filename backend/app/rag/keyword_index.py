@@ -0,0 +1,70 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+# In-memory Okapi BM25 over the knowledge-base chunks. It complements the dense
+# MiniLM search on exact terms the embedding blurs: drug names (Furosemide vs
+# Lisinopril), lab values (eGFR), numbers and abbreviations.
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "if", "in",
+    "is", "it", "its", "me", "my", "of", "on", "or", "should", "that", "the", "their", "this", "to", "was", "what",
+    "when", "which", "with", "you", "your", "about", "have", "has", "am", "will", "would", "there", "these",
+}
+
+def tokenize(text: str):
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS]
+
+class BM25Index:
+    def __init__(self, entries):
+        """entries: iterable of (key, text)."""
+        self._postings = defaultdict(list)  # term -> [(doc index, term frequency)]
+        self._keys = []
+        self._terms = []                    # doc index -> set of terms
+        self._lengths = []
+        for key, text in entries:
+            counts = Counter(tokenize(text))
+            index = len(self._keys)
+            self._keys.append(key)
+            self._terms.append(set(counts))
+            self._lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings[term].append((index, tf))
+        self._positions = {key: i for i, key in enumerate(self._keys)}
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self._keys) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, limit: int):
+        """Returns [(key, score)] for the best `limit` chunks, highest score first."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for index, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[index] / (self._avg_length or 1.0))
+                scores[index] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(self._keys[index], score) for index, score in best]
+
+    def term_weights(self, text: str) -> dict:
+        """Distinct terms of `text` that occur in the index, weighted by idf."""
+        return {t: self.idf(t) for t in set(tokenize(text)) if t in self._postings}
+
+    def matched_weight(self, key, weights: dict) -> float:
+        """Share (0-1) of the idf weight in `weights` whose terms appear in chunk `key`."""
+        total = sum(weights.values())
+        index = self._positions.get(key)
+        if not total or index is None:
+            return 0.0
+        terms = self._terms[index]
+        return sum(w for t, w in weights.items() if t in terms) / total
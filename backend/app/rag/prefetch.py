@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .answer_cache import answer_cache
+from .retriever import rag_query, on_reload
+from ..concurrency import run_blocking
+from ..metrics import Trace, start_trace, cache_lookups_total
+from ..patient_context import patient_context
+
+logger = logging.getLogger(__name__)
+
+# Speculative retrieval. Right after a patient is identified the next turn is
+# usually a question about their diagnosis or one of their medications, so the
+# receptionist starts retrieval for those topics in the background and stages
+# the results per session. The clinical node compares each rag_tool query the
+# model issues with the staged topics and, on a near-identical match, uses
+# those passages instead of running retrieval for that query.
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "1").lower() in ("1", "true", "yes")
+PREFETCH_MAX_TOPICS = int(os.environ.get("PREFETCH_MAX_TOPICS", "4"))
+PREFETCH_MATCH_THRESHOLD = float(os.environ.get("PREFETCH_MATCH_THRESHOLD", "0.85"))
+PREFETCH_TTL = float(os.environ.get("PREFETCH_TTL", "900"))
+PREFETCH_MAX_SESSIONS = int(os.environ.get("PREFETCH_MAX_SESSIONS", "5000"))
+
+def prefetch_topics(patient_data: dict):
+    """Retrieval queries worth running ahead of time for this patient."""
+    topics = []
+    diagnosis = patient_data.get("diagnosis")
+    if diagnosis:
+        topics.append(f"What should I know about {diagnosis}: symptoms, diet and warning signs?")
+    for medication in patient_data.get("medications") or []:
+        drug = (medication or "").split()[0] if medication else ""
+        if drug:
+            topics.append(f"How should I take {drug} and what are its side effects?")
+    return list(dict.fromkeys(topics))[:PREFETCH_MAX_TOPICS]
+
+class _SessionPrefetch:
+    __slots__ = ("version", "task", "entries", "expires_at")
+
+    def __init__(self, version: str, expires_at: float):
+        self.version = version
+        self.task = None
+        self.entries = []  # (topic, unit vector, rag_query results)
+        self.expires_at = expires_at
+
+class RetrievalPrefetcher:
+    def __init__(self, threshold: float, ttl_seconds: float, max_sessions: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session id -> _SessionPrefetch
+        self._lock = threading.Lock()
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.hits = 0
+        self.misses = 0
+
+    def schedule(self, session_id: str, patient_data: dict):
+        """Starts prefetching for a newly identified patient. Must be called on the event loop."""
+        if not patient_data:
+            return
+        patient = patient_context(patient_data)
+        with self._lock:
+            current = self._sessions.get(session_id)
+            if current is not None and current.version == patient.version:
+                return
+            prefetch = _SessionPrefetch(patient.version, time.monotonic() + self.ttl_seconds)
+            self._sessions[session_id] = prefetch
+            self._sessions.move_to_end(session_id)
+            evicted = []
+            while len(self._sessions) > self.max_sessions:
+                evicted.append(self._sessions.popitem(last=False)[1])
+        for old in [current] + evicted:
+            self._cancel_task(old)
+        self.started += 1
+        prefetch.task = asyncio.create_task(self._run(session_id, prefetch, prefetch_topics(patient_data), patient.rag))
+
+    async def _run(self, session_id: str, prefetch: _SessionPrefetch, topics: list, context: str):
+        # Its own trace, so background spans don't land in the turn that started it
+        with start_trace(Trace()) as trace:
+            for topic in topics:
+                try:
+                    vector = await run_blocking(answer_cache.embed, topic)
+                    results = await run_blocking(rag_query, topic, context)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning("Retrieval prefetch failed for %s: %s", session_id, e)
+                    return
+                # Visible to lookups topic by topic, as soon as each one is ready
+                prefetch.entries.append((topic, vector, results))
+            self.completed += 1
+            logger.debug("Prefetched %d topics for %s in %.0fms", len(topics), session_id,
+                         trace.breakdown()["total_ms"])
+
+    def has_entries(self, session_id: str) -> bool:
+        with self._lock:
+            prefetch = self._sessions.get(session_id)
+            return prefetch is not None and bool(prefetch.entries)
+
+    def lookup(self, session_id: str, vector):
+        """Staged results for the topic closest to the query vector, or None."""
+        with self._lock:
+            prefetch = self._sessions.get(session_id)
+            if prefetch is not None and prefetch.expires_at < time.monotonic():
+                del self._sessions[session_id]
+                prefetch = None
+            entries = list(prefetch.entries) if prefetch is not None else []
+        if not entries:
+            return None
+        best, best_score = None, self.threshold
+        for topic, topic_vector, results in entries:
+            score = float(np.dot(vector, topic_vector))
+            if score >= best_score:
+                best, best_score = results, score
+        if best is None:
+            self.misses += 1
+            cache_lookups_total.inc(cache="retrieval_prefetch", result="miss")
+            return None
+        self.hits += 1
+        cache_lookups_total.inc(cache="retrieval_prefetch", result="hit")
+        return best
+
+    def cancel(self, session_id: str):
+        """Stops and drops a session's prefetch, e.g. when the session ends."""
+        with self._lock:
+            prefetch = self._sessions.pop(session_id, None)
+        self._cancel_task(prefetch)
+
+    def clear(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for prefetch in sessions:
+            self._cancel_task(prefetch)
+
+    def _cancel_task(self, prefetch):
+        if prefetch is not None and prefetch.task is not None and not prefetch.task.done():
+            # May be called off the loop (reload endpoint runs in a worker thread)
+            prefetch.task.get_loop().call_soon_threadsafe(prefetch.task.cancel)
+            self.cancelled += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = len(self._sessions)
+        return {"sessions": sessions, "started": self.started, "completed": self.completed,
+                "cancelled": self.cancelled, "hits": self.hits, "misses": self.misses}
+
+retrieval_prefetch = RetrievalPrefetcher(PREFETCH_MATCH_THRESHOLD, PREFETCH_TTL, PREFETCH_MAX_SESSIONS)
+# Staged passages come from the old store after a re-ingest
+on_reload(retrieval_prefetch.clear)
@@ -1,37 +1,231 @@
+import logging
+import math
 import os
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+import threading
+import time
+
+from langchain_core.documents import Document
+
+from .keyword_index import BM25Index
+from ..metrics import span
+
+logger = logging.getLogger(__name__)
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'chroma_db')
 
+# Vector store behind rag_query: "chroma" (a Chroma client on chroma_db) or "mmap"
+# (the memory-mapped index that ingest writes next to it, see vector_index.py)
+VECTOR_STORE = os.environ.get("VECTOR_STORE", "chroma").lower()
+VECTOR_INDEX_PATH = os.path.join(DB_PATH, "vector_index")
+VECTOR_INDEX_NPROBE = int(os.environ.get("VECTOR_INDEX_NPROBE", "8"))  # IVF partitions scanned per query
+
+# Hybrid retrieval settings (see retrieve())
+RAG_TOP_K = int(os.environ.get("RAG_TOP_K", "3"))
+RAG_CANDIDATES = int(os.environ.get("RAG_CANDIDATES", "20"))        # per retriever, before fusion
+RAG_FUSION_K = int(os.environ.get("RAG_FUSION_K", "60"))            # reciprocal rank fusion constant
+RAG_CONTEXT_BOOST = float(os.environ.get("RAG_CONTEXT_BOOST", "0.3"))
+# Local cross-encoder, e.g. cross-encoder/ms-marco-MiniLM-L-6-v2; empty disables reranking
+RAG_RERANKER = os.environ.get("RAG_RERANKER", "")
+RAG_RERANK_CANDIDATES = int(os.environ.get("RAG_RERANK_CANDIDATES", "10"))
+# Labels in the patient context string that aren't clinical terms
+CONTEXT_LABELS = ("diagnosis", "meds")
+
+# Process-wide singletons. The embedding model is expensive to load (it pulls a
+# sentence-transformers model from disk), so it is created once and shared by
+# every request thread. The Chroma store is cheap to reopen and is swapped out by
+# reload_retriever() after a re-ingest.
+_embeddings = None
+_vector_store = None
+_keyword_index = None
+_keyword_index_store = None
+_reranker = None
+_lock = threading.RLock()
+# Called after reload_retriever(), e.g. to drop answers cached from the old store
+_reload_callbacks = []
+
+def get_shared_embeddings():
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                from ..agents.llm import get_embeddings
+                start = time.perf_counter()
+                embeddings = get_embeddings()
+                # Run one forward pass so the first real query doesn't pay for lazy init
+                embeddings.embed_query("warmup")
+                _embeddings = embeddings
+                logger.info("Embedding model loaded in %.2fs", time.perf_counter() - start)
+    return _embeddings
+
+def _open_vector_store():
+    start = time.perf_counter()
+    if VECTOR_STORE == "mmap":
+        from .vector_index import MmapVectorIndex
+        store = MmapVectorIndex(VECTOR_INDEX_PATH, get_shared_embeddings(), VECTOR_INDEX_NPROBE)
+        logger.info("Vector index %s (%d chunks) mapped in %.2fs", store.build_dir, len(store),
+                    time.perf_counter() - start)
+        return store
+    # chromadb is a heavy import; only pay for it when the store is first opened
+    from langchain_chroma import Chroma
+    store = Chroma(persist_directory=DB_PATH, embedding_function=get_shared_embeddings())
+    logger.info("Chroma store opened at %s in %.2fs", DB_PATH, time.perf_counter() - start)
+    return store
+
+def get_vector_store():
+    global _vector_store
+    store = _vector_store
+    if store is None:
+        with _lock:
+            if _vector_store is None:
+                _vector_store = _open_vector_store()
+            store = _vector_store
+    return store
+
+def warm_retriever():
+    """Loads the embedding model, opens the vector store and builds the keyword index. Called once at startup."""
+    start = time.perf_counter()
+    get_keyword_index()
+    _get_reranker()
+    logger.info("Retriever warm-up finished in %.2fs", time.perf_counter() - start)
+
+def reload_retriever():
+    """Reopens the vector store, e.g. after chroma_db was re-ingested.
+
+    The embedding model is kept. Queries already running keep using the old store.
+    """
+    global _vector_store
+    with _lock:
+        _vector_store = _open_vector_store()
+    get_keyword_index()
+    for callback in _reload_callbacks:
+        callback()
+
+def on_reload(callback):
+    _reload_callbacks.append(callback)
+
+def kb_version() -> float:
+    """Changes whenever chroma_db is rewritten by an ingest, even from another process."""
+    marker = os.path.join(VECTOR_INDEX_PATH, "CURRENT") if VECTOR_STORE == "mmap" else os.path.join(DB_PATH, "chroma.sqlite3")
+    try:
+        return os.path.getmtime(marker)
+    except OSError:
+        return 0.0
+
 def get_retriever():
-    from ..agents.llm import get_embeddings
-    embeddings = get_embeddings()
-        
-    vector_store = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
-    return vector_store.as_retriever(search_kwargs={"k": 3})
-
-def rag_query(question: str, patient_context: str = ""):
-    retriever = get_retriever()
-    
-    query = question
-    if patient_context:
-        query = f"Context: {patient_context}\nQuestion: {question}"
-        
-    docs = retriever.invoke(query)
-    
+    # LangChain retriever interface; Chroma only (VECTOR_STORE=chroma)
+    return get_vector_store().as_retriever(search_kwargs={"k": RAG_TOP_K})
+
+def _doc_key(doc):
+    # Ingest stores a content-hash chunk_id in the metadata; older stores only have the text
+    return doc.metadata.get("chunk_id") or getattr(doc, "id", None) or doc.page_content
+
+def get_keyword_index():
+    """BM25 index over the chunks of the current vector store, rebuilt when the store is swapped."""
+    global _keyword_index, _keyword_index_store
+    store = get_vector_store()
+    if _keyword_index_store is not store:
+        with _lock:
+            if _keyword_index_store is not store:
+                start = time.perf_counter()
+                data = store.get(include=["documents", "metadatas"])
+                docs = {}
+                for chunk_id, text, metadata in zip(data["ids"], data["documents"], data["metadatas"]):
+                    metadata = metadata or {}
+                    key = metadata.get("chunk_id") or chunk_id
+                    docs[key] = Document(page_content=text, metadata=metadata)
+                _keyword_index = (BM25Index((key, doc.page_content) for key, doc in docs.items()), docs)
+                _keyword_index_store = store
+                logger.info("Keyword index built over %d chunks in %.2fs", len(docs), time.perf_counter() - start)
+    return _keyword_index
+
+def _get_reranker():
+    global _reranker
+    if _reranker is None and RAG_RERANKER:
+        with _lock:
+            if _reranker is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    _reranker = CrossEncoder(RAG_RERANKER)
+                except Exception as e:
+                    logger.warning("Reranker %s unavailable, using fused scores: %s", RAG_RERANKER, e)
+                    _reranker = False
+    return _reranker or None
+
+def _context_weights(index: BM25Index, patient_context: str) -> dict:
+    weights = index.term_weights(patient_context) if patient_context else {}
+    for label in CONTEXT_LABELS:
+        weights.pop(label, None)
+    return weights
+
+def retrieve(question: str, k: int = None, patient_context: str = "", dense: bool = True, keyword: bool = True,
+             rerank: bool = None):
+    """
+    Hybrid search: dense (Chroma) and BM25 candidates fused by reciprocal rank,
+    boosted by overlap with the patient's context terms, then optionally
+    reranked by a cross-encoder (RAG_RERANKER; rerank=False skips it).
+    Returns [(Document, score)] best first. Only the question is embedded;
+    patient context never changes the query vector.
+    """
+    k = k or RAG_TOP_K
+    index, docs = get_keyword_index()
+    unindexed = {}  # dense hits missing from the keyword index (store changed underneath)
+    rankings = []
+    if dense:
+        with span("retrieval", "dense"):
+            hits = get_vector_store().similarity_search_with_relevance_scores(question, k=RAG_CANDIDATES)
+        ranking = []
+        for doc, _ in hits:
+            key = _doc_key(doc)
+            if key not in docs:
+                unindexed[key] = doc
+            ranking.append(key)
+        rankings.append(ranking)
+    if keyword:
+        with span("retrieval", "bm25"):
+            rankings.append([key for key, _ in index.search(question, RAG_CANDIDATES)])
+
+    fused = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (RAG_FUSION_K + rank + 1)
+
+    def doc_for(key):
+        return docs.get(key) or unindexed[key]
+
+    # Patient context as a boost: chunks mentioning the patient's drugs or stage
+    # move up, weighted by how specific (idf) the matching terms are
+    weights = _context_weights(index, patient_context)
+    boosts = {key: 1.0 + RAG_CONTEXT_BOOST * index.matched_weight(key, weights) for key in fused}
+    scored = sorted(((fused[key] * boosts[key], key) for key in fused), reverse=True)
+
+    reranker = _get_reranker() if rerank is not False else None
+    if reranker is not None and scored:
+        top = [key for _, key in scored[:RAG_RERANK_CANDIDATES]]
+        with span("retrieval", "rerank", candidates=len(top)):
+            logits = reranker.predict([(question, doc_for(key).page_content) for key in top])
+        scored = sorted(((boosts[key] / (1.0 + math.exp(-float(logit))), key) for key, logit in zip(top, logits)),
+                        reverse=True)
+
+    return [(doc_for(key), score) for score, key in scored[:k]]
+
+def rag_query(question: str, patient_context: str = "", k: int = None):
+    with span("retrieval", "hybrid") as retrieval_span:
+        hits = retrieve(question, k=k, patient_context=patient_context)
+        retrieval_span.set(docs=len(hits))
+
     results = []
-    for doc in docs:
+    for doc, score in hits:
         source_path = doc.metadata.get("source", "Nephrology Reference")
         # Clean up source to show only filename if it's a path
         if os.path.exists(source_path):
             source_name = os.path.basename(source_path)
         else:
             source_name = source_path
-            
+
         results.append({
             "content": doc.page_content,
-            "source": source_name
+            "source": source_name,
+            "score": round(score, 4)
         })
-    
+
     return results
@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Read-only vector index for the reference corpus, served without a Chroma client.
+# A build is a directory of flat files:
+#
+#   vectors.npy     (n, dim) unit-normalized float16/float32, opened with mmap
+#   chunks.bin      one JSON record per chunk: {"id", "text", "metadata"}
+#   offsets.npy     (n + 1) byte offsets of the records in chunks.bin
+#   centroids.npy   IVF only: (nlist, dim) partition centroids
+#   partitions.npy  IVF only: (nlist + 1) row offsets; rows are stored grouped by partition
+#   header.json     count, dim, dtype, nlist
+#
+# Builds are written to a fresh directory and published by atomically replacing
+# the CURRENT pointer, so serving workers never see a half-written index and can
+# keep their old mapping until they reload. Every worker maps the same files,
+# so the OS page cache holds one copy however many workers there are.
+SEARCH_BLOCK_ROWS = 8192
+IVF_TRAIN_ITERATIONS = 10
+IVF_TRAIN_SAMPLE = 100_000
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+def _train_centroids(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of the (unit) vectors."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(len(vectors), IVF_TRAIN_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(IVF_TRAIN_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = _unit(centroids)
+    return centroids
+
+def build_index(path: str, ids, texts, metadatas, embeddings, dtype: str = "float32", nlist: int = 0) -> str:
+    """Writes a new build under `path` and makes it current. Returns the build directory."""
+    vectors = _unit(embeddings)
+    order = np.arange(len(vectors))
+    centroids = partitions = None
+    if nlist and len(vectors) >= nlist * 4:
+        centroids = _train_centroids(vectors, nlist)
+        assignment = np.concatenate([
+            np.argmax(vectors[i:i + SEARCH_BLOCK_ROWS] @ centroids.T, axis=1)
+            for i in range(0, len(vectors), SEARCH_BLOCK_ROWS)
+        ])
+        order = np.argsort(assignment, kind="stable")
+        partitions = np.searchsorted(assignment[order], np.arange(nlist + 1)).astype(np.int64)
+    else:
+        nlist = 0
+
+    os.makedirs(path, exist_ok=True)
+    build_dir = os.path.join(path, f"build-{time.time_ns()}")
+    os.makedirs(build_dir)
+    np.save(os.path.join(build_dir, "vectors.npy"), vectors[order].astype(dtype))
+    offsets = [0]
+    with open(os.path.join(build_dir, "chunks.bin"), "wb") as f:
+        for i in order:
+            record = json.dumps({"id": ids[i], "text": texts[i], "metadata": metadatas[i] or {}},
+                                separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            f.write(record)
+            offsets.append(offsets[-1] + len(record))
+    np.save(os.path.join(build_dir, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    if nlist:
+        np.save(os.path.join(build_dir, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(build_dir, "partitions.npy"), partitions)
+    with open(os.path.join(build_dir, "header.json"), "w") as f:
+        json.dump({"count": len(vectors), "dim": int(vectors.shape[1]) if len(vectors) else 0,
+                   "dtype": dtype, "nlist": nlist}, f)
+
+    pointer = os.path.join(path, "CURRENT")
+    with open(pointer + ".tmp", "w") as f:
+        f.write(os.path.basename(build_dir))
+    os.replace(pointer + ".tmp", pointer)
+
+    # Older builds can go: workers that still map them keep the open files
+    for name in os.listdir(path):
+        if name.startswith("build-") and name != os.path.basename(build_dir):
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    return build_dir
+
+def current_build(path: str):
+    try:
+        with open(os.path.join(path, "CURRENT")) as f:
+            return os.path.join(path, f.read().strip())
+    except OSError:
+        return None
+
+class MmapVectorIndex:
+    """
+    The subset of the Chroma vector store API the retriever uses
+    (similarity_search[_with_relevance_scores] and get) over a memory-mapped build.
+    """
+
+    def __init__(self, path: str, embedding_function, nprobe: int = 8):
+        build_dir = current_build(path)
+        if build_dir is None:
+            raise FileNotFoundError(f"No vector index at {path}; run app/rag/ingest.py")
+        self.build_dir = build_dir
+        self.embedding_function = embedding_function
+        self.nprobe = nprobe
+        with open(os.path.join(build_dir, "header.json")) as f:
+            self.header = json.load(f)
+        self._vectors = np.load(os.path.join(build_dir, "vectors.npy"), mmap_mode="r")
+        self._offsets = np.load(os.path.join(build_dir, "offsets.npy"), mmap_mode="r")
+        self._chunks = np.memmap(os.path.join(build_dir, "chunks.bin"), dtype=np.uint8, mode="r") \
+            if self._offsets[-1] else np.zeros(0, dtype=np.uint8)
+        self._centroids = self._partitions = None
+        if self.header["nlist"]:
+            self._centroids = np.load(os.path.join(build_dir, "centroids.npy"))
+            self._partitions = np.load(os.path.join(build_dir, "partitions.npy"))
+
+    def __len__(self):
+        return self.header["count"]
+
+    def _record(self, row: int) -> dict:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return json.loads(self._chunks[start:end].tobytes())
+
+    def _scores(self, query: np.ndarray, start: int, end: int) -> np.ndarray:
+        # float16 has no BLAS path; convert a block at a time to keep memory flat
+        if self._vectors.dtype == np.float32:
+            return np.asarray(self._vectors[start:end]) @ query
+        out = np.empty(end - start, dtype=np.float32)
+        for i in range(start, end, SEARCH_BLOCK_ROWS):
+            block = self._vectors[i:min(end, i + SEARCH_BLOCK_ROWS)]
+            out[i - start:i - start + len(block)] = np.asarray(block, dtype=np.float32) @ query
+        return out
+
+    def search_vector(self, query, k: int):
+        """Returns [(row, cosine)] best first."""
+        count = len(self)
+        if not count:
+            return []
+        query = _unit(query)
+        if self._centroids is None:
+            rows = np.arange(count)
+            scores = self._scores(query, 0, count)
+        else:
+            nprobe = min(self.nprobe, len(self._centroids))
+            probe = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+            parts = [(int(self._partitions[p]), int(self._partitions[p + 1])) for p in probe]
+            rows = np.concatenate([np.arange(s, e) for s, e in parts])
+            scores = np.concatenate([self._scores(query, s, e) for s, e in parts])
+        k = min(k, len(rows))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def _document(self, row: int) -> Document:
+        record = self._record(row)
+        metadata = dict(record["metadata"])
+        metadata.setdefault("chunk_id", record["id"])
+        return Document(page_content=record["text"], metadata=metadata)
+
+    def similarity_search_with_relevance_scores(self, query: str, k: int = 4):
+        vector = np.asarray(self.embedding_function.embed_query(query), dtype=np.float32)
+        return [(self._document(row), score) for row, score in self.search_vector(vector, k)]
+
+    def similarity_search(self, query: str, k: int = 4):
+        return [doc for doc, _ in self.similarity_search_with_relevance_scores(query, k)]
+
+    def get(self, include=None):
+        records = [self._record(row) for row in range(len(self))]
+        return {
+            "ids": [r["id"] for r in records],
+            "documents": [r["text"] for r in records],
+            "metadatas": [r["metadata"] for r in records],
+        }
@@ -1,174 +1,233 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from ..db import get_db
+from ..db import get_db, SessionLocal
 from ..models import Session as DbSession, Interaction, Patient
 from ..schemas import ChatRequest, ChatResponse
 from ..agents.graph import graph
+from ..agents.events import REPLY_TAG
+from ..agents.context import compact_state, content_text
+from ..agents.tools import log_agent_event
+from ..concurrency import run_blocking
+from ..metrics import Trace, start_trace, span, turn_seconds, turns_total, cache_lookups_total
+from ..session_store import session_store
+from ..write_behind import write_behind
+from ..snapshots import snapshot_writer, load_snapshot, interactions_after
+from ..patient_context import patient_context, patient_contexts, patient_record, row_version
+from ..rag.prefetch import retrieval_prefetch
+from typing import Optional
+import datetime
+import json
+import logging
+import time
 import uuid
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# In-memory store for graph state (for POC simplicity)
-# In production, this would be in Redis or Postgres
-graph_state_store = {}
+def _load_turn_state(db: Session, session_id: Optional[str], message: str):
+    """Part of a turn before the graph runs: session, state and user message log."""
+    current_state = None
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
-    session_id = request.session_id
-    
     # 1. Create session if needed
     if not session_id:
         session_id = str(uuid.uuid4())
-        new_session = DbSession(id=session_id)
-        db.add(new_session)
-        db.commit()
+        write_behind.submit(DbSession(id=session_id, started_at=datetime.datetime.utcnow()))
         # Initialize empty state
-        graph_state_store[session_id] = {
+        current_state = {
             "session_id": session_id,
             "messages": [],
             "patient_data": None,
             "current_agent": "receptionist",
             "handoff_to_clinical": False
         }
+
+    # 2. Retrieve state (try the session store first, then DB reconstruction)
+    if current_state is None:
+        current_state = session_store.get(session_id)
+        cache_lookups_total.inc(cache="session_store", result="hit" if current_state else "miss")
     
-    # 2. Log user message
-    user_interaction = Interaction(
+    if not current_state:
+        with span("db", "reconstruct_state"):
+            current_state = _reconstruct_state(db, session_id)
+    # Stored states and snapshots carry a copy of the patient record
+    current_state = _refresh_patient(db, current_state)
+
+    # 3. Log user message
+    write_behind.submit(Interaction(
         session_id=session_id,
         role="user",
-        message=request.message
-    )
-    db.add(user_interaction)
-    db.commit()
+        message=message,
+        timestamp=datetime.datetime.utcnow()
+    ))
 
-    # 3. Retrieve state (try memory first, then DB reconstruction)
-    current_state = graph_state_store.get(session_id)
-    
-    if not current_state:
-        # Reconstruct from DB
-        print(f"DEBUG: Reconstructing state for {session_id}")
-        db_session = db.query(DbSession).filter(DbSession.id == session_id).first()
-        if db_session:
-            # Fetch interactions
-            interactions = db.query(Interaction).filter(Interaction.session_id == session_id).order_by(Interaction.timestamp).all()
-            # Note: We exclude the just-added user message from history to avoid duplication if we append it later?
-            # Actually, graph expects full history. The user message was just added to DB.
-            # So 'interactions' includes the current user message.
-            # But the graph logic usually appends the NEW message to the state.
-            # So let's reconstruct history EXCLUDING the last one (current request), or just handle it carefully.
-            
-            # Let's rebuild messages list.
-            # The 'current_state' passed to graph should contain the history.
-            # Then we append the new message.
-            # So we should exclude the *current* message from the reconstructed history if we are going to append it again.
-            # But wait, 'interactions' has ALL messages including the one we just inserted at step 2.
-            
-            messages = []
-            # We need to be careful. The current user message is already in DB (step 2).
-            # But we want to reconstruct the history BEFORE this message, and then append it.
-            # So we exclude the last interaction which is the current user message.
-            
-            # However, if there are multiple concurrent requests (unlikely for POC), this might be flaky.
-            # Better approach: Filter out the specific interaction we just added? 
-            # Or just take everything except the last one.
-            
-            # Let's verify if interactions[-1] is indeed the user message we just added.
-            if interactions and interactions[-1].id == user_interaction.id:
-                 history_interactions = interactions[:-1]
-            else:
-                 # This shouldn't happen if we just added it and queried ordered by timestamp
-                 history_interactions = interactions
-
-            for i in history_interactions:
-                messages.append({"role": i.role, "content": i.message})
-            
-            # Fetch patient data
-            patient_data = None
-            if db_session.patient_id:
-                p = db.query(Patient).filter(Patient.id == db_session.patient_id).first()
-                if p:
-                    patient_data = {
-                        "status": "ok",
-                        "id": p.id,
-                        "name": p.name,
-                        "discharge_date": str(p.discharge_date),
-                        "diagnosis": p.primary_diagnosis,
-                        "medications": p.medications,
-                        "diet": p.dietary_restrictions,
-                        "warning_signs": p.warning_signs,
-                        "instructions": p.discharge_instructions
-                    }
-
-            # Determine handoff/current agent
-            handoff = False
-            
-            # Look at the last ASSISTANT message to determine state
-            # Filter for assistant messages
-            asst_msgs = [i for i in interactions[:-1] if i.role == "assistant"]
-            if asst_msgs:
-                last_asst = asst_msgs[-1]
-                if last_asst.agent == "clinical":
-                    handoff = True
-                elif last_asst.agent == "receptionist":
-                    if "clinical agent" in last_asst.message.lower() or "connect you" in last_asst.message.lower():
-                        handoff = True
-            
-            current_state = {
-                "session_id": session_id,
-                "messages": messages,
-                "patient_data": patient_data,
-                "current_agent": "clinical" if handoff else "receptionist",
-                "handoff_to_clinical": handoff
-            }
-        else:
-            # Fallback (shouldn't happen if session_id is valid)
-            current_state = {
-                "session_id": session_id,
-                "messages": [],
-                "patient_data": None,
-                "current_agent": "receptionist",
-                "handoff_to_clinical": False
-            }
-
-    # Append new message (the one we just received)
-    current_state["messages"].append({"role": "user", "content": request.message})
-
-    # 4. Invoke Graph
-    print(f"DEBUG: Invoking graph. Handoff state: {current_state.get('handoff_to_clinical')}")
-    result = graph.invoke(current_state)
-    
-    # Update state store
-    graph_state_store[session_id] = result
-    
-    # Update DB Session with patient_id if found
-    if result.get("patient_data") and result["patient_data"].get("id"):
-        db_session = db.query(DbSession).filter(DbSession.id == session_id).first()
-        if db_session and not db_session.patient_id:
-            db_session.patient_id = result["patient_data"]["id"]
-            db.commit()
-    
-    # Extract response
-    last_message = result["messages"][-1]
-    reply_content = last_message["content"]
-    
-    # Handle case where content is a list (e.g. from Anthropic/Gemini)
-    if isinstance(reply_content, list):
-        # Extract text from blocks
-        reply_text = " ".join([block["text"] for block in reply_content if block.get("type") == "text"])
+    return session_id, current_state
+
+def _reconstruct_state(db: Session, session_id: str):
+    # Rows this worker queued but hasn't written yet would be missing from the
+    # history, so write them out first.
+    write_behind.flush()
+    snapshot = load_snapshot(db, session_id)
+    if snapshot is None:
+        # Sessions from before snapshots existed: replay the whole transcript once
+        logger.debug("Replaying history for %s", session_id)
+        return _replay_history(db, session_id)
+
+    logger.debug("Resuming %s from snapshot v%d", session_id, snapshot.version)
+    current_state = dict(snapshot.state)
+    # Normally empty: only turns logged without a snapshot (e.g. a crash in between)
+    tail = interactions_after(db, session_id, snapshot.last_interaction_at)
+    current_state["messages"] = list(current_state.get("messages") or []) + [
+        {"role": i.role, "content": i.message, **({"agent": i.agent} if i.agent else {})} for i in tail
+    ]
+    handoff = _handoff_from(tail)
+    if handoff is not None:
+        current_state["handoff_to_clinical"] = handoff
+        current_state["current_agent"] = "clinical" if handoff else "receptionist"
+    return current_state
+
+def _handoff_from(interactions) -> Optional[bool]:
+    """Handoff flag implied by the last assistant message, or None if there is none."""
+    asst_msgs = [i for i in interactions if i.role == "assistant"]
+    if not asst_msgs:
+        return None
+    last_asst = asst_msgs[-1]
+    if last_asst.agent == "clinical":
+        return True
+    message = last_asst.message.lower()
+    return "clinical agent" in message or "connect you" in message
+
+def _replay_history(db: Session, session_id: str):
+    db_session = db.query(DbSession).filter(DbSession.id == session_id).first()
+    if db_session:
+        # Fetch interactions. The current user message is logged only after
+        # this (step 3), so these are exactly the turns before it.
+        interactions = interactions_after(db, session_id)
+
+        messages = []
+        for i in interactions:
+            messages.append({"role": i.role, "content": i.message})
+        
+        # Fetch patient data
+        patient_data = None
+        if db_session.patient_id:
+            p = db.query(Patient).filter(Patient.id == db_session.patient_id).first()
+            if p:
+                patient_data = patient_record(p)
+
+        # Determine handoff/current agent
+        handoff = bool(_handoff_from(interactions))
+        
+        current_state = {
+            "session_id": session_id,
+            "messages": messages,
+            "patient_data": patient_data,
+            "current_agent": "clinical" if handoff else "receptionist",
+            "handoff_to_clinical": handoff
+        }
     else:
-        reply_text = str(reply_content)
-    
-    # Determine agent
-    agent_name = last_message.get("agent", "receptionist")
-    
+        # Fallback (shouldn't happen if session_id is valid)
+        current_state = {
+            "session_id": session_id,
+            "messages": [],
+            "patient_data": None,
+            "current_agent": "receptionist",
+            "handoff_to_clinical": False
+        }
+    return current_state
+
+def _refresh_patient(db: Session, state: dict) -> dict:
+    """Reloads the patient record kept in the state if the row was edited since it was read."""
+    record = state.get("patient_data")
+    if not record or not record.get("id") or not patient_contexts.needs_check(record):
+        return state
+    with span("db", "patient_version"):
+        row = db.query(Patient.updated_at).filter(Patient.id == record["id"]).first()
+        if row is None or row_version(row.updated_at) == record.get("updated_at"):
+            if row is not None:
+                # needs_check() compares against the cached version, so cache this one
+                patient_context(record)
+                patient_contexts.mark_checked(record["id"])
+            return state
+        p = db.query(Patient).filter(Patient.id == record["id"]).first()
+    logger.debug("Patient %s changed, reloading the record for %s", record["id"], state.get("session_id"))
+    refreshed = patient_record(p)
+    # Cache the new version before marking it checked, so older copies in other sessions still reload
+    patient_context(refreshed)
+    patient_contexts.mark_checked(record["id"])
+    return {**state, "patient_data": refreshed}
+
+def _patient_id(state: dict):
+    return (state.get("patient_data") or {}).get("id")
+
+def _save_turn_result(session_id: str, result: dict, reply_text: str, agent_name: str, previous_patient_id: Optional[int]):
+    """Part of a turn after the graph runs: state store, patient link, reply log and snapshot."""
+    state = compact_state(result)
+    session_store.set(session_id, state)
+
+    # Link the session to the patient the first time they are identified
+    patient_id = _patient_id(result)
+    if patient_id and patient_id != previous_patient_id:
+        write_behind.submit(
+            update(DbSession)
+            .where(DbSession.id == session_id, DbSession.patient_id.is_(None))
+            .values(patient_id=patient_id)
+        )
+
     # Log assistant message
-    asst_interaction = Interaction(
+    replied_at = datetime.datetime.utcnow()
+    write_behind.submit(Interaction(
         session_id=session_id,
         role="assistant",
         agent=agent_name,
-        message=reply_text
-    )
-    db.add(asst_interaction)
-    db.commit()
+        message=reply_text,
+        timestamp=replied_at
+    ))
+    # Queued after the reply, so the snapshot never covers rows not yet written
+    write_behind.submit(snapshot_writer(session_id, state, replied_at))
+
+def _extract_reply(result: dict):
+    last_message = result["messages"][-1]
+    reply_text = content_text(last_message["content"])
+    # Determine agent
+    agent_name = last_message.get("agent", "receptionist")
+    return reply_text, agent_name
+
+async def _finish_turn(trace: Trace, session_id: Optional[str], endpoint: str, agent_name: Optional[str], status: str):
+    turn_seconds.observe(time.perf_counter() - trace.started, endpoint=endpoint)
+    turns_total.inc(endpoint=endpoint, status=status)
+    if session_id:
+        # Where the turn's time went: graph nodes, LLM calls, tools, DB work
+        await log_agent_event(session_id, agent_name or "system", "turn_timing", {"status": status, **trace.breakdown()})
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
+    with start_trace() as trace:
+        session_id = agent_name = None
+        try:
+            # DB work runs on the bounded blocking pool; the graph itself is awaited so a
+            # slow LLM call only holds this request, not the whole event loop.
+            with span("state", "load"):
+                session_id, current_state = await run_blocking(_load_turn_state, db, request.session_id, request.message)
+
+            previous_patient_id = _patient_id(current_state)
+
+            # Append new message (the one we just received)
+            current_state["messages"] = current_state["messages"] + [{"role": "user", "content": request.message}]
+
+            # 4. Invoke Graph
+            logger.debug("Invoking graph. Handoff state: %s", current_state.get('handoff_to_clinical'))
+            result = await graph.ainvoke(current_state)
+
+            reply_text, agent_name = _extract_reply(result)
+
+            with span("state", "save"):
+                await run_blocking(_save_turn_result, session_id, result, reply_text, agent_name, previous_patient_id)
+        except Exception:
+            await _finish_turn(trace, session_id, "chat", agent_name, "error")
+            raise
+        await _finish_turn(trace, session_id, "chat", agent_name, "ok")
 
     return ChatResponse(
         session_id=session_id,
@@ -177,3 +236,74 @@ async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
         citations=[], 
         source_type="kb"
     )
+
+@router.delete("/chat/{session_id}")
+async def end_session(session_id: str):
+    """Ends a session: stops its background retrieval and drops its cached state. The transcript is kept."""
+    retrieval_prefetch.cancel(session_id)
+    await run_blocking(session_store.delete, session_id)
+    return {"status": "ended", "session_id": session_id}
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Server-Sent Events version of /chat. Event types:
+      token     - {"agent", "text"} reply tokens as the model produces them
+      tool_call - {"agent", "tool", "args"} a tool the agent is running
+      handoff   - {"from", "to", "reason"} receptionist hands over to clinical
+      done      - the same payload as /chat, sent once the reply is saved
+      error     - {"message"} the turn failed
+    """
+    # The stream outlives the request's dependencies, so it manages its own session
+    db = SessionLocal()
+    trace = Trace()
+    try:
+        with start_trace(trace), span("state", "load"):
+            session_id, current_state = await run_blocking(_load_turn_state, db, request.session_id, request.message)
+    except Exception:
+        db.close()
+        await _finish_turn(trace, None, "stream", None, "error")
+        raise
+    previous_patient_id = _patient_id(current_state)
+    current_state["messages"] = current_state["messages"] + [{"role": "user", "content": request.message}]
+
+    async def event_stream():
+        agent_name = None
+        status = "error"
+        try:
+            result = None
+            with start_trace(trace):
+                async for event in graph.astream_events(current_state, version="v2"):
+                    kind = event["event"]
+                    if kind == "on_chat_model_stream" and REPLY_TAG in event.get("tags", []):
+                        text = content_text(event["data"]["chunk"].content)
+                        if text:
+                            yield _sse("token", {"agent": event["metadata"].get("langgraph_node"), "text": text})
+                    elif kind == "on_custom_event":
+                        yield _sse(event["name"], event["data"])
+                    elif kind == "on_chain_end" and not event.get("parent_ids"):
+                        # End of the root graph run carries the final state
+                        result = event["data"]["output"]
+
+                reply_text, agent_name = _extract_reply(result)
+                with span("state", "save"):
+                    await run_blocking(_save_turn_result, session_id, result, reply_text, agent_name, previous_patient_id)
+            status = "ok"
+
+            response = ChatResponse(session_id=session_id, reply=reply_text, agent=agent_name, citations=[], source_type="kb")
+            yield _sse("done", response.model_dump())
+        except Exception as e:
+            logger.exception("Chat stream failed: %s", e)
+            yield _sse("error", {"message": str(e)})
+        finally:
+            db.close()
+            await _finish_turn(trace, session_id, "stream", agent_name, status)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
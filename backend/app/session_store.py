@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+from .db import BACKEND_DIR
+
+logger = logging.getLogger(__name__)
+
+# Which store backs graph state between turns:
+#   memory - per-process LRU with TTL and a memory cap (default)
+#   sqlite - shared file, usable by several uvicorn workers on one host
+SESSION_STORE = os.environ.get("SESSION_STORE", "memory")
+SESSION_STORE_PATH = os.environ.get("SESSION_STORE_PATH", os.path.join(BACKEND_DIR, "session_state.db"))
+SESSION_STORE_MAX_ENTRIES = int(os.environ.get("SESSION_STORE_MAX_ENTRIES", "10000"))
+SESSION_STORE_MAX_BYTES = int(os.environ.get("SESSION_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+SESSION_STORE_TTL = float(os.environ.get("SESSION_STORE_TTL", str(6 * 60 * 60)))
+
+class SessionStateStore(ABC):
+    """
+    Holds the graph state of recent sessions between turns.
+
+    A miss is not an error: the caller rebuilds the state from the database.
+    get() returns a copy; changes only reach the store through set().
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    def set(self, session_id: str, state: dict):
+        pass
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+def _copy_state(state: dict) -> dict:
+    # The message list is the part callers extend; entries themselves are never edited
+    return {**state, "messages": list(state.get("messages") or [])}
+
+class InMemorySessionStore(SessionStateStore):
+    """LRU + TTL store capped by entry count and by the serialized size of the states."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # session_id -> (state, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            state, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(session_id)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return _copy_state(state)
+
+    def set(self, session_id: str, state: dict):
+        # Serialized length is a cheap, stable proxy for the memory an entry pins
+        size = len(json.dumps(state, default=str))
+        with self._lock:
+            if session_id in self._entries:
+                self._remove(session_id)
+            self._entries[session_id] = (_copy_state(state), size, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, session_id: str):
+        with self._lock:
+            if session_id in self._entries:
+                self._remove(session_id)
+
+    def _remove(self, session_id: str):
+        _, size, _ = self._entries.pop(session_id)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            stats.update({"entries": len(self._entries), "bytes": self._bytes})
+        return stats
+
+class SqliteSessionStore(SessionStateStore):
+    """File-backed store that several worker processes can share. Counters are per process."""
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_state ("
+            "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_session_state_updated_at ON session_state (updated_at)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections must not be shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT state, updated_at FROM session_state WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or row[1] < time.time() - self.ttl_seconds:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, session_id: str, state: dict):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO session_state (session_id, state, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state, default=str), time.time()),
+            )
+        self._writes += 1
+        # Sweep occasionally rather than on every write
+        if self._writes % 100 == 0:
+            self._evict()
+
+    def delete(self, session_id: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+
+    def _evict(self):
+        conn = self._conn()
+        with conn:
+            expired = conn.execute(
+                "DELETE FROM session_state WHERE updated_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            overflow = conn.execute(
+                "DELETE FROM session_state WHERE session_id IN ("
+                "SELECT session_id FROM session_state ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        self.evictions += expired + overflow
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["entries"] = self._conn().execute("SELECT COUNT(*) FROM session_state").fetchone()[0]
+        return stats
+
+def create_session_store() -> SessionStateStore:
+    if SESSION_STORE == "sqlite":
+        return SqliteSessionStore(SESSION_STORE_PATH, SESSION_STORE_MAX_ENTRIES, SESSION_STORE_TTL)
+    if SESSION_STORE != "memory":
+        logger.warning("Unknown SESSION_STORE '%s', using memory.", SESSION_STORE)
+    return InMemorySessionStore(SESSION_STORE_MAX_ENTRIES, SESSION_STORE_MAX_BYTES, SESSION_STORE_TTL)
+
+session_store = create_session_store()
@@ -0,0 +1,53 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from .models import SessionSnapshot, Interaction
+
+# Persisted per-session graph state. After every turn the compacted state (recent
+# messages, rolling summary, patient record, handoff flag) is upserted together
+# with a cursor: the timestamp of the last interaction it covers. Resuming a
+# session that is not in the session store is then one primary-key read plus the
+# few interactions logged after the cursor, instead of replaying the transcript.
+#
+# Bump SNAPSHOT_FORMAT when the state layout changes; older snapshots are
+# ignored and those sessions fall back to a full replay once.
+SNAPSHOT_FORMAT = 1
+
+def snapshot_writer(session_id: str, state: dict, last_interaction_at: datetime.datetime):
+    """Returns a write-behind item that upserts the session's snapshot."""
+    # The session store keeps (and the next turn appends to) the same dict
+    state = {**state, "messages": list(state.get("messages") or [])}
+
+    def write(db: Session):
+        snapshot = db.get(SessionSnapshot, session_id)
+        if snapshot is None:
+            db.add(SessionSnapshot(
+                session_id=session_id,
+                format_version=SNAPSHOT_FORMAT,
+                version=1,
+                state=state,
+                last_interaction_at=last_interaction_at,
+                updated_at=datetime.datetime.utcnow(),
+            ))
+        elif snapshot.last_interaction_at <= last_interaction_at:
+            snapshot.format_version = SNAPSHOT_FORMAT
+            snapshot.version += 1
+            snapshot.state = state
+            snapshot.last_interaction_at = last_interaction_at
+            snapshot.updated_at = datetime.datetime.utcnow()
+    return write
+
+def load_snapshot(db: Session, session_id: str) -> Optional[SessionSnapshot]:
+    snapshot = db.get(SessionSnapshot, session_id)
+    if snapshot is None or snapshot.format_version != SNAPSHOT_FORMAT:
+        return None
+    return snapshot
+
+def interactions_after(db: Session, session_id: str, cursor: Optional[datetime.datetime] = None):
+    """Interactions of a session in order, optionally only those after the cursor."""
+    query = db.query(Interaction).filter(Interaction.session_id == session_id)
+    if cursor is not None:
+        query = query.filter(Interaction.timestamp > cursor)
+    return query.order_by(Interaction.timestamp, Interaction.id).all()
@@ -0,0 +1,217 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from .db import SessionLocal
+from .metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Write-behind for rows nobody reads back during the request (agent events, chat
+# transcript, session bookkeeping). Requests enqueue and return; a background
+# thread commits the queue in batches, so a turn costs one fsync per batch
+# instead of one per row.
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+WRITE_BEHIND_MAX_QUEUE = int(os.environ.get("WRITE_BEHIND_MAX_QUEUE", "10000"))
+WRITE_BEHIND_ENQUEUE_TIMEOUT = float(os.environ.get("WRITE_BEHIND_ENQUEUE_TIMEOUT", "2.0"))
+# Commit every item in the caller's thread (tests, scripts)
+WRITE_BEHIND_SYNC = os.environ.get("WRITE_BEHIND_SYNC", "").lower() in ("1", "true", "yes")
+
+class WriteBehindWriter:
+    """
+    Queues ORM instances (added), Core statements (executed) and callables
+    (called with the batch's session, for read-modify-write rows) and commits
+    them in order, in batched transactions.
+
+    The queue is bounded: when the database falls behind, submit() blocks for up
+    to enqueue_timeout (backpressure). After that, droppable items (telemetry
+    such as agent events) are dropped with a warning; anything else (the chat
+    transcript, session rows) is written in the caller's thread after everything
+    queued before it. Code on the event loop uses submit_nowait(), for droppable
+    items only, which drops at once instead of waiting.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_queue: int, enqueue_timeout: float, sync: bool = False):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.sync = sync
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Items are only taken off the queue under this lock, by the writer thread
+        # or flush(), and written before it is released: batches commit in FIFO order
+        self._write_lock = threading.Lock()
+        self._has_items = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_requested = threading.Event()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.written_through = 0
+        self.failed = 0
+
+    def submit(self, item, droppable: bool = False):
+        if self.sync:
+            self._write([item])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put(item, timeout=self.enqueue_timeout)
+        except queue.Full:
+            if droppable:
+                self.dropped += 1
+                logger.warning("Write-behind queue full, dropped %s", type(item).__name__)
+                return
+            logger.warning("Write-behind queue full, writing %s in the caller's thread", type(item).__name__)
+            self._write_through(item)
+            return
+        self._has_items.set()
+
+    def submit_nowait(self, item):
+        """
+        For droppable items from callers on the event loop: never waits for
+        space, drops the item when the queue is full. Writes at once in sync mode.
+        """
+        if self.sync:
+            self._write([item])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Write-behind queue full, dropped %s", type(item).__name__)
+            return
+        self._has_items.set()
+
+    def flush(self):
+        """Commits everything queued so far before returning."""
+        self._flush_requested.set()
+        # A batch the writer thread has already taken is written before we get the lock
+        with self._write_lock:
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    break
+                self._write(batch)
+
+    def _write_through(self, item):
+        # Everything queued so far goes first, so the item keeps its place in the order
+        with self._write_lock:
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    break
+                self._write(batch)
+            self._write([item])
+        self.written_through += 1
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "written_through": self.written_through,
+            "failed": self.failed,
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if self._queue.empty():
+                self._has_items.wait(self.flush_interval)
+                # Checked again above, so an item put just before this is not missed
+                self._has_items.clear()
+                continue
+            # Give the batch a moment to fill up unless it already is full. Nothing
+            # is dequeued yet, so a flush() meanwhile writes everything in order.
+            deadline = time.monotonic() + self.flush_interval
+            while (self._queue.qsize() < self.batch_size and time.monotonic() < deadline
+                   and not self._stopping.is_set() and not self._flush_requested.is_set()):
+                time.sleep(0.01)
+            with self._write_lock:
+                batch = self._drain(self.batch_size)
+                if batch:
+                    self._write(batch)
+                self._flush_requested.clear()
+
+    def _drain(self, limit: int):
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _write(self, items):
+        db = SessionLocal()
+        try:
+            with span("db", "write_batch", rows=len(items)):
+                self._apply(db, items)
+                db.commit()
+            self.written += len(items)
+            self.batches += 1
+        except Exception as e:
+            db.rollback()
+            logger.warning("Write-behind batch of %d failed (%s), retrying row by row", len(items), e)
+            self._write_individually(db, items)
+        finally:
+            db.close()
+
+    def _write_individually(self, db, items):
+        for item in items:
+            try:
+                self._apply(db, [item])
+                db.commit()
+                self.written += 1
+            except Exception as e:
+                db.rollback()
+                self.failed += 1
+                logger.error("Failed to write %s: %s", type(item).__name__, e)
+
+    @staticmethod
+    def _apply(db, items):
+        for item in items:
+            if hasattr(item, "__table__"):
+                db.add(item)
+            elif callable(item):
+                db.flush()
+                item(db)
+            else:
+                # Statements see the rows queued before them (e.g. the session
+                # row a patient link updates); the unit of work orders the rest
+                db.flush()
+                db.execute(item)
+
+write_behind = WriteBehindWriter(
+    WRITE_BEHIND_BATCH_SIZE,
+    WRITE_BEHIND_FLUSH_INTERVAL,
+    WRITE_BEHIND_MAX_QUEUE,
+    WRITE_BEHIND_ENQUEUE_TIMEOUT,
+    sync=WRITE_BEHIND_SYNC,
+)
+
+# Last line of defence; the FastAPI lifespan also stops it on shutdown
+atexit.register(write_behind.stop)
@@ -0,0 +1,118 @@
+"""
+Clinical turn latency when the model asks for several tools at once.
+
+A stub chat model requests rag_tool and web_search_tool together (the way
+Gemini does for "what's new for my kidneys, and what should I eat?"); the tools
+are stubbed with fixed latencies. Compares running the tool calls one after the
+other with the clinical node, which runs them concurrently under per-tool
+timeouts and makes one synthesis call. A last run makes web search slower than
+its timeout, to show the turn is bounded by the timeout, not the slow tool.
+
+    python scripts/bench_clinical_tools.py --rag-ms 300 --web-ms 800 --turns 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "0")
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from app.db import Base, use_database
+from app.agents import clinical
+from app.agents.llm import set_llm
+from app.write_behind import write_behind
+
+class StubTool:
+    def __init__(self, name: str, latency: float):
+        self.name = name
+        self.latency = latency
+
+    def invoke(self, args):
+        time.sleep(self.latency)  # runs in the blocking pool, like the real tools
+        return json.dumps([{"content": f"{self.name} result", "source": "stub"}])
+
+class TwoToolStubLLM:
+    """Asks for both tools, then answers once it sees their output."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def bind_tools(self, tools_):
+        return self
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if messages[-1].content.startswith("Tool Output:"):
+            return AIMessage(content="Here is what the reference and recent research say.")
+        return AIMessage(content="", tool_calls=[
+            {"name": "rag_tool", "args": {"question": "What should I eat?"}, "id": "call-1"},
+            {"name": "web_search_tool", "args": {"query": "latest CKD treatments"}, "id": "call-2"},
+        ])
+
+STATE = {
+    "session_id": "bench",
+    "messages": [{"role": "user", "content": "What's new for my kidneys, and what should I eat?"}],
+    "patient_data": {"status": "ok", "id": 1, "diagnosis": "CKD Stage 3", "medications": ["Lisinopril 10mg"]},
+}
+LC_MESSAGES = [SystemMessage(content="You are a clinical assistant."), HumanMessage(content=STATE["messages"][0]["content"])]
+
+async def sequential_turn(llm):
+    """Every tool call awaited in turn, then one synthesis call."""
+    response = await llm.ainvoke(LC_MESSAGES)
+    results = []
+    for tool_call in response.tool_calls:
+        results.append(await clinical._run_tool(clinical._prepare_tool_call(tool_call, STATE["patient_data"])))
+    await llm.ainvoke(LC_MESSAGES + [HumanMessage(content=clinical._tool_output_message(results))])
+
+async def parallel_turn(llm):
+    await clinical._clinical_turn(STATE, LC_MESSAGES)
+
+async def measure(label: str, turn, args):
+    llm = TwoToolStubLLM(args.llm_ms / 1000)
+    set_llm(llm)
+    samples = []
+    for _ in range(args.turns):
+        start = time.perf_counter()
+        await turn(llm)
+        samples.append(time.perf_counter() - start)
+    print(f"{label:<22} {statistics.median(samples) * 1000:>9.1f} {max(samples) * 1000:>9.1f} "
+          f"{llm.calls / args.turns:>10.1f}")
+
+async def main_async(args):
+    print(f"rag_tool {args.rag_ms}ms, web_search_tool {args.web_ms}ms, LLM {args.llm_ms}ms per call\n")
+    print(f"{'mode':<22} {'p50 ms':>9} {'max ms':>9} {'LLM calls':>10}")
+    clinical.TOOLS.update(rag_tool=StubTool("rag_tool", args.rag_ms / 1000),
+                          web_search_tool=StubTool("web_search_tool", args.web_ms / 1000))
+    await measure("sequential", sequential_turn, args)
+    await measure("parallel", parallel_turn, args)
+
+    timeout = args.web_ms / 2000
+    clinical.TOOL_TIMEOUTS["web_search_tool"] = timeout
+    await measure(f"parallel, web {timeout:.2f}s cap", parallel_turn, args)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rag-ms", type=float, default=300)
+    parser.add_argument("--web-ms", type=float, default=800)
+    parser.add_argument("--llm-ms", type=float, default=50)
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = use_database(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    asyncio.run(main_async(args))
+    write_behind.stop()
+
+if __name__ == "__main__":
+    main()
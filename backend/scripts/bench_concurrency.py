@@ -0,0 +1,96 @@
+"""
+Concurrency benchmark for the chat pipeline.
+
+Drives chat_endpoint in-process with N simultaneous sessions against a stub LLM
+that takes a fixed time to answer, and prints p50/p99 turn latency per level.
+With the async pipeline p99 should stay close to the stub latency as N grows.
+Pass --blocking to simulate the old behaviour (LLM call blocks the event loop).
+
+    python scripts/bench_concurrency.py --levels 1 8 32 64 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import AIMessage
+
+from app.db import SessionLocal, Base, use_database
+from app.agents import intent
+from app.agents.llm import set_llm
+from app.routers.chat import chat_endpoint
+from app.schemas import ChatRequest
+
+class StubLLM:
+    """Answers every prompt with small talk after a fixed delay."""
+
+    def __init__(self, latency: float, blocking: bool):
+        self.latency = latency
+        self.blocking = blocking
+
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages, **kwargs):
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        return AIMessage(content="Thanks for checking in. How are you feeling today?")
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_session(turns: int, latencies: list):
+    session_id = None
+    for turn in range(turns):
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            response = await chat_endpoint(ChatRequest(session_id=session_id, message=f"Hello, turn {turn}"), db=db)
+            latencies.append(time.perf_counter() - start)
+            session_id = response.session_id
+        finally:
+            db.close()
+
+async def run_level(sessions: int, turns: int):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(turns, latencies) for _ in range(sessions)))
+    return latencies, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub LLM latency in seconds")
+    parser.add_argument("--blocking", action="store_true", help="block the event loop inside the LLM call")
+    args = parser.parse_args()
+
+    # Throwaway database so the benchmark never touches patients.db
+    tmp_dir = tempfile.mkdtemp()
+    engine = use_database(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+
+    set_llm(StubLLM(args.latency, args.blocking))
+    # Small talk would otherwise go through the MiniLM intent classifier; time the LLM path only
+    intent.INTENT_EMBEDDINGS_ENABLED = False
+
+    print(f"{'sessions':>8} {'turns':>6} {'p50 ms':>8} {'p99 ms':>8} {'turns/s':>8}")
+    for level in args.levels:
+        latencies, elapsed = asyncio.run(run_level(level, args.turns))
+        print(f"{level:>8} {len(latencies):>6} "
+              f"{statistics.median(latencies) * 1000:>8.1f} "
+              f"{percentile(latencies, 99) * 1000:>8.1f} "
+              f"{len(latencies) / elapsed:>8.1f}")
+
+if __name__ == "__main__":
+    main()
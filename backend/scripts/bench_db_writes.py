@@ -0,0 +1,133 @@
+"""
+Database write throughput under concurrency: bare SQLite engine vs the tuned profile.
+
+Writer threads commit one transcript row plus one agent event per transaction
+(what a turn costs with WRITE_BEHIND_SYNC=1), while reader threads run patient
+name searches. Runs the same workload on a fresh database with:
+
+  default     create_engine() with rollback journal and default pool (the old app/db.py)
+  production  create_db_engine(): WAL, synchronous=NORMAL, cache/mmap pragmas,
+              sized pool, read-only engine for the lookups
+
+    python scripts/bench_db_writes.py --writers 16 --readers 4 --transactions 200
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base, create_db_engine
+from app.models import Patient, Interaction, AgentEvent, Session as DbSession
+from app.patient_index import search_patients
+
+NAMES = ["Maria Lopez", "Daniel Okafor", "Priya Natarajan", "John Smith", "Grace Kim", "Omar Haddad"]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def prepare(url: str, tuned: bool):
+    write_engine = create_db_engine(url, tuned=tuned)
+    read_engine = create_db_engine(url, read_only=True, tuned=tuned) if tuned else write_engine
+    Base.metadata.create_all(bind=write_engine)
+    Write = sessionmaker(bind=write_engine)
+    db = Write()
+    for i in range(500):
+        db.add(Patient(name=f"{NAMES[i % len(NAMES)]} {i}", discharge_date=datetime.date(2024, 1, 1),
+                       primary_diagnosis="Chronic Kidney Disease Stage 3", medications=["Lisinopril 10mg"]))
+    db.add(DbSession(id="bench"))
+    db.commit()
+    db.close()
+    return write_engine, read_engine, Write, sessionmaker(bind=read_engine)
+
+def run_profile(label: str, tuned: bool, args):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    write_engine, read_engine, Write, Read = prepare(f"sqlite:///{path}", tuned)
+
+    write_latencies, read_latencies = [], []
+    errors = {"write": 0, "read": 0}
+    lock = threading.Lock()
+    writers_done = threading.Event()
+
+    def writer(worker: int):
+        for n in range(args.transactions):
+            db = Write()
+            start = time.perf_counter()
+            try:
+                now = datetime.datetime.utcnow()
+                db.add(Interaction(session_id="bench", role="user", message=f"message {worker}-{n}", timestamp=now))
+                db.add(AgentEvent(session_id="bench", agent="receptionist", event_type="db_lookup",
+                                  details={"worker": worker, "n": n}, timestamp=now))
+                db.commit()
+                with lock:
+                    write_latencies.append(time.perf_counter() - start)
+            except OperationalError:
+                db.rollback()
+                with lock:
+                    errors["write"] += 1
+            finally:
+                db.close()
+
+    def reader(worker: int):
+        n = 0
+        while not writers_done.is_set():
+            db = Read()
+            start = time.perf_counter()
+            try:
+                search_patients(db, NAMES[(worker + n) % len(NAMES)])
+                with lock:
+                    read_latencies.append(time.perf_counter() - start)
+            except OperationalError:
+                with lock:
+                    errors["read"] += 1
+            finally:
+                db.close()
+            n += 1
+
+    readers = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    writers = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    for t in readers:
+        t.start()
+    start = time.perf_counter()
+    for t in writers:
+        t.start()
+    for t in writers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    writers_done.set()
+    for t in readers:
+        t.join()
+    write_engine.dispose()
+    read_engine.dispose()
+
+    print(f"{label:<11} {len(write_latencies) / elapsed:>10.1f} "
+          f"{statistics.median(write_latencies) * 1000:>9.2f} {percentile(write_latencies, 99) * 1000:>9.2f} "
+          f"{statistics.median(read_latencies) * 1000 if read_latencies else 0:>9.2f} "
+          f"{percentile(read_latencies, 99) * 1000 if read_latencies else 0:>9.2f} "
+          f"{errors['write']:>7} {errors['read']:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--transactions", type=int, default=200, help="commits per writer thread")
+    args = parser.parse_args()
+
+    print(f"{'profile':<11} {'commits/s':>10} {'w p50 ms':>9} {'w p99 ms':>9} {'r p50 ms':>9} {'r p99 ms':>9} "
+          f"{'w errs':>7} {'r errs':>7}")
+    run_profile("default", False, args)
+    run_profile("production", True, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Embedding backends compared: load time, memory, throughput and agreement with torch.
+
+Each backend (see EMBEDDING_BACKEND in app/agents/llm.py) is measured in a
+fresh interpreter so load time and RSS are not shared between them:
+
+  load s        time to construct the model (files already in the HF cache)
+  RSS MB        resident memory added by loading it
+  docs/s        embed_documents in batches of --batch-size (ingest, micro-batches)
+  queries/s     embed_query one text at a time
+  cosine        mean / min cosine to the torch vectors over the same texts
+  top-3 agree   share of the labeled questions whose top-3 chunks (by cosine
+                over the knowledge base) match torch's: can the existing
+                chroma_db be searched with this backend
+
+    python scripts/bench_embedding_backends.py --backends torch torch-int8 onnx onnx-int8
+"""
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+EVAL_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'retrieval_eval.jsonl')
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def corpus():
+    """Knowledge-base chunks and the labeled questions, split like ingest does."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from app.rag.ingest import DATA_DIR, CHUNK_SIZE, CHUNK_OVERLAP, _source_files, _chunk_file
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = []
+    for path in _source_files(DATA_DIR):
+        chunks.extend(c.page_content for c in _chunk_file(path, os.path.relpath(path, DATA_DIR), splitter)[0])
+    with open(EVAL_SET) as f:
+        questions = [json.loads(line)["question"] for line in f if line.strip()]
+    return chunks, questions
+
+def worker(backend: str, batch_size: int, rounds: int):
+    """Runs in the child process; prints one JSON line."""
+    sys.path.append(BACKEND_DIR)
+    # Import the library up front: import cost is not model load cost
+    importlib.import_module("langchain_huggingface")
+    from app.agents.llm import create_embedding_model
+
+    chunks, questions = corpus()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    model = create_embedding_model(backend)
+    model.embed_query("warmup")
+    load_s = time.perf_counter() - start
+    rss_loaded = rss_mb() - rss_before
+
+    texts = (chunks + questions) * rounds
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        model.embed_documents(texts[i:i + batch_size])
+    docs_per_s = len(texts) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for question in questions * rounds:
+        model.embed_query(question)
+    queries_per_s = len(questions) * rounds / (time.perf_counter() - start)
+
+    print(json.dumps({
+        "load_s": load_s, "rss_mb": rss_loaded, "docs_per_s": docs_per_s, "queries_per_s": queries_per_s,
+        "chunks": model.embed_documents(chunks), "questions": model.embed_documents(questions),
+    }))
+
+def run_backend(backend: str, args):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", backend,
+         "--batch-size", str(args.batch_size), "--rounds", str(args.rounds)],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-2000:])
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx", "onnx-int8"])
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=5, help="passes over the corpus for the throughput numbers")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.worker, args.batch_size, args.rounds)
+        return
+
+    import numpy as np
+
+    def unit(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def top3(result):
+        scores = unit(result["questions"]) @ unit(result["chunks"]).T
+        return [set(row) for row in np.argsort(-scores, axis=1)[:, :3].tolist()]
+
+    results = {}
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    for backend in backends:
+        results[backend] = run_backend(backend, args)
+    reference = results.get("torch")
+    if reference is None:
+        raise SystemExit("The torch backend failed; it is the reference for the comparison")
+
+    print(f"{'backend':<11} {'load s':>7} {'RSS MB':>7} {'docs/s':>8} {'queries/s':>10} "
+          f"{'cosine mean/min':>16} {'top-3 agree':>12}")
+    ref_vectors = unit(reference["chunks"] + reference["questions"])
+    ref_top3 = top3(reference)
+    for backend in backends:
+        result = results[backend]
+        if result is None:
+            print(f"{backend:<11} unavailable")
+            continue
+        cosines = np.sum(unit(result["chunks"] + result["questions"]) * ref_vectors, axis=1)
+        agree = np.mean([a == b for a, b in zip(top3(result), ref_top3)])
+        print(f"{backend:<11} {result['load_s']:>7.2f} {result['rss_mb']:>7.0f} {result['docs_per_s']:>8.1f} "
+              f"{result['queries_per_s']:>10.1f} {cosines.mean():>9.4f}/{cosines.min():.4f} {agree:>12.2f}")
+
+if __name__ == "__main__":
+    main()
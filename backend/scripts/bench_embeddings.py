@@ -0,0 +1,88 @@
+"""
+Query embedding throughput: one forward pass per call vs the micro-batching service.
+
+N caller threads (like the blocking pool serving concurrent clinical turns)
+each embed a stream of distinct questions. Runs every concurrency level
+against the plain HuggingFaceEmbeddings model and against BatchingEmbeddings
+wrapping the same model, then repeats the batched run with questions that
+recur (the LRU case).
+
+    python scripts/bench_embeddings.py --callers 1 8 64 --queries 512
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from app.rag.embedding_service import BatchingEmbeddings
+
+TEMPLATES = [
+    "Can I eat {n} bananas a day with kidney disease?",
+    "Is it safe to take ibuprofen {n} times this week?",
+    "I gained {n} kg since discharge, what should I do?",
+    "How much water can I drink if my eGFR is {n}?",
+]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def run(model, callers: int, queries: int, distinct: int):
+    latencies = []
+    lock = threading.Lock()
+    per_caller = queries // callers
+
+    def caller(worker: int):
+        samples = []
+        for i in range(per_caller):
+            n = (worker * per_caller + i) % distinct
+            text = TEMPLATES[n % len(TEMPLATES)].format(n=n)
+            start = time.perf_counter()
+            model.embed_query(text)
+            samples.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(samples)
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(callers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, statistics.median(latencies) * 1000, percentile(latencies, 99) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--queries", type=int, default=512, help="embed calls per run, split across callers")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    base = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    base.embed_query("warmup")
+
+    print(f"{'mode':<18} {'callers':>7} {'queries/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'avg batch':>9}")
+    for callers in args.callers:
+        rows = [("direct", base, args.queries)]
+        batched = BatchingEmbeddings(base, args.max_batch, args.wait_ms, cache_size=0)
+        rows.append(("batched", batched, args.queries))
+        cached = BatchingEmbeddings(base, args.max_batch, args.wait_ms)
+        # A quarter of the questions distinct, the rest repeats
+        rows.append(("batched+LRU", cached, args.queries // 4))
+        for label, model, distinct in rows:
+            throughput, p50, p99 = run(model, callers, args.queries, distinct)
+            avg_batch = model.stats()["avg_batch_size"] if isinstance(model, BatchingEmbeddings) else 1.0
+            print(f"{label:<18} {callers:>7} {throughput:>10.1f} {p50:>8.2f} {p99:>8.2f} {avg_batch:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+LLM calls per session with and without the local intent router.
+
+Replays the transcripts in scripts/data/transcripts.jsonl through chat_endpoint
+against a stub chat model that behaves like Gemini does for these prompts
+(calls patient_db_tool for a name, says it will "connect you to the Clinical
+Agent" for a medical question, calls rag_tool in the clinical agent) and counts
+every LLM call. Retrieval is stubbed and the semantic answer cache is off, so
+only the routing differs between the two runs.
+
+    python scripts/bench_intent_router.py
+    python scripts/bench_intent_router.py --embeddings   # also load the MiniLM classifier
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "0")
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import AIMessage
+
+from app.db import SessionLocal, Base, use_database
+from app.models import Patient
+from app.agents import intent, tools
+from app.agents.llm import set_llm
+from app.routers.chat import chat_endpoint
+from app.schemas import ChatRequest
+
+TRANSCRIPTS = os.path.join(os.path.dirname(__file__), 'data', 'transcripts.jsonl')
+PATIENT_NAMES = ["Maria Lopez", "Daniel Okafor", "Priya Natarajan", "John Smith", "Grace Kim"]
+
+class CountingStubLLM:
+    """Scripted stand-in for the Gemini chat model that counts its calls."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = Counter()
+        self.tool_names = ()
+
+    def bind_tools(self, tools_):
+        bound = CountingStubLLM.__new__(CountingStubLLM)
+        bound.__dict__.update(self.__dict__)
+        bound.tool_names = tuple(t.name for t in tools_)
+        return bound
+
+    async def ainvoke(self, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        last = messages[-1].content if messages else ""
+        if isinstance(last, str) and last.startswith("Tool Output:"):
+            self.calls["clinical_answer"] += 1
+            return AIMessage(content="Based on the reference material, here is what you should know.")
+        if "patient_db_tool" in self.tool_names:
+            self.calls["receptionist"] += 1
+            decision = intent.classify_by_rules(str(last), False, True)
+            if decision and decision.kind == "identify":
+                return AIMessage(content="", tool_calls=[{"name": "patient_db_tool", "args": {"name": decision.name}, "id": "call-1"}])
+            if decision and decision.kind == "medical":
+                return AIMessage(content="That's a medical question, let me connect you to the Clinical Agent.")
+            return AIMessage(content="Thanks for letting me know. How are you feeling today?")
+        if "rag_tool" in self.tool_names:
+            self.calls["clinical_tool_choice"] += 1
+            return AIMessage(content="", tool_calls=[{"name": "rag_tool", "args": {"question": str(last)}, "id": "call-2"}])
+        self.calls["summary"] += 1
+        return AIMessage(content="Earlier: the patient introduced themselves and asked about their recovery.")
+
+def load_transcripts(path: str):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def setup_database():
+    tmp_dir = tempfile.mkdtemp()
+    engine = use_database(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    for name in PATIENT_NAMES:
+        db.add(Patient(
+            name=name,
+            discharge_date=datetime.date(2024, 1, 15),
+            primary_diagnosis="Chronic Kidney Disease Stage 3",
+            medications=["Lisinopril 10mg", "Furosemide 20mg"],
+            dietary_restrictions="Low sodium, low potassium",
+            warning_signs="Swelling, shortness of breath",
+            discharge_instructions="Monitor blood pressure daily.",
+        ))
+    db.commit()
+    db.close()
+
+async def replay(transcripts, llm: CountingStubLLM):
+    per_session = []
+    for transcript in transcripts:
+        before = sum(llm.calls.values())
+        session_id = None
+        for message in transcript["turns"]:
+            db = SessionLocal()
+            try:
+                response = await chat_endpoint(ChatRequest(session_id=session_id, message=message), db=db)
+                session_id = response.session_id
+            finally:
+                db.close()
+        per_session.append((transcript["id"], len(transcript["turns"]), sum(llm.calls.values()) - before))
+    return per_session
+
+def run(transcripts, router_enabled: bool, latency: float):
+    intent.INTENT_ROUTER_ENABLED = router_enabled
+    llm = CountingStubLLM(latency)
+    set_llm(llm)
+    start = time.perf_counter()
+    per_session = asyncio.run(replay(transcripts, llm))
+    return per_session, llm.calls, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transcripts", default=TRANSCRIPTS)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub LLM latency in seconds")
+    parser.add_argument("--embeddings", action="store_true", help="use the MiniLM classifier for messages the rules can't place")
+    args = parser.parse_args()
+
+    intent.INTENT_EMBEDDINGS_ENABLED = args.embeddings
+    tools.rag_query = lambda question, patient_context="": [{"content": "Limit potassium-rich foods.", "source": "stub.md"}]
+    setup_database()
+    transcripts = load_transcripts(args.transcripts)
+
+    results = {enabled: run(transcripts, enabled, args.latency) for enabled in (False, True)}
+
+    print(f"{'session':<22} {'turns':>5} {'LLM off':>8} {'LLM on':>7}")
+    for (session, turns, off), (_, _, on) in zip(results[False][0], results[True][0]):
+        print(f"{session:<22} {turns:>5} {off:>8} {on:>7}")
+
+    sessions = len(transcripts)
+    off_total = sum(n for _, _, n in results[False][0])
+    on_total = sum(n for _, _, n in results[True][0])
+    print()
+    for enabled, label in ((False, "router off"), (True, "router on")):
+        _, calls, elapsed = results[enabled]
+        print(f"{label:<10}: {sum(calls.values()) / sessions:.2f} LLM calls/session {dict(calls)} ({elapsed:.2f}s)")
+    if off_total:
+        print(f"reduction : {100 * (off_total - on_total) / off_total:.1f}% fewer LLM calls")
+
+if __name__ == "__main__":
+    main()
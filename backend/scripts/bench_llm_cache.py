@@ -0,0 +1,119 @@
+"""
+Chat model call cache: latency per tier and an offline record/replay round trip.
+
+A stub chat model with a fixed latency stands in for Gemini. Each prompt is a
+short conversation, with or without bound tools, answered with text or a tool
+call. Reports p50/p95 per call for the model itself, an in-memory hit and a
+SQLite hit, then records every response to a file and replays them with no
+model at all, checking the replayed responses match.
+
+    python scripts/bench_llm_cache.py --prompts 200 --llm-ms 400
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.tools import tool
+
+from app.agents.llm_cache import CachingChatModel, LLMCallCache, LLMCacheMiss
+
+PARAMS = {"model": "stub", "temperature": 0}
+
+@tool
+def lookup_tool(name: str) -> str:
+    """Looks up a patient by name."""
+    return name
+
+class StubLLM:
+    def __init__(self, latency: float, tools=None):
+        self.latency = latency
+        self.tools = tools
+        self.calls = 0
+
+    def bind_tools(self, tools_):
+        bound = StubLLM(self.latency, tools_)
+        bound.calls = self.calls
+        return bound
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.tools:
+            return AIMessage(content="", tool_calls=[{"name": "lookup_tool", "args": {"name": messages[-1].content},
+                                                      "id": f"call-{time.time_ns()}"}])
+        return AIMessage(content=f"Reply to: {messages[-1].content}",
+                         usage_metadata={"input_tokens": 50, "output_tokens": 10, "total_tokens": 60})
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def prompts(count: int):
+    for i in range(count):
+        yield i % 2 == 0, [SystemMessage(content="You are a hospital assistant."),
+                           HumanMessage(content=f"Question number {i} about my discharge plan")]
+
+async def run_all(model, count: int):
+    samples, responses = [], []
+    for with_tools, messages in prompts(count):
+        llm = model.bind_tools([lookup_tool]) if with_tools else model
+        start = time.perf_counter()
+        responses.append(await llm.ainvoke(messages))
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, responses
+
+def report(label: str, samples):
+    print(f"{label:<16} {statistics.median(samples):>10.3f} {percentile(samples, 95):>10.3f}")
+
+def same(a, b) -> bool:
+    strip = lambda calls: [(c["name"], c["args"]) for c in calls]
+    return a.content == b.content and strip(a.tool_calls) == strip(b.tool_calls)
+
+async def main_async(args):
+    tmp_dir = tempfile.mkdtemp()
+    print(f"{args.prompts} prompts, stub model {args.llm_ms}ms per call\n")
+    print(f"{'tier':<16} {'p50 ms':>10} {'p95 ms':>10}")
+
+    cache = LLMCallCache("on", os.path.join(tmp_dir, "cache.db"), args.prompts, args.prompts, 3600)
+    model = CachingChatModel(StubLLM(args.llm_ms / 1000), cache, PARAMS)
+    samples, _ = await run_all(model, args.prompts)
+    report("model (miss)", samples)
+    samples, _ = await run_all(model, args.prompts)
+    report("memory hit", samples)
+    with cache._lock:
+        cache._memory.clear()
+    samples, _ = await run_all(model, args.prompts)
+    report("sqlite hit", samples)
+    print(f"\n{cache.stats()}")
+
+    path = os.path.join(tmp_dir, "captured.db")
+    recorder = CachingChatModel(StubLLM(args.llm_ms / 1000), LLMCallCache("record", path, 0, 0, 0), PARAMS)
+    _, recorded = await run_all(recorder, args.prompts)
+    replayer = CachingChatModel(None, LLMCallCache("replay", path, args.prompts, 0, 0), PARAMS)
+    samples, replayed = await run_all(replayer, args.prompts)
+    matches = sum(same(a, b) for a, b in zip(recorded, replayed))
+    print(f"\nreplay without a model: {matches}/{args.prompts} responses match, "
+          f"p50 {statistics.median(samples):.3f}ms")
+    try:
+        await replayer.ainvoke([HumanMessage(content="never recorded")])
+        print("unexpected: an unrecorded prompt was answered")
+    except LLMCacheMiss as e:
+        print(f"unrecorded prompt: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=200)
+    parser.add_argument("--llm-ms", type=float, default=400)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Chat model tail latency with deadlines, retries, hedging and the circuit breaker.
+
+A stub provider answers in --llm-ms, except that a fraction of calls
+(--slow-rate) stall for --slow-ms and a fraction (--error-rate) fail with a
+503. Runs the same calls straight to the stub, through the resilient wrapper
+without hedging, and with hedging at the observed p95. A last run takes the
+provider down completely and compares how long callers wait with and without
+the circuit breaker.
+
+    python scripts/bench_llm_resilience.py --calls 400 --llm-ms 200 --slow-rate 0.05 --slow-ms 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.agents.resilience import CallPolicy, CircuitBreaker, ResilientChatModel, LLMUnavailable
+
+class ProviderError(Exception):
+    code = 503
+
+class FlakyLLM:
+    def __init__(self, latency: float, slow_rate: float, slow_latency: float, error_rate: float, seed: int = 0):
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def bind_tools(self, tools_):
+        return self
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        roll = self.rng.random()
+        if roll < self.error_rate:
+            await asyncio.sleep(self.latency / 4)
+            raise ProviderError("503 Service Unavailable")
+        await asyncio.sleep(self.slow_latency if roll < self.error_rate + self.slow_rate else self.latency)
+        return AIMessage(content="ok")
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def make_policy(args, hedge: bool) -> CallPolicy:
+    policy = CallPolicy()
+    policy.call_timeout = args.call_timeout
+    policy.turn_budget = args.budget
+    policy.hedge = hedge
+    policy.hedge_after = 0
+    policy.hedge_min_samples = 20
+    policy.breaker = CircuitBreaker(args.breaker_failures, args.breaker_cooldown)
+    return policy
+
+async def run(label: str, llm, args):
+    samples, failures = [], 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await llm.ainvoke([HumanMessage(content=f"question {i}")])
+            except (LLMUnavailable, ProviderError):
+                failures += 1
+            samples.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(args.calls)))
+    print(f"{label:<26} {statistics.median(samples):>8.0f} {percentile(samples, 95):>8.0f} "
+          f"{percentile(samples, 99):>8.0f} {max(samples):>8.0f} {failures:>7}")
+
+async def main_async(args):
+    def provider(error_rate=args.error_rate, slow_rate=args.slow_rate):
+        return FlakyLLM(args.llm_ms / 1000, slow_rate, args.slow_ms / 1000, error_rate)
+
+    print(f"{args.calls} calls, {args.concurrency} at a time; provider {args.llm_ms:.0f}ms, "
+          f"{args.slow_rate:.0%} stall {args.slow_ms:.0f}ms, {args.error_rate:.0%} fail\n")
+    print(f"{'mode':<26} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'failed':>7}")
+    await run("direct", provider(), args)
+
+    policy = make_policy(args, hedge=False)
+    await run("deadline + retries", ResilientChatModel(provider(), policy), args)
+    print(f"  {policy.stats()}")
+
+    policy = make_policy(args, hedge=True)
+    llm = ResilientChatModel(provider(), policy)
+    await run("+ hedging (warm-up)", llm, args)
+    await run("+ hedging at p95", llm, args)
+    print(f"  {policy.stats()}")
+
+    print("\nprovider down (every call fails after a timeout):")
+    no_breaker = make_policy(args, hedge=False)
+    no_breaker.breaker = CircuitBreaker(10 ** 9, 0)
+    await run("no breaker", ResilientChatModel(provider(0, 1.0), no_breaker), args)
+    policy = make_policy(args, hedge=False)
+    await run("breaker", ResilientChatModel(provider(0, 1.0), policy), args)
+    print(f"  {policy.stats()}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-ms", type=float, default=200)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=5000)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--call-timeout", type=float, default=2.0, help="per attempt deadline in seconds")
+    parser.add_argument("--budget", type=float, default=6.0, help="total seconds per call, retries included")
+    parser.add_argument("--breaker-failures", type=int, default=5)
+    parser.add_argument("--breaker-cooldown", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
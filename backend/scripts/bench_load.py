@@ -0,0 +1,309 @@
+"""
+Offline end-to-end load test for the chat pipeline.
+
+Replays many concurrent synthetic sessions through chat_endpoint in-process.
+Each session goes lookup -> small talk -> clinical RAG -> web search. The chat
+model is a scripted stub with a configurable latency (it answers each scripted
+message with the tool call or text a real model would give). The embedding model
+and the knowledge-base search are stubbed too, so no API keys, model downloads
+or chroma_db are needed.
+
+Reports throughput, p50/p95/p99 per stage, LLM calls and DB writes per turn and
+process memory growth, as JSON. Save one run per commit and compare them:
+
+    python scripts/bench_load.py --sessions 200 --concurrency 32 --output before.json
+    python scripts/bench_load.py --sessions 200 --concurrency 32 --compare before.json
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from sqlalchemy import event
+
+from app.db import SessionLocal, Base, use_database
+from app.models import Patient
+from app.agents import intent, tools
+from app.agents.llm import set_llm
+from app.rag import retriever
+from app.routers.chat import chat_endpoint
+from app.schemas import ChatRequest
+from app.session_store import session_store
+from app.write_behind import write_behind
+
+FIRST_NAMES = ["Maria", "Daniel", "Priya", "John", "Grace", "Omar", "Lena", "Kenji", "Aisha", "Pavel"]
+LAST_NAMES = ["Lopez", "Okafor", "Natarajan", "Smith", "Kim", "Haddad", "Fischer", "Tanaka", "Bello", "Novak"]
+
+# One synthetic session. For each message, what the model says when it is the
+# receptionist (patient_db_tool bound) or the clinical agent (rag/web tools bound).
+SCENARIO = [
+    {"stage": "lookup", "message": "Hi, my name is {name}",
+     "receptionist": {"tool": "patient_db_tool", "args": {"name": "{name}"}}},
+    {"stage": "small_talk", "message": "Thanks, I'm doing okay today",
+     "receptionist": {"text": "Glad to hear it. Are you keeping up with your medications?"}},
+    {"stage": "clinical_rag", "message": "Can I eat bananas with my kidney condition?",
+     "receptionist": {"text": "That's a medical question, let me connect you to the Clinical Agent."},
+     "clinical": {"tool": "rag_tool", "args": {"question": "Can I eat bananas with my kidney condition?"}}},
+    {"stage": "web_search", "message": "What is the latest research on SGLT2 inhibitors?",
+     "clinical": {"tool": "web_search_tool", "args": {"query": "latest research SGLT2 inhibitors CKD"}}},
+]
+DEFAULT_REPLY = {"text": "Thanks for letting me know. How are you feeling today?"}
+
+class ScriptedChatModel:
+    """Stand-in for the Gemini chat model: looks up the latest user message in a script."""
+
+    def __init__(self, script: dict, latency: float, agent: str = None, calls: Counter = None):
+        self.script = script
+        self.latency = latency
+        self.agent = agent
+        self.calls = calls if calls is not None else Counter()
+
+    def bind_tools(self, tools_):
+        names = {t.name for t in tools_}
+        agent = "receptionist" if "patient_db_tool" in names else "clinical"
+        return ScriptedChatModel(self.script, self.latency, agent, self.calls)
+
+    async def ainvoke(self, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        last = messages[-1].content if messages else ""
+        if isinstance(last, str) and last.startswith("Tool Output:"):
+            self.calls["synthesis"] += 1
+            return AIMessage(content="Based on the reference material: keep potassium intake moderate and follow your care plan.")
+        if self.agent is None:
+            self.calls["summary"] += 1
+            return AIMessage(content="The patient was identified and asked about diet and recent research.")
+        self.calls[self.agent] += 1
+        user_text = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        step = self.script.get(user_text, {}).get(self.agent, DEFAULT_REPLY)
+        if "tool" in step:
+            return AIMessage(content="", tool_calls=[{"name": step["tool"], "args": dict(step["args"]), "id": f"call-{self.calls[self.agent]}"}])
+        return AIMessage(content=step["text"])
+
+class StubEmbeddings:
+    """Deterministic bag-of-words hashing embeddings with the MiniLM dimension."""
+
+    dim = 384
+
+    def embed_query(self, text: str):
+        vector = [0.0] * self.dim
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+def stub_rag_query(latency: float):
+    def rag_query(question: str, patient_context: str = ""):
+        time.sleep(latency)  # runs in the blocking pool, like the real Chroma search
+        return [{"content": "Bananas are high in potassium; limit them in later CKD stages.", "source": "diet.md"}]
+    return rag_query
+
+def build_script(names):
+    script = {}
+    for name in names:
+        for turn in SCENARIO:
+            message = turn["message"].format(name=name)
+            script[message] = {
+                agent: json.loads(json.dumps(turn[agent]).replace("{name}", name))
+                for agent in ("receptionist", "clinical") if agent in turn
+            }
+    return script
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        import resource  # peak rather than current outside Linux
+        scale = 1 if platform.system() == "Darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class WriteCounter:
+    """Counts INSERT/UPDATE/DELETE statements (and rows) sent to the database."""
+
+    def __init__(self, engine):
+        self.statements = Counter()
+        self.rows = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb in ("INSERT", "UPDATE", "DELETE"):
+            self.statements[verb] += 1
+            self.rows += len(parameters) if executemany else 1
+
+def setup_database(tmp_dir: str, patients: int):
+    engine = use_database(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    names = [f"{first} {last}" for last in LAST_NAMES for first in FIRST_NAMES][:patients]
+    db = SessionLocal()
+    for name in names:
+        db.add(Patient(
+            name=name,
+            discharge_date=datetime.date(2024, 1, 15),
+            primary_diagnosis="Chronic Kidney Disease Stage 3",
+            medications=["Lisinopril 10mg", "Furosemide 20mg"],
+            dietary_restrictions="Low sodium, low potassium",
+            warning_signs="Swelling, shortness of breath",
+            discharge_instructions="Monitor blood pressure daily.",
+        ))
+    db.commit()
+    db.close()
+    return engine, names
+
+async def run_session(name: str, stage_latencies, errors: Counter):
+    session_id = None
+    for turn in SCENARIO:
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            response = await chat_endpoint(ChatRequest(session_id=session_id, message=turn["message"].format(name=name)), db=db)
+            stage_latencies[turn["stage"]].append(time.perf_counter() - start)
+            session_id = response.session_id
+        except Exception as e:
+            errors[type(e).__name__] += 1
+        finally:
+            db.close()
+
+async def run_load(names, concurrency: int, stage_latencies, errors):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(name):
+        async with semaphore:
+            await run_session(name, stage_latencies, errors)
+
+    await asyncio.gather(*(limited(name) for name in names))
+
+def compare(result: dict, baseline: dict):
+    def change(new, old):
+        return f"{100 * (new - old) / old:+.1f}%" if old else "n/a"
+
+    print(f"\nvs baseline {baseline.get('git_commit') or ''}:")
+    print(f"  throughput {result['throughput_turns_per_s']:.1f} turns/s "
+          f"({change(result['throughput_turns_per_s'], baseline['throughput_turns_per_s'])})")
+    for stage, stats in result["stages"].items():
+        old = baseline["stages"].get(stage)
+        if old:
+            print(f"  {stage:<13} " + "  ".join(
+                f"{key} {stats[key]:.1f}ms ({change(stats[key], old[key])})" for key in ("p50_ms", "p95_ms", "p99_ms")))
+    print(f"  db writes/turn {result['db']['statements_per_turn']:.2f} "
+          f"({change(result['db']['statements_per_turn'], baseline['db']['statements_per_turn'])})")
+
+def run_benchmark(args, tmp_dir: str) -> dict:
+    engine, names = setup_database(tmp_dir, args.patients)
+    script = build_script(names)
+    llm = ScriptedChatModel(script, args.llm_latency)
+    set_llm(llm)
+    retriever._embeddings = StubEmbeddings()
+    tools.rag_query = stub_rag_query(args.rag_latency)
+    intent.INTENT_EMBEDDINGS_ENABLED = False
+    writes = WriteCounter(engine)
+
+    session_names = [names[i % len(names)] for i in range(args.sessions)]
+    stage_latencies = defaultdict(list)
+    errors = Counter()
+
+    gc.collect()
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    asyncio.run(run_load(session_names, args.concurrency, stage_latencies, errors))
+    elapsed = time.perf_counter() - start
+    write_behind.flush()
+    gc.collect()
+    rss_end = rss_mb()
+
+    turns = sum(len(v) for v in stage_latencies.values())
+    return {
+        "git_commit": git_commit(),
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "turns": turns,
+        "errors": dict(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_turns_per_s": round(turns / elapsed, 2) if elapsed else 0.0,
+        "stages": {stage: summarize(stage_latencies[stage]) for stage in dict.fromkeys(t["stage"] for t in SCENARIO)
+                   if stage_latencies[stage]},
+        "overall": summarize([v for values in stage_latencies.values() for v in values]) if turns else {},
+        "llm": {"calls": dict(llm.calls), "calls_per_turn": round(sum(llm.calls.values()) / turns, 3) if turns else 0.0},
+        "db": {
+            "statements": dict(writes.statements),
+            "rows": writes.rows,
+            "statements_per_turn": round(sum(writes.statements.values()) / turns, 3) if turns else 0.0,
+            "rows_per_turn": round(writes.rows / turns, 3) if turns else 0.0,
+        },
+        "memory": {"rss_start_mb": round(rss_start, 1), "rss_end_mb": round(rss_end, 1),
+                   "growth_mb": round(rss_end - rss_start, 1)},
+        "session_store": session_store.stats(),
+        "write_behind": write_behind.stats(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="sessions in flight at once")
+    parser.add_argument("--patients", type=int, default=100, help="distinct patients the sessions cycle through (max 100)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="stub chat model latency in seconds")
+    parser.add_argument("--rag-latency", type=float, default=0.01, help="stub knowledge-base search latency in seconds")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    parser.add_argument("--compare", help="JSON result of an earlier run to compare against")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        result = run_benchmark(args, tmp_dir)
+    finally:
+        write_behind.stop()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {args.output}: {result['throughput_turns_per_s']} turns/s, "
+              f"overall p99 {result['overall'].get('p99_ms')}ms")
+    else:
+        print(json.dumps(result, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+if __name__ == "__main__":
+    main()
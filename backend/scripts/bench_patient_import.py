@@ -0,0 +1,108 @@
+"""
+Bulk patient import throughput on a generated discharge export.
+
+Writes --rows synthetic records (default one million) to a CSV or JSONL file,
+imports them into a throwaway database with app/patient_import.py, then
+re-imports a slice of the records with new names and details to time the
+update path (rows rewritten, name index re-tokenized). Reports rows/s for both and checks the name index by searching
+for a few imported patients.
+
+    python scripts/bench_patient_import.py --rows 1000000 --format csv
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import func, select
+
+from app.db import use_database, SessionLocal
+from app.models import Patient, PatientNameToken
+from app.patient_import import import_patients, print_report, COLUMNS
+from app.patient_index import search_patients, vocabulary
+
+FIRST_NAMES = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "Abhishek", "Priya",
+               "Rahul", "Ananya", "Wei", "Mei", "Omar", "Fatima", "Carlos", "Lucia", "Grace", "Daniel"]
+LAST_NAMES = ["Smith", "Johnson", "Garcia", "Miller", "Shetty", "Sharma", "Chen", "Khan", "Haddad", "Silva",
+              "Okafor", "Nakamura", "Lopez", "Kim", "Natarajan", "Brown"]
+DIAGNOSES = ["Chronic Kidney Disease Stage 2", "Chronic Kidney Disease Stage 3a", "Chronic Kidney Disease Stage 3b",
+             "Chronic Kidney Disease Stage 4", "End Stage Renal Disease (on Dialysis)"]
+MEDS = ["Lisinopril 10mg daily", "Furosemide 20mg twice daily", "Amlodipine 5mg daily", "Sevelamer 800mg with meals",
+        "Calcitriol 0.25mcg daily"]
+
+def synthetic_record(rng: random.Random, i: int, suffix: str = ""):
+    return {
+        "external_id": f"MRN{i:08d}",
+        "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}{rng.randint(0, 999)}{suffix}",
+        "discharge_date": str(datetime.date(2024, 1, 1) + datetime.timedelta(days=i % 365)),
+        "primary_diagnosis": rng.choice(DIAGNOSES),
+        "medications": rng.sample(MEDS, 2),
+        "dietary_restrictions": "Low sodium (2g/day)",
+        "follow_up": "Nephrology clinic in 2 weeks",
+        "warning_signs": "Swelling, shortness of breath",
+        "discharge_instructions": "Weigh yourself daily",
+    }
+
+def write_export(path: str, fmt: str, records):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=("external_id",) + COLUMNS)
+            writer.writeheader()
+            for record in records:
+                writer.writerow({**record, "medications": ";".join(record["medications"])})
+        else:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--update-rows", type=int, default=100_000, help="records re-imported with edits")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    engine = use_database(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    export = os.path.join(tmp_dir, f"export.{args.format}")
+
+    start = time.perf_counter()
+    rng = random.Random(42)
+    write_export(export, args.format, (synthetic_record(rng, i) for i in range(args.rows)))
+    print(f"Generated {args.rows} rows ({os.path.getsize(export) / 1e6:.0f} MB) in {time.perf_counter() - start:.1f}s\n")
+
+    print("Initial import:")
+    print_report(import_patients(export, args.format, args.chunk_size, bind=engine))
+
+    rng = random.Random(7)
+    updates = os.path.join(tmp_dir, f"updates.{args.format}")
+    step = max(1, args.rows // args.update_rows)
+    write_export(updates, args.format, (synthetic_record(rng, i * step, suffix="x")
+                                        for i in range(min(args.update_rows, args.rows))))
+    print("\nRe-import (edited records):")
+    print_report(import_patients(updates, args.format, args.chunk_size, bind=engine))
+
+    vocabulary.invalidate()
+    db = SessionLocal()
+    try:
+        patients = db.execute(select(func.count()).select_from(Patient)).scalar()
+        tokens = db.execute(select(func.count()).select_from(PatientNameToken)).scalar()
+        sample = db.execute(select(Patient.name).order_by(Patient.id.desc()).limit(3)).scalars().all()
+        print(f"\n{patients} patients, {tokens} name tokens")
+        for name in sample:
+            start = time.perf_counter()
+            found = any(p.name == name for p, _ in search_patients(db, name))
+            print(f"  search {name!r}: {'found' if found else 'MISSING'} in {(time.perf_counter() - start) * 1000:.1f}ms")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Patient name lookup benchmark on a synthetic discharge census.
+
+Builds a throwaway SQLite database with --patients rows (default 500k), then
+times the old ilike scan (full name, then one scan per name part) against the
+ranked token-index search used by patient_db_tool.
+
+    python scripts/bench_patient_search.py --patients 500000
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base
+from app.models import Patient, PatientNameToken
+from app.patient_index import search_patients, best_matches, name_index_rows, vocabulary
+
+FIRST_NAMES = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth",
+               "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+               "Abhishek", "Priya", "Rahul", "Ananya", "Wei", "Mei", "Omar", "Fatima", "Carlos", "Lucia"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+              "Shetty", "Sharma", "Iyer", "Chen", "Wang", "Khan", "Haddad", "Silva", "Okafor", "Nakamura"]
+
+def synthetic_name(rng: random.Random):
+    # A random suffix keeps most full names unique, like a real census
+    first = rng.choice(FIRST_NAMES)
+    last = rng.choice(LAST_NAMES) + rng.choice(["", "", "son", "ova", "er"]) + str(rng.randint(0, 999))
+    return f"{first} {last}"
+
+def build_database(path: str, count: int, batch_size: int = 20000):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    names = []
+    with engine.begin() as conn:
+        for start in range(0, count, batch_size):
+            patients, tokens = [], []
+            for patient_id in range(start + 1, min(count, start + batch_size) + 1):
+                name = synthetic_name(rng)
+                names.append(name)
+                patients.append({
+                    "id": patient_id,
+                    "name": name,
+                    "discharge_date": datetime.date(2024, 1, 1),
+                    "primary_diagnosis": "Chronic Kidney Disease Stage 3a",
+                    "medications": ["Lisinopril 10mg daily"],
+                })
+                tokens.extend(name_index_rows(patient_id, name))
+            conn.execute(Patient.__table__.insert(), patients)
+            conn.execute(PatientNameToken.__table__.insert(), tokens)
+    return engine, names
+
+def legacy_lookup(db, name: str):
+    # The previous patient_db_tool logic
+    clean_name = name.strip().replace(".", "").replace("  ", " ")
+    patients = db.query(Patient).filter(Patient.name.ilike(f"%{clean_name}%")).all()
+    if not patients:
+        for part in clean_name.split():
+            if len(part) > 2:
+                patients = db.query(Patient).filter(Patient.name.ilike(f"%{part}%")).all()
+                if patients:
+                    break
+    return patients
+
+def introduce_typo(name: str, rng: random.Random):
+    chars = list(name)
+    i = rng.randrange(1, len(chars) - 1)
+    chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return "".join(chars)
+
+def time_queries(label: str, lookup, queries):
+    timings = []
+    found = 0
+    for query in queries:
+        start = time.perf_counter()
+        results = lookup(query)
+        timings.append((time.perf_counter() - start) * 1000)
+        found += 1 if results else 0
+    print(f"  {label:<8} median {statistics.median(timings):8.2f} ms   max {max(timings):8.2f} ms   "
+          f"matched {found}/{len(queries)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=500000)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--skip-legacy", action="store_true", help="skip the slow ilike baseline")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_patients.db")
+    start = time.perf_counter()
+    engine, names = build_database(path, args.patients)
+    print(f"Built {args.patients} patients in {time.perf_counter() - start:.1f}s at {path}")
+
+    db = sessionmaker(bind=engine)()
+    start = time.perf_counter()
+    vocabulary.ensure_loaded(db)
+    print(f"Loaded token vocabulary in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    rng = random.Random(7)
+    workloads = {
+        "exact full name": rng.sample(names, args.queries),
+        "first name only": [n.split()[0] for n in rng.sample(names, args.queries)],
+        "typo in name": [introduce_typo(n, rng) for n in rng.sample(names, args.queries)],
+        "not in census": [f"Zed Quorralin{i}" for i in range(args.queries)],
+    }
+    for workload, queries in workloads.items():
+        print(workload)
+        if not args.skip_legacy:
+            time_queries("ilike", lambda q: legacy_lookup(db, q), queries)
+        time_queries("index", lambda q: best_matches(search_patients(db, q)), queries)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Retrieval quality and latency: dense-only vs hybrid (BM25 + dense) vs reranked.
+
+Embeds the knowledge base in data/ into a throwaway in-memory Chroma store and
+runs the labeled questions in scripts/data/retrieval_eval.jsonl through each
+retrieval mode. A hit is a returned chunk containing one of the question's
+"relevant" passages.
+
+  dense+context  the old rag_query: patient context prepended to the query text
+  dense          vector search on the question only
+  bm25           keyword search only
+  hybrid         rank fusion of both, patient context as a boost (the default)
+  hybrid+rerank  hybrid, then a local cross-encoder (only with --reranker)
+
+    python scripts/bench_retrieval.py -k 3
+    python scripts/bench_retrieval.py --reranker cross-encoder/ms-marco-MiniLM-L-6-v2
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_chroma import Chroma
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.rag import retriever
+from app.rag.ingest import DATA_DIR, CHUNK_SIZE, CHUNK_OVERLAP, _source_files, _chunk_file
+
+EVAL_SET = os.path.join(os.path.dirname(__file__), 'data', 'retrieval_eval.jsonl')
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def build_store(data_dir: str):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    store = Chroma(collection_name=f"bench-{uuid.uuid4().hex}", embedding_function=retriever.get_shared_embeddings())
+    total = 0
+    for path in _source_files(data_dir):
+        chunks, ids = _chunk_file(path, os.path.relpath(path, data_dir), splitter)
+        store.add_documents(chunks, ids=ids)
+        total += len(chunks)
+    return store, total
+
+def old_dense(question: str, k: int, patient_context: str):
+    query = f"Context: {patient_context}\nQuestion: {question}" if patient_context else question
+    return [(doc, 0.0) for doc in retriever.get_vector_store().similarity_search(query, k=k)]
+
+def run_mode(label: str, search, questions, k: int):
+    latencies, hits, reciprocal_ranks = [], 0, []
+    for item in questions:
+        start = time.perf_counter()
+        results = search(item["question"], k, item.get("patient_context", ""))
+        latencies.append(time.perf_counter() - start)
+        rank = next((i for i, (doc, _) in enumerate(results, start=1)
+                     if any(passage in doc.page_content for passage in item["relevant"])), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    print(f"{label:<14} {hits / len(questions):>9.2f} {statistics.mean(reciprocal_ranks):>6.3f} "
+          f"{statistics.median(latencies) * 1000:>8.2f} {percentile(latencies, 99) * 1000:>8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", type=int, default=retriever.RAG_TOP_K, help="chunks returned per question")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--reranker", default=retriever.RAG_RERANKER, help="cross-encoder model for hybrid+rerank")
+    args = parser.parse_args()
+
+    with open(EVAL_SET) as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+    store, chunks = build_store(args.data_dir)
+    retriever._vector_store = store
+    retriever.RAG_RERANKER = args.reranker
+    retriever.warm_retriever()
+    print(f"{len(questions)} questions over {chunks} chunks, k={args.k}\n")
+
+    modes = [
+        ("dense+context", old_dense),
+        ("dense", lambda q, k, ctx: retriever.retrieve(q, k, ctx, keyword=False, rerank=False)),
+        ("bm25", lambda q, k, ctx: retriever.retrieve(q, k, ctx, dense=False, rerank=False)),
+        ("hybrid", lambda q, k, ctx: retriever.retrieve(q, k, ctx, rerank=False)),
+    ]
+    if args.reranker:
+        modes.append(("hybrid+rerank", lambda q, k, ctx: retriever.retrieve(q, k, ctx, rerank=True)))
+
+    print(f"{'mode':<14} {'recall@k':>9} {'MRR':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, search in modes:
+        run_mode(label, search, questions, args.k)
+
+if __name__ == "__main__":
+    main()
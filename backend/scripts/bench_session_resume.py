@@ -0,0 +1,116 @@
+"""
+Session resume benchmark: snapshot + tail vs full transcript replay.
+
+Builds a throwaway database with long sessions (thousands of turns) among
+many short ones, then times rebuilding a session's state the way a worker
+does when the session is not in its session store:
+
+  replay (no index)  every Interaction row, interactions index dropped
+  replay (indexed)   every Interaction row, (session_id, timestamp) index
+  snapshot           one session_snapshots read + interactions after the cursor
+
+    python scripts/bench_session_resume.py --turns 100 1000 5000
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import insert
+
+from app.db import SessionLocal, Base, use_database
+from app.models import Patient, Session as DbSession, Interaction, SessionSnapshot
+from app.routers.chat import _reconstruct_state, _replay_history
+from app.snapshots import SNAPSHOT_FORMAT
+
+START = datetime.datetime(2024, 1, 1)
+
+def add_session(conn, session_id: str, patient_id: int, turns: int, with_snapshot: bool, window: int = 12):
+    conn.execute(insert(DbSession), [{"id": session_id, "patient_id": patient_id, "started_at": START}])
+    rows = []
+    for turn in range(turns):
+        asked = START + datetime.timedelta(seconds=2 * turn)
+        rows.append({"session_id": session_id, "patient_id": patient_id, "role": "user", "agent": None,
+                     "message": f"Question number {turn} about my recovery", "timestamp": asked})
+        rows.append({"session_id": session_id, "patient_id": patient_id, "role": "assistant", "agent": "clinical",
+                     "message": f"Answer number {turn}: keep following your discharge plan.",
+                     "timestamp": asked + datetime.timedelta(seconds=1)})
+    conn.execute(insert(Interaction), rows)
+    if with_snapshot:
+        messages = [{"role": r["role"], "content": r["message"], **({"agent": r["agent"]} if r["agent"] else {})}
+                    for r in rows[-window:]]
+        state = {
+            "session_id": session_id,
+            "messages": messages,
+            "patient_data": {"status": "ok", "id": patient_id, "name": "Maria Lopez"},
+            "current_agent": "clinical",
+            "handoff_to_clinical": True,
+            "conversation_summary": "The patient has asked many questions about recovery after discharge.",
+            "summarized_count": 0,
+            "summarized_tokens": 12 * turns,
+        }
+        conn.execute(insert(SessionSnapshot), [{
+            "session_id": session_id, "format_version": SNAPSHOT_FORMAT, "version": turns, "state": state,
+            "last_interaction_at": rows[-1]["timestamp"], "updated_at": rows[-1]["timestamp"],
+        }])
+
+def time_call(func, session_id: str, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            func(db, session_id)
+            samples.append(time.perf_counter() - start)
+        finally:
+            db.close()
+    return statistics.median(samples) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[100, 1000, 5000], help="turns in each long session")
+    parser.add_argument("--background-sessions", type=int, default=2000, help="short sessions sharing the table")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    engine = use_database(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        conn.execute(insert(Patient), [{
+            "id": 1, "name": "Maria Lopez", "discharge_date": datetime.date(2024, 1, 1),
+            "primary_diagnosis": "Chronic Kidney Disease Stage 3", "medications": ["Lisinopril 10mg"],
+        }])
+        for i in range(args.background_sessions):
+            add_session(conn, f"background-{i}", 1, 10, with_snapshot=False)
+        for turns in args.turns:
+            add_session(conn, f"long-{turns}", 1, turns, with_snapshot=True)
+    total = args.background_sessions * 20 + sum(2 * t for t in args.turns)
+    print(f"{total} interactions in {args.background_sessions + len(args.turns)} sessions\n")
+
+    index = next(i for i in Interaction.__table__.indexes if i.name == "ix_interactions_session_timestamp")
+    results = {turns: {} for turns in args.turns}
+    index.drop(bind=engine)
+    for turns in args.turns:
+        results[turns]["replay (no index)"] = time_call(_replay_history, f"long-{turns}", args.repeats)
+    index.create(bind=engine)
+    for turns in args.turns:
+        results[turns]["replay (indexed)"] = time_call(_replay_history, f"long-{turns}", args.repeats)
+        results[turns]["snapshot"] = time_call(_reconstruct_state, f"long-{turns}", args.repeats)
+
+    labels = ["replay (no index)", "replay (indexed)", "snapshot"]
+    print(f"{'turns':>6} " + " ".join(f"{label + ' ms':>22}" for label in labels) + f" {'speedup':>8}")
+    for turns in args.turns:
+        row = results[turns]
+        print(f"{turns:>6} " + " ".join(f"{row[label]:>22.2f}" for label in labels)
+              + f" {row['replay (indexed)'] / row['snapshot']:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
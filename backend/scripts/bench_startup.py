@@ -0,0 +1,78 @@
+"""
+Startup-time benchmark for the FastAPI app.
+
+Imports app.main in fresh interpreters under `python -X importtime` and checks
+the result against scripts/startup_budget.json:
+  - max_import_ms: median wall time to import app.main
+  - forbidden_imports: modules that must only load in the lifespan hook or on
+    first use (LLM SDKs, chromadb, torch, ...)
+
+Exits non-zero when the budget is exceeded, so it can gate CI.
+
+    python scripts/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_budget.json')
+
+def import_profile():
+    """Returns {module: (self_us, cumulative_us)} for one cold import of app.main."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit("Importing app.main failed")
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="how many of the slowest modules to list")
+    args = parser.parse_args()
+
+    with open(BUDGET_PATH) as f:
+        budget = json.load(f)
+
+    timings = []
+    profile = {}
+    for _ in range(args.runs):
+        profile = import_profile()
+        timings.append(profile["app.main"][1] / 1000)
+    median_ms = statistics.median(timings)
+
+    print(f"import app.main: median {median_ms:.0f} ms over {args.runs} runs (budget {budget['max_import_ms']} ms)")
+    print("Slowest modules by self time (last run):")
+    for name, (self_us, cumulative_us) in sorted(profile.items(), key=lambda kv: -kv[1][0])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+
+    failures = []
+    if median_ms > budget["max_import_ms"]:
+        failures.append(f"import took {median_ms:.0f} ms, budget is {budget['max_import_ms']} ms")
+    for forbidden in budget["forbidden_imports"]:
+        loaded = [name for name in profile if name == forbidden or name.startswith(forbidden + ".")]
+        if loaded:
+            failures.append(f"{forbidden} is imported at startup")
+
+    if failures:
+        print("\nStartup budget exceeded:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\nWithin startup budget.")
+
+if __name__ == "__main__":
+    main()
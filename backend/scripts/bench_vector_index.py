@@ -0,0 +1,132 @@
+"""
+Vector search: Chroma client vs the memory-mapped index (app/rag/vector_index.py).
+
+Builds both stores from the same --chunks clustered random unit vectors (no
+model is loaded; a stub embedding function maps query ids to vectors), then runs
+--queries noisy copies of stored vectors through each. recall@k is measured
+against exact float32 search.
+
+  chroma        langchain_chroma on a persistent directory (VECTOR_STORE=chroma)
+  mmap f32      exact search over a float32 matrix (the default build)
+  mmap f16      exact search over a float16 matrix: half the file and page cache,
+                but NumPy has no float16 BLAS, so every scanned row is converted
+  mmap ivf/N    float16 with sqrt(chunks) IVF partitions, N probed per query
+
+    python scripts/bench_vector_index.py --chunks 100000 --queries 200
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from app.rag.vector_index import build_index, MmapVectorIndex
+
+class StubEmbeddings:
+    """Looks vectors up by text ("q:<n>" for queries, "c:<n>" for chunks)."""
+
+    def __init__(self, chunks, queries):
+        self.chunks = chunks
+        self.queries = queries
+
+    def _lookup(self, text):
+        kind, n = text.split(":")
+        return (self.queries if kind == "q" else self.chunks)[int(n)].tolist()
+
+    def embed_query(self, text):
+        return self._lookup(text)
+
+    def embed_documents(self, texts):
+        return [self._lookup(t) for t in texts]
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def measure(label, open_store, queries, truth, k):
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    store = open_store()
+    open_ms = (time.perf_counter() - start) * 1000
+    latencies, recalls = [], []
+    for j in range(len(queries)):
+        start = time.perf_counter()
+        hits = store.similarity_search_with_relevance_scores(f"q:{j}", k=k)
+        latencies.append(time.perf_counter() - start)
+        found = {int(doc.metadata["chunk_id"].split(":")[1]) for doc, _ in hits}
+        recalls.append(len(found & truth[j]) / k)
+    print(f"{label:<14} {open_ms:>8.1f} {statistics.median(latencies) * 1000:>8.2f} "
+          f"{percentile(latencies, 99) * 1000:>8.2f} {statistics.mean(recalls):>9.3f} {rss_mb() - rss_before:>7.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--topics", type=int, default=2000, help="clusters in the synthetic corpus")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Clustered like real embeddings (chunks about the same topic sit together)
+    topics = rng.normal(size=(args.topics, args.dim))
+    chunks = (topics[rng.integers(0, args.topics, args.chunks)]
+              + rng.normal(scale=0.6, size=(args.chunks, args.dim))).astype(np.float32)
+    chunks /= np.linalg.norm(chunks, axis=1, keepdims=True)
+    queries = chunks[rng.choice(args.chunks, args.queries)] + rng.normal(scale=0.05, size=(args.queries, args.dim))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+    truth = [set(np.argsort(-(chunks @ q))[:args.k].tolist()) for q in queries]
+    embeddings = StubEmbeddings(chunks, queries)
+
+    ids = [f"c:{i}" for i in range(args.chunks)]
+    texts = [f"chunk {i}" for i in range(args.chunks)]
+    metadatas = [{"source": "bench", "chunk_id": ids[i]} for i in range(args.chunks)]
+    tmp_dir = tempfile.mkdtemp()
+    nlist = int(math.sqrt(args.chunks))
+    builds = {}
+    for name, dtype, parts in (("f32", "float32", 0), ("f16", "float16", 0), ("ivf", "float16", nlist)):
+        start = time.perf_counter()
+        builds[name] = os.path.join(tmp_dir, name)
+        build_index(builds[name], ids, texts, metadatas, chunks, dtype=dtype, nlist=parts)
+        print(f"built mmap {name} in {time.perf_counter() - start:.1f}s")
+
+    if not args.skip_chroma:
+        from langchain_chroma import Chroma
+        chroma_dir = os.path.join(tmp_dir, "chroma")
+        start = time.perf_counter()
+        store = Chroma(persist_directory=chroma_dir, embedding_function=embeddings,
+                       collection_metadata={"hnsw:space": "cosine"})
+        for i in range(0, args.chunks, 5000):
+            store.add_texts(ids[i:i + 5000], metadatas=metadatas[i:i + 5000], ids=ids[i:i + 5000])
+        del store
+        print(f"built chroma in {time.perf_counter() - start:.1f}s")
+
+    print(f"\n{args.chunks} chunks x {args.dim}, {args.queries} queries, k={args.k}\n")
+    print(f"{'store':<14} {'open ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'recall@k':>9} {'RSS MB':>7}")
+    if not args.skip_chroma:
+        measure("chroma", lambda: Chroma(persist_directory=chroma_dir, embedding_function=embeddings), queries, truth, args.k)
+    measure("mmap f32", lambda: MmapVectorIndex(builds["f32"], embeddings), queries, truth, args.k)
+    measure("mmap f16", lambda: MmapVectorIndex(builds["f16"], embeddings), queries, truth, args.k)
+    for nprobe in args.nprobe:
+        measure(f"mmap ivf/{nprobe}", lambda: MmapVectorIndex(builds["ivf"], embeddings, nprobe=nprobe),
+                queries, truth, args.k)
+
+if __name__ == "__main__":
+    main()
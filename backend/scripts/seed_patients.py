@@ -1,68 +1,75 @@
+"""
+Seeds the demo patients through the bulk importer (app/patient_import.py).
+
+Records have stable external ids (DEMO-0001, ...) and are generated from a
+fixed random seed, so running this again updates the same patients instead
+of adding new ones.
+
+    python scripts/seed_patients.py
+"""
 import sys
 import os
 import datetime
 import json
 import random
+from tempfile import TemporaryDirectory
 
 # Add backend directory to path so we can import app modules
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from app.db import SessionLocal, engine, Base
+from sqlalchemy import func, select, update
+
+from app.db import engine, Base, ensure_columns
 from app.models import Patient
+from app.patient_import import import_patients, print_report
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+FIRST_NAMES = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth", "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen", "Christopher", "Nancy", "Daniel", "Lisa", "Matthew", "Betty", "Anthony", "Margaret", "Mark", "Sandra"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson", "White", "Harris"]
 
-def seed_patients():
-    db = SessionLocal()
-    
-    # Check if data already exists
-    if db.query(Patient).count() > 0:
-        print("Patients already seeded.")
-        # Check for Abhishek specifically
-        if not db.query(Patient).filter(Patient.name == "Abhishek B Shetty").first():
-             print("Adding missing patient: Abhishek B Shetty")
-             abhishek = Patient(
-                name="Abhishek B Shetty",
-                discharge_date=datetime.date(2024, 2, 1),
-                primary_diagnosis="Chronic Kidney Disease Stage 2",
-                medications=["Metformin 500mg", "Atorvastatin 20mg"],
-                dietary_restrictions="Diabetic renal diet, limit sugar",
-                follow_up="Endocrinology in 1 month",
-                warning_signs="Dizziness, high blood sugar, swelling",
-                discharge_instructions="Check blood sugar daily, maintain diet."
-            )
-             db.add(abhishek)
-             db.commit()
-        
-        db.close()
-        return
+DIAGNOSES = [
+    "Chronic Kidney Disease Stage 2",
+    "Chronic Kidney Disease Stage 3a",
+    "Chronic Kidney Disease Stage 3b",
+    "Chronic Kidney Disease Stage 4",
+    "End Stage Renal Disease (on Dialysis)"
+]
 
-    first_names = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth", "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen", "Christopher", "Nancy", "Daniel", "Lisa", "Matthew", "Betty", "Anthony", "Margaret", "Mark", "Sandra"]
-    last_names = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson", "White", "Harris"]
+MEDS_POOL = [
+    "Lisinopril 10mg daily", "Furosemide 20mg twice daily", "Amlodipine 5mg daily",
+    "Metoprolol 25mg daily", "Atorvastatin 40mg daily", "Calcium Acetate 667mg with meals",
+    "Sevelamer 800mg with meals", "Calcitriol 0.25mcg daily", "Allopurinol 100mg daily"
+]
 
-    diagnoses = [
-        "Chronic Kidney Disease Stage 2",
-        "Chronic Kidney Disease Stage 3a",
-        "Chronic Kidney Disease Stage 3b",
-        "Chronic Kidney Disease Stage 4",
-        "End Stage Renal Disease (on Dialysis)"
-    ]
+FIXED_PATIENTS = [
+    {
+        "external_id": "DEMO-JSMITH",
+        "name": "John Smith",
+        "discharge_date": "2024-01-15",
+        "primary_diagnosis": "Chronic Kidney Disease Stage 3",
+        "medications": ["Lisinopril 10mg daily", "Furosemide 20mg twice daily"],
+        "dietary_restrictions": "Low sodium (2g/day), fluid restriction (1.5L/day)",
+        "follow_up": "Nephrology clinic in 2 weeks",
+        "warning_signs": "Swelling, shortness of breath, decreased urine output",
+        "discharge_instructions": "Monitor blood pressure daily, weigh yourself daily"
+    },
+    {
+        "external_id": "DEMO-ABSHETTY",
+        "name": "Abhishek B Shetty",
+        "discharge_date": "2024-02-01",
+        "primary_diagnosis": "Chronic Kidney Disease Stage 2",
+        "medications": ["Metformin 500mg", "Atorvastatin 20mg"],
+        "dietary_restrictions": "Diabetic renal diet, limit sugar",
+        "follow_up": "Endocrinology in 1 month",
+        "warning_signs": "Dizziness, high blood sugar, swelling",
+        "discharge_instructions": "Check blood sugar daily, maintain diet."
+    },
+]
 
-    meds_pool = [
-        "Lisinopril 10mg daily", "Furosemide 20mg twice daily", "Amlodipine 5mg daily", 
-        "Metoprolol 25mg daily", "Atorvastatin 40mg daily", "Calcium Acetate 667mg with meals",
-        "Sevelamer 800mg with meals", "Calcitriol 0.25mcg daily", "Allopurinol 100mg daily"
-    ]
-
-    for i in range(30):
-        name = f"{random.choice(first_names)} {random.choice(last_names)}"
-        diagnosis = random.choice(diagnoses)
-        discharge_date = datetime.date.today() - datetime.timedelta(days=random.randint(1, 60))
-        
-        num_meds = random.randint(2, 5)
-        medications = random.sample(meds_pool, num_meds)
-        
+def demo_records(count: int = 30, seed: int = 7):
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    for i in range(1, count + 1):
+        diagnosis = rng.choice(DIAGNOSES)
         if "Dialysis" in diagnosis:
             diet = "Fluid restriction 1L/day, Low Potassium, Low Phosphorus, High Protein"
             warning = "Missed dialysis session, shortness of breath, bleeding from access site"
@@ -72,48 +79,57 @@ def seed_patients():
         else:
             diet = "Low Sodium (2g/day), DASH diet"
             warning = "Swelling, blood in urine, severe fatigue"
+        yield {
+            "external_id": f"DEMO-{i:04d}",
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "discharge_date": str(today - datetime.timedelta(days=rng.randint(1, 60))),
+            "primary_diagnosis": diagnosis,
+            "medications": rng.sample(MEDS_POOL, rng.randint(2, 5)),
+            "dietary_restrictions": diet,
+            "follow_up": "Nephrology clinic in 2 weeks",
+            "warning_signs": warning,
+            "discharge_instructions": "Monitor blood pressure daily, weigh yourself daily. Call if weight increases > 2kg in 2 days."
+        }
+    yield from FIXED_PATIENTS
 
-        patient = Patient(
-            name=name,
-            discharge_date=discharge_date,
-            primary_diagnosis=diagnosis,
-            medications=medications,
-            dietary_restrictions=diet,
-            follow_up="Nephrology clinic in 2 weeks",
-            warning_signs=warning,
-            discharge_instructions="Monitor blood pressure daily, weigh yourself daily. Call if weight increases > 2kg in 2 days."
-        )
-        db.add(patient)
-
-    # Add specific requested dummy patient
-    john_smith = Patient(
-        name="John Smith",
-        discharge_date=datetime.date(2024, 1, 15),
-        primary_diagnosis="Chronic Kidney Disease Stage 3",
-        medications=["Lisinopril 10mg daily", "Furosemide 20mg twice daily"],
-        dietary_restrictions="Low sodium (2g/day), fluid restriction (1.5L/day)",
-        follow_up="Nephrology clinic in 2 weeks",
-        warning_signs="Swelling, shortness of breath, decreased urine output",
-        discharge_instructions="Monitor blood pressure daily, weigh yourself daily"
-    )
-    db.add(john_smith)
+def backfill_external_ids():
+    """
+    The older seed script added John Smith and Abhishek without an external_id;
+    give those rows the fixed ids so the import updates them instead of adding
+    duplicates. Matches on exact name and discharge date.
+    """
+    Base.metadata.create_all(bind=engine)
+    ensure_columns(engine)
+    linked = 0
+    with engine.begin() as conn:
+        for record in FIXED_PATIENTS:
+            if conn.execute(select(Patient.id).where(Patient.external_id == record["external_id"])).first():
+                continue
+            ids = conn.execute(select(Patient.id).where(
+                Patient.external_id.is_(None),
+                Patient.name == record["name"],
+                Patient.discharge_date == datetime.date.fromisoformat(record["discharge_date"]),
+            )).scalars().all()
+            if len(ids) == 1:
+                conn.execute(update(Patient).where(Patient.id == ids[0]).values(external_id=record["external_id"]))
+                linked += 1
+    if linked:
+        print(f"Linked {linked} patients from an older seed to their external ids.")
 
-    # Add Abhishek B Shetty
-    abhishek = Patient(
-        name="Abhishek B Shetty",
-        discharge_date=datetime.date(2024, 2, 1),
-        primary_diagnosis="Chronic Kidney Disease Stage 2",
-        medications=["Metformin 500mg", "Atorvastatin 20mg"],
-        dietary_restrictions="Diabetic renal diet, limit sugar",
-        follow_up="Endocrinology in 1 month",
-        warning_signs="Dizziness, high blood sugar, swelling",
-        discharge_instructions="Check blood sugar daily, maintain diet."
-    )
-    db.add(abhishek)
+def seed_patients():
+    backfill_external_ids()
+    with TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "demo_patients.jsonl")
+        with open(path, "w") as f:
+            for record in demo_records():
+                f.write(json.dumps(record) + "\n")
+        print_report(import_patients(path))
 
-    db.commit()
-    print("Seeded 31 patients.")
-    db.close()
+    with engine.connect() as conn:
+        legacy = conn.execute(select(func.count()).select_from(Patient).where(Patient.external_id.is_(None))).scalar()
+    if legacy:
+        print(f"Note: {legacy} patients from an older seed have no external_id and were left as they are. "
+              "Delete patients.db and run this again for a clean demo database.")
 
 if __name__ == "__main__":
     seed_patients()
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.db import Base, ReadSessionLocal, SessionLocal, use_database
+
+@pytest.fixture
+def database(tmp_path):
+    """A throwaway SQLite database behind both session factories; the originals are restored afterwards."""
+    write_bind, read_bind = SessionLocal.kw["bind"], ReadSessionLocal.kw["bind"]
+    engine = use_database(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    try:
+        yield engine
+    finally:
+        read_engine = ReadSessionLocal.kw["bind"]
+        SessionLocal.configure(bind=write_bind)
+        ReadSessionLocal.configure(bind=read_bind)
+        engine.dispose()
+        read_engine.dispose()
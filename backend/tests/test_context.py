@@ -0,0 +1,58 @@
+import asyncio
+import os
+import sys
+
+from langchain_core.messages import AIMessage
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.agents import context
+from app.agents.context import build_context
+
+class FailingLLM:
+    async def ainvoke(self, messages, **kwargs):
+        raise RuntimeError("model down")
+
+class SummaryLLM:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        return AIMessage(content="Patient asked about earlier messages.")
+
+def _conversation(count):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"} for i in range(count)]
+
+def _verbatim(result):
+    return [m.content for m in result.messages[1:]]
+
+def test_messages_waiting_for_a_summary_batch_are_sent(monkeypatch):
+    monkeypatch.setattr(context, "CONTEXT_WINDOW_MESSAGES", 4)
+    monkeypatch.setattr(context, "SUMMARY_BATCH_MESSAGES", 8)
+    conversation = _conversation(9)
+    conversation[2]["content"] = "I stopped taking my furosemide"
+    llm = SummaryLLM()
+    result = asyncio.run(build_context(llm, {"messages": conversation}, "system", conversation))
+    # Past the window but short of a batch: not summarized, so still sent as is
+    assert llm.calls == 0
+    assert "I stopped taking my furosemide" in _verbatim(result)
+    assert result.state_update["summarized_count"] == 0
+
+def test_failed_summary_keeps_the_backlog_in_the_prompt(monkeypatch):
+    monkeypatch.setattr(context, "CONTEXT_WINDOW_MESSAGES", 4)
+    monkeypatch.setattr(context, "SUMMARY_BATCH_MESSAGES", 2)
+    conversation = _conversation(9)
+    result = asyncio.run(build_context(FailingLLM(), {"messages": conversation}, "system", conversation))
+    assert _verbatim(result) == [f"message {i}" for i in range(9)]
+    assert result.state_update["summarized_count"] == 0
+
+def test_folded_batch_is_replaced_by_the_summary(monkeypatch):
+    monkeypatch.setattr(context, "CONTEXT_WINDOW_MESSAGES", 4)
+    monkeypatch.setattr(context, "SUMMARY_BATCH_MESSAGES", 2)
+    conversation = _conversation(9)
+    result = asyncio.run(build_context(SummaryLLM(), {"messages": conversation}, "system", conversation))
+    assert _verbatim(result) == [f"message {i}" for i in range(6, 9)]
+    assert "Patient asked about earlier messages." in result.messages[0].content
+    assert result.state_update["summarized_count"] == 6
@@ -0,0 +1,85 @@
+import os
+import sys
+
+import pytest
+from langchain_core.documents import Document
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.rag import retriever
+from app.rag.keyword_index import BM25Index
+
+CHUNKS = {
+    "furosemide": "Furosemide is a loop diuretic. Take it in the morning to avoid waking at night.",
+    "lisinopril": "Lisinopril is an ACE inhibitor that lowers blood pressure and protects the kidneys.",
+    "potassium": "Bananas, oranges and potatoes are high in potassium; limit them in CKD stage 4.",
+    "fluids": "Fluid restriction: drink no more than 1.5 litres a day unless told otherwise.",
+    "nsaids": "Avoid ibuprofen and other NSAIDs; they reduce blood flow to the kidneys.",
+}
+
+class FakeStore:
+    """Vector store stand-in: a fixed dense ranking, whatever the question."""
+
+    def __init__(self, dense_order, extra=None):
+        self.dense_order = dense_order
+        self.extra = extra or {}
+
+    def get(self, include=None):
+        keys = list(CHUNKS)
+        return {"ids": keys, "documents": [CHUNKS[k] for k in keys], "metadatas": [{"chunk_id": k} for k in keys]}
+
+    def similarity_search_with_relevance_scores(self, question, k):
+        docs = []
+        for key in self.dense_order[:k]:
+            text = CHUNKS.get(key) or self.extra[key]
+            docs.append((Document(page_content=text, metadata={"chunk_id": key}), 0.5))
+        return docs
+
+@pytest.fixture
+def store(monkeypatch):
+    def use(dense_order, extra=None):
+        monkeypatch.setattr(retriever, "_vector_store", FakeStore(dense_order, extra))
+        monkeypatch.setattr(retriever, "_keyword_index_store", None)
+        monkeypatch.setattr(retriever, "_keyword_index", None)
+        monkeypatch.setattr(retriever, "_reranker", None)
+        monkeypatch.setattr(retriever, "RAG_RERANKER", "")
+    return use
+
+def _keys(hits):
+    return [doc.metadata["chunk_id"] for doc, _ in hits]
+
+def test_bm25_finds_exact_drug_names():
+    index = BM25Index(CHUNKS.items())
+    assert index.search("Can I take furosemide at night?", 2)[0][0] == "furosemide"
+    assert index.search("unrelated words", 2) == []
+
+def test_chunk_found_by_both_retrievers_ranks_first(store):
+    store(["fluids", "nsaids", "lisinopril"])
+    hits = retriever.retrieve("is ibuprofen bad for my kidneys", k=3)
+    assert _keys(hits)[0] == "nsaids"
+
+def test_keyword_match_recovers_what_dense_search_missed(store):
+    store(["fluids", "potassium"])
+    assert "furosemide" in _keys(retriever.retrieve("furosemide timing", k=3))
+
+def test_patient_context_boosts_chunks_about_their_medication(store):
+    store(["lisinopril", "furosemide"])
+    plain = _keys(retriever.retrieve("what should I know", k=2, keyword=False))
+    boosted = _keys(retriever.retrieve("what should I know", k=2, keyword=False,
+                                       patient_context="Diagnosis: CKD, Meds: ['Furosemide 20mg']"))
+    assert plain[0] == "lisinopril" and boosted[0] == "furosemide"
+
+def test_dense_hit_missing_from_the_keyword_index_is_kept(store):
+    store(["new-chunk"], extra={"new-chunk": "Newly ingested guidance on SGLT2 inhibitors."})
+    assert _keys(retriever.retrieve("sglt2", k=1, keyword=False)) == ["new-chunk"]
+
+def test_reranker_reorders_the_fused_candidates(store, monkeypatch):
+    store(["fluids", "nsaids"])
+
+    class Reranker:
+        def predict(self, pairs):
+            return [5.0 if "Fluid" in text else -5.0 for _, text in pairs]
+    monkeypatch.setattr(retriever, "_reranker", Reranker())
+    assert _keys(retriever.retrieve("ibuprofen", k=1))[0] == "fluids"
+    assert _keys(retriever.retrieve("ibuprofen", k=1, rerank=False))[0] == "nsaids"
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+# The loader, splitter and store come from the ingestion-only dependencies
+for module in ("langchain_community", "langchain_text_splitters", "langchain_chroma", "dotenv"):
+    pytest.importorskip(module)
+
+from app.rag import ingest
+from app.rag.vector_index import MmapVectorIndex
+
+def _paragraph(topic: str) -> str:
+    # ~300 characters, so each paragraph is a chunk of its own
+    return " ".join([f"{topic} sentence {i} about kidney care at home." for i in range(7)])
+
+class FakeChroma:
+    """In-memory stand-in for the Chroma store, counting what gets embedded."""
+
+    def __init__(self):
+        self.docs = {}  # id -> (text, metadata)
+        self.embedded = []
+        self.deleted = []
+
+    def _vector(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return (np.frombuffer(digest[:8], dtype=np.uint8).astype(np.float32) + 1).tolist()
+
+    def add_documents(self, documents, ids):
+        for doc, chunk_id in zip(documents, ids):
+            self.docs[chunk_id] = (doc.page_content, dict(doc.metadata))
+            self.embedded.append(chunk_id)
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self.docs.pop(chunk_id, None)
+            self.deleted.append(chunk_id)
+
+    def get(self, include=None):
+        ids = list(self.docs)
+        return {
+            "ids": ids,
+            "documents": [self.docs[i][0] for i in ids],
+            "metadatas": [self.docs[i][1] for i in ids],
+            "embeddings": [self._vector(self.docs[i][0]) for i in ids],
+        }
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    db_path = tmp_path / "chroma_db"
+    store = FakeChroma()
+    monkeypatch.setattr(ingest, "DB_PATH", str(db_path))
+    monkeypatch.setattr(ingest, "MANIFEST_PATH", str(db_path / "ingest_manifest.json"))
+    monkeypatch.setattr(ingest, "VECTOR_INDEX_PATH", str(db_path / "vector_index"))
+    monkeypatch.setattr(ingest, "Chroma", lambda **kwargs: store)
+    monkeypatch.setattr(ingest, "get_embeddings", lambda: None)
+    return data_dir, store
+
+def _write(data_dir, name, *topics):
+    (data_dir / name).write_text("\n\n".join(_paragraph(t) for t in topics), encoding="utf-8")
+
+def _manifest():
+    with open(ingest.MANIFEST_PATH) as f:
+        return json.load(f)
+
+def test_first_ingest_embeds_everything_and_builds_index(kb):
+    data_dir, store = kb
+    _write(data_dir, "diet.md", "potassium", "sodium")
+    _write(data_dir, "meds.txt", "furosemide")
+    (data_dir / "notes.pdf").write_text("ignored")
+
+    ingest.ingest_data(str(data_dir), batch_size=2)
+
+    manifest = _manifest()
+    assert sorted(manifest["files"]) == ["diet.md", "meds.txt"]
+    assert len(store.embedded) == 3 == len(store.docs)
+    index = MmapVectorIndex(ingest.VECTOR_INDEX_PATH, None)
+    assert sorted(index.get()["ids"]) == sorted(store.docs)
+
+def test_rerun_without_changes_embeds_nothing(kb):
+    data_dir, store = kb
+    _write(data_dir, "diet.md", "potassium", "sodium")
+    ingest.ingest_data(str(data_dir))
+    store.embedded.clear()
+
+    ingest.ingest_data(str(data_dir))
+
+    assert store.embedded == [] and store.deleted == []
+
+def test_edited_file_only_reembeds_changed_chunks(kb):
+    data_dir, store = kb
+    _write(data_dir, "diet.md", "potassium", "sodium", "fluids")
+    ingest.ingest_data(str(data_dir))
+    before = _manifest()["files"]["diet.md"]["chunk_ids"]
+    store.embedded.clear()
+
+    _write(data_dir, "diet.md", "potassium", "phosphorus", "fluids")
+    ingest.ingest_data(str(data_dir))
+
+    after = _manifest()["files"]["diet.md"]["chunk_ids"]
+    assert len(store.embedded) == 1
+    assert store.deleted == [before[1]]
+    assert after[0] == before[0] and after[2] == before[2]
+    assert "phosphorus" in store.docs[after[1]][0]
+    assert len(MmapVectorIndex(ingest.VECTOR_INDEX_PATH, None)) == 3
+
+def test_removed_file_deletes_its_chunks(kb):
+    data_dir, store = kb
+    _write(data_dir, "diet.md", "potassium")
+    _write(data_dir, "meds.txt", "furosemide", "lisinopril")
+    ingest.ingest_data(str(data_dir))
+    meds_ids = _manifest()["files"]["meds.txt"]["chunk_ids"]
+
+    (data_dir / "meds.txt").unlink()
+    ingest.ingest_data(str(data_dir))
+
+    assert sorted(store.deleted) == sorted(meds_ids)
+    assert list(_manifest()["files"]) == ["diet.md"]
+    assert len(store.docs) == 1
+
+def test_repeated_text_gets_distinct_ids(kb):
+    data_dir, store = kb
+    _write(data_dir, "diet.md", "potassium", "potassium")
+
+    ingest.ingest_data(str(data_dir))
+
+    ids = _manifest()["files"]["diet.md"]["chunk_ids"]
+    assert len(ids) == 2 and ids[1] == f"{ids[0]}-1"
+    assert len(store.docs) == 2
+
+def test_full_rebuild_reembeds_everything(kb):
+    data_dir, store = kb
+    _write(data_dir, "diet.md", "potassium", "sodium")
+    ingest.ingest_data(str(data_dir))
+    store.embedded.clear()
+
+    ingest.ingest_data(str(data_dir), full=True)
+
+    assert len(store.embedded) == 2
+    assert len(store.deleted) == 2
+    assert len(store.docs) == 2
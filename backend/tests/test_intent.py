@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.agents.intent import classify_by_rules, extract_name
+
+@pytest.mark.parametrize("message", [
+    "I'm diabetic", "I'm anxious", "I am pregnant", "I'm nervous about tomorrow", "This is ridiculous",
+    "It's nothing", "I'm his daughter", "Help", "Test", "I'm Sorry", "im fine",
+])
+def test_not_a_name(message):
+    assert extract_name(message, asked_for_name=True) is None
+
+@pytest.mark.parametrize("message, name", [
+    ("My name is john smith", "john smith"),
+    ("I'm John Smith", "John Smith"),
+    ("Hi, I am Abhishek and I have a question", "Abhishek"),
+    ("John Smith", "John Smith"),
+])
+def test_name(message, name):
+    assert extract_name(message, asked_for_name=True) == name
+
+def test_bare_name_only_after_being_asked():
+    assert extract_name("John Smith", asked_for_name=False) is None
+
+def test_name_before_medical_question_when_unidentified():
+    message = "Hi, I'm John Smith, I have a question about my kidney medication"
+    intent = classify_by_rules(message, patient_identified=False, asked_for_name=True)
+    assert (intent.kind, intent.name) == ("identify", "John Smith")
+    assert classify_by_rules(message, patient_identified=True, asked_for_name=True).kind == "medical"
+
+@pytest.mark.parametrize("message", [
+    "Can I eat bananas with my kidney condition?",
+    "How much water should I drink each day?",
+    "My ankles have been swelling since yesterday",
+    "I have been feeling very tired and short of breath",
+    "Is it safe to take ibuprofen for a headache",
+    "Do I take my lisinopril in the morning or at night?",
+    "My urine looks darker than usual, is that normal?",
+    "Should I worry about it getting worse?",
+])
+def test_medical_messages_go_to_clinical(message):
+    assert classify_by_rules(message, patient_identified=True, asked_for_name=False).kind == "medical"
+
+@pytest.mark.parametrize("message", [
+    "Yes, I'm taking my meds",
+    "I've been drinking lots of water",
+    "Can I eat lunch first?",
+    "No pain at all, feeling good",
+    "My blood pressure was fine this morning",
+    "I lost some weight, been doing my exercise",
+    "Thanks, that's all for today",
+])
+def test_check_in_answers_stay_with_the_receptionist(message):
+    assert classify_by_rules(message, patient_identified=True, asked_for_name=False) is None
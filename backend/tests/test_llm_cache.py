@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.agents import llm_cache as llm_cache_module
+from app.agents.events import REPLY_TAG
+from app.agents.llm_cache import CachingChatModel, LLMCallCache, LLMCacheMiss
+
+MESSAGES = [HumanMessage(content="Can I eat bananas?")]
+
+class StubLLM:
+    def __init__(self, content="Bananas are high in potassium."):
+        self.content = content
+        self.calls = 0
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        return AIMessage(content=self.content, usage_metadata={"input_tokens": 5, "output_tokens": 5, "total_tokens": 10})
+
+def _memory_cache():
+    return LLMCallCache("memory", "", memory_entries=16, max_entries=16, ttl_seconds=60)
+
+def _call(model, config=None):
+    return asyncio.run(model.ainvoke(MESSAGES, config=config))
+
+def test_hit_returns_the_stored_reply_and_emits_it(monkeypatch):
+    emitted = []
+
+    async def record(response, config):
+        emitted.append((response.content, config))
+    monkeypatch.setattr(llm_cache_module, "emit_reply_text", record)
+
+    llm = StubLLM()
+    model = CachingChatModel(llm, _memory_cache(), {"model": "stub", "temperature": 0})
+    config = {"tags": [REPLY_TAG]}
+    first = _call(model, config)
+    second = _call(model, config)
+    assert llm.calls == 1
+    assert second.content == first.content
+    # Only the cached reply is emitted; the live one streamed from the model
+    assert emitted == [(first.content, config)]
+
+def test_replay_miss_raises_without_a_model(tmp_path):
+    cache = LLMCallCache("replay", str(tmp_path / "captured.db"), 16, 16, 60)
+    with pytest.raises(LLMCacheMiss):
+        _call(CachingChatModel(None, cache, {"model": "stub", "temperature": 0}))
+
+def test_recorded_reply_replays_offline(tmp_path):
+    path = str(tmp_path / "captured.db")
+    recorded = _call(CachingChatModel(StubLLM(), LLMCallCache("record", path, 16, 16, 60), {"model": "stub"}))
+    replayed = _call(CachingChatModel(None, LLMCallCache("replay", path, 16, 16, 60), {"model": "stub"}))
+    assert replayed.content == recorded.content
+
+def test_empty_reply_is_not_stored():
+    llm = StubLLM(content="")
+    cache = _memory_cache()
+    model = CachingChatModel(llm, cache, {"model": "stub", "temperature": 0})
+    _call(model)
+    _call(model)
+    assert llm.calls == 2
+    assert cache.stores == 0
+
+@pytest.mark.parametrize("mode", ["memory", "on"])
+def test_sampling_temperature_bypasses_the_cache(tmp_path, mode):
+    llm = StubLLM()
+    cache = LLMCallCache(mode, str(tmp_path / "cache.db"), 16, 16, 60)
+    model = CachingChatModel(llm, cache, {"model": "stub", "temperature": 0.7})
+    _call(model)
+    _call(model)
+    assert llm.calls == 2
+    assert cache.stores == 0
+
+def test_sampling_temperature_is_still_captured_for_replay(tmp_path):
+    cache = LLMCallCache("record", str(tmp_path / "captured.db"), 16, 16, 60)
+    _call(CachingChatModel(StubLLM(), cache, {"model": "stub", "temperature": 0.7}))
+    assert cache.stores == 1
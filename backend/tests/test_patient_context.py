@@ -0,0 +1,60 @@
+import json
+import os
+import sys
+import time
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.db import SessionLocal
+from app.models import Patient
+from app.patient_context import PatientContextCache, patient_record, record_version
+from app.patient_import import import_patients
+
+def _import(tmp_path, engine, diagnosis):
+    path = tmp_path / "export.jsonl"
+    path.write_text(json.dumps({"external_id": "P1", "name": "Jane Doe", "discharge_date": "2024-01-01",
+                                "primary_diagnosis": diagnosis, "medications": ["Lisinopril 10mg"]}) + "\n")
+    import_patients(str(path), bind=engine, progress_every=0)
+
+def _record():
+    db = SessionLocal()
+    try:
+        return patient_record(db.query(Patient).filter(Patient.external_id == "P1").one())
+    finally:
+        db.close()
+
+def test_reimported_row_gets_a_new_row_version(tmp_path, database):
+    engine = database
+    _import(tmp_path, engine, "CKD Stage 3")
+    before = _record()
+    time.sleep(0.01)
+    _import(tmp_path, engine, "CKD Stage 4")
+    after = _record()
+    assert before["updated_at"] and after["updated_at"] != before["updated_at"]
+    assert after["version"] != before["version"]
+
+def test_version_check_is_skipped_until_the_interval_passes_or_an_invalidation():
+    cache = PatientContextCache(max_entries=10, check_interval=60)
+    record = {"id": 1, "name": "Jane Doe", "diagnosis": "CKD Stage 3"}
+    record["version"] = record_version(record)
+    assert cache.needs_check(record)
+    cache.get(record)
+    cache.mark_checked(1)
+    assert not cache.needs_check(record)
+    # Another session reloaded a newer version: this copy is stale
+    newer = {**record, "diagnosis": "CKD Stage 4"}
+    newer["version"] = record_version(newer)
+    cache.get(newer)
+    assert cache.needs_check(record)
+    cache.mark_checked(1)
+    assert not cache.needs_check(newer)
+    cache.invalidate(1)
+    assert cache.needs_check(newer)
+
+def test_unchanged_reimport_keeps_the_row_version(tmp_path, database):
+    _import(tmp_path, database, "CKD Stage 3")
+    before = _record()
+    time.sleep(0.01)
+    _import(tmp_path, database, "CKD Stage 3")
+    assert _record() == before
@@ -0,0 +1,87 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.db import SessionLocal
+from app.models import Patient
+from app.patient_import import RowError, import_patients, validate_row
+from app.patient_index import best_matches, search_patients, vocabulary
+
+def _row(external_id, name, **fields):
+    return {"external_id": external_id, "name": name, "discharge_date": "2024-01-01",
+            "primary_diagnosis": "CKD Stage 3", **fields}
+
+def _write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    return str(path)
+
+def _patients():
+    db = SessionLocal()
+    try:
+        return {p.external_id: p for p in db.query(Patient).all()}
+    finally:
+        db.close()
+
+def _find(name):
+    db = SessionLocal()
+    try:
+        return [p.external_id for p in best_matches(search_patients(db, name))]
+    finally:
+        db.close()
+
+@pytest.fixture(autouse=True)
+def fresh_vocabulary():
+    vocabulary.invalidate()
+    yield
+    vocabulary.invalidate()
+
+def test_import_inserts_then_upserts_on_external_id(tmp_path, database):
+    path = tmp_path / "export.jsonl"
+    stats = import_patients(_write_jsonl(path, [_row("P1", "Jane Doe"), _row("P2", "Ravi Kumar")]),
+                            bind=database, progress_every=0)
+    assert (stats.inserted, stats.updated) == (2, 0)
+
+    stats = import_patients(_write_jsonl(path, [_row("P1", "Jane Doe", primary_diagnosis="CKD Stage 4"),
+                                                _row("P2", "Ravi Kumar")]),
+                            bind=database, progress_every=0)
+    assert (stats.inserted, stats.updated, stats.unchanged) == (0, 1, 1)
+    patients = _patients()
+    assert len(patients) == 2
+    assert patients["P1"].primary_diagnosis == "CKD Stage 4"
+
+def test_imported_and_renamed_patients_are_searchable(tmp_path, database):
+    path = tmp_path / "export.jsonl"
+    import_patients(_write_jsonl(path, [_row("P1", "Jane Doe")]), bind=database, progress_every=0)
+    assert _find("Jane Doe") == ["P1"]
+    import_patients(_write_jsonl(path, [_row("P1", "Jane Okafor")]), bind=database, progress_every=0)
+    assert _find("Jane Okafor") == ["P1"]
+    assert _find("Doe") == []
+
+def test_bad_rows_are_rejected_and_the_rest_imported(tmp_path, database):
+    path = tmp_path / "export.jsonl"
+    path.write_text(json.dumps(_row("P1", "Jane Doe")) + "\n"
+                    + json.dumps(_row("P2", "No Date", discharge_date="yesterday")) + "\n"
+                    + "{not json\n"
+                    + json.dumps({"name": "No Id"}) + "\n")
+    stats = import_patients(str(path), bind=database, progress_every=0)
+    assert (stats.read, stats.inserted, stats.rejected) == (4, 1, 3)
+    assert len(stats.errors) == 3
+
+def test_last_copy_of_a_repeated_record_wins(tmp_path, database):
+    path = _write_jsonl(tmp_path / "export.jsonl", [_row("P1", "Jane Doe"), _row("P1", "Jane Doe", diet="Low salt")])
+    import_patients(path, bind=database, progress_every=0)
+    assert _patients()["P1"].dietary_restrictions == "Low salt"
+
+def test_csv_row_aliases_and_medication_lists():
+    row = validate_row({"MRN": " P1 ", "name": "Jane   Doe", "discharge_date": "2024-01-01T10:00:00",
+                        "diagnosis": "CKD", "meds": "Lisinopril 10mg; Furosemide 20mg"})
+    assert row["external_id"] == "P1" and row["name"] == "Jane Doe"
+    assert row["medications"] == ["Lisinopril 10mg", "Furosemide 20mg"]
+    assert validate_row(_row("P1", "Jane", medications='["A", "B"]'))["medications"] == ["A", "B"]
+    with pytest.raises(RowError):
+        validate_row(_row("P1", "Jane", medications="[broken"))
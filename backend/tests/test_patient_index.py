@@ -0,0 +1,60 @@
+import datetime
+import os
+import sys
+
+import pytest
+from sqlalchemy import delete
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.db import SessionLocal
+from app.models import Patient, PatientNameToken
+from app.patient_index import best_matches, ensure_name_index, search_patients, vocabulary
+
+NAMES = ["John Smith", "Jane Smith", "Abhishek B Shetty", "Maria Lopez"]
+
+@pytest.fixture
+def db(database):
+    vocabulary.invalidate()
+    session = SessionLocal()
+    for name in NAMES:
+        session.add(Patient(name=name, discharge_date=datetime.date(2024, 1, 1), primary_diagnosis="CKD Stage 3",
+                            medications=[]))
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+        vocabulary.invalidate()
+
+def _best(db, query):
+    return sorted(p.name for p in best_matches(search_patients(db, query)))
+
+def test_full_name_matches_one_patient(db):
+    assert _best(db, "john smith") == ["John Smith"]
+
+def test_partial_name_and_prefix(db):
+    assert _best(db, "abhi") == ["Abhishek B Shetty"]
+    assert _best(db, "Smith") == ["Jane Smith", "John Smith"]
+
+def test_typo_still_matches(db):
+    assert _best(db, "Jon Smith") == ["John Smith"]
+    assert _best(db, "Maria Lopes") == ["Maria Lopez"]
+
+def test_unrelated_name_finds_nobody(db):
+    assert search_patients(db, "Peter Quill") == []
+
+def test_renamed_patient_is_reindexed(db):
+    patient = db.query(Patient).filter(Patient.name == "Maria Lopez").one()
+    patient.name = "Maria Okafor"
+    db.commit()
+    assert _best(db, "Maria Okafor") == ["Maria Okafor"]
+    assert search_patients(db, "Lopez") == []
+
+def test_missing_index_is_backfilled(db):
+    db.execute(delete(PatientNameToken))
+    db.commit()
+    vocabulary.invalidate()
+    ensure_name_index(db)
+    assert _best(db, "john smith") == ["John Smith"]
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.rag import prefetch
+from app.rag.prefetch import RetrievalPrefetcher, prefetch_topics
+
+PATIENT = {"id": 1, "name": "Ada Lovelace", "diagnosis": "CKD stage 4",
+           "medications": ["Furosemide 40mg", "Lisinopril 10mg"]}
+WORDS = ["CKD", "Furosemide", "Lisinopril", "weather"]
+
+def _embed(text):
+    # One axis per known word, so a topic matches questions naming the same thing
+    vector = np.array([1.0 if word.lower() in text.lower() else 0.0 for word in WORDS], dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+@pytest.fixture
+def retrieval(monkeypatch):
+    calls = []
+    gate = threading.Event()
+    gate.set()
+
+    def rag_query(query, context):
+        calls.append((query, context))
+        gate.wait(5)
+        return [f"passage for {query}"]
+
+    monkeypatch.setattr(prefetch.answer_cache, "embed", _embed)
+    monkeypatch.setattr(prefetch, "rag_query", rag_query)
+    return calls, gate
+
+async def _wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+def test_prefetch_topics_covers_diagnosis_and_medications():
+    topics = prefetch_topics(PATIENT)
+
+    assert "CKD stage 4" in topics[0]
+    assert any("Furosemide" in t for t in topics) and any("Lisinopril" in t for t in topics)
+    assert prefetch_topics({"diagnosis": None, "medications": [None, ""]}) == []
+
+def test_lookup_returns_staged_passages_for_matching_query(retrieval):
+    calls, _ = retrieval
+    prefetcher = RetrievalPrefetcher(threshold=0.85, ttl_seconds=60, max_sessions=10)
+
+    async def main():
+        prefetcher.schedule("s1", PATIENT)
+        await _wait_for(lambda: prefetcher.completed == 1)
+
+    asyncio.run(main())
+    assert prefetcher.has_entries("s1")
+    assert len(calls) == len(prefetch_topics(PATIENT))
+    staged = prefetcher.lookup("s1", _embed("furosemide side effects"))
+    assert staged == [f"passage for {prefetch_topics(PATIENT)[1]}"]
+    assert prefetcher.lookup("s1", _embed("what's the weather")) is None
+    assert prefetcher.lookup("other", _embed("furosemide")) is None
+    assert prefetcher.stats()["hits"] == 1 and prefetcher.stats()["misses"] == 1
+
+def test_same_patient_version_is_not_refetched(retrieval):
+    calls, _ = retrieval
+    prefetcher = RetrievalPrefetcher(threshold=0.85, ttl_seconds=60, max_sessions=10)
+
+    async def main():
+        prefetcher.schedule("s1", PATIENT)
+        prefetcher.schedule("s1", dict(PATIENT))
+        await _wait_for(lambda: prefetcher.completed == 1)
+
+    asyncio.run(main())
+    assert prefetcher.started == 1
+    assert len(calls) == len(prefetch_topics(PATIENT))
+
+def test_cancel_stops_in_flight_prefetch(retrieval):
+    calls, gate = retrieval
+    gate.clear()
+    prefetcher = RetrievalPrefetcher(threshold=0.85, ttl_seconds=60, max_sessions=10)
+
+    async def main():
+        prefetcher.schedule("s1", PATIENT)
+        await _wait_for(lambda: calls)
+        task = prefetcher._sessions["s1"].task
+        prefetcher.cancel("s1")
+        gate.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert prefetcher.stats() == {"sessions": 0, "started": 1, "completed": 0,
+                                  "cancelled": 1, "hits": 0, "misses": 0}
+    assert len(calls) == 1
+
+def test_new_patient_version_replaces_running_prefetch(retrieval):
+    calls, gate = retrieval
+    gate.clear()
+    prefetcher = RetrievalPrefetcher(threshold=0.85, ttl_seconds=60, max_sessions=10)
+    edited = dict(PATIENT, medications=["Lisinopril 10mg"])
+
+    async def main():
+        prefetcher.schedule("s1", PATIENT)
+        await _wait_for(lambda: calls)
+        prefetcher.schedule("s1", edited)
+        gate.set()
+        await _wait_for(lambda: prefetcher.completed == 1)
+
+    asyncio.run(main())
+    assert prefetcher.cancelled == 1
+    assert prefetcher.lookup("s1", _embed("furosemide")) is None
+    assert prefetcher.lookup("s1", _embed("lisinopril")) is not None
+
+def test_eviction_and_clear_cancel_tasks(retrieval):
+    _, gate = retrieval
+    gate.clear()
+    prefetcher = RetrievalPrefetcher(threshold=0.85, ttl_seconds=60, max_sessions=1)
+
+    async def main():
+        prefetcher.schedule("s1", PATIENT)
+        prefetcher.schedule("s2", dict(PATIENT, id=2))
+        assert prefetcher.cancelled == 1
+        prefetcher.clear()
+        gate.set()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert prefetcher.stats()["sessions"] == 0
+    assert prefetcher.cancelled == 2
+    assert prefetcher.completed == 0
+
+def test_expired_entries_are_dropped(retrieval):
+    prefetcher = RetrievalPrefetcher(threshold=0.85, ttl_seconds=0, max_sessions=10)
+
+    async def main():
+        prefetcher.schedule("s1", PATIENT)
+        await _wait_for(lambda: prefetcher.completed == 1)
+
+    asyncio.run(main())
+    assert prefetcher.lookup("s1", _embed("furosemide")) is None
+    assert prefetcher.stats()["sessions"] == 0
+
+def test_failed_retrieval_stops_quietly(monkeypatch):
+    def rag_query(query, context):
+        raise RuntimeError("store unavailable")
+
+    monkeypatch.setattr(prefetch.answer_cache, "embed", _embed)
+    monkeypatch.setattr(prefetch, "rag_query", rag_query)
+    prefetcher = RetrievalPrefetcher(threshold=0.85, ttl_seconds=60, max_sessions=10)
+
+    async def main():
+        prefetcher.schedule("s1", PATIENT)
+        await prefetcher._sessions["s1"].task
+
+    asyncio.run(main())
+    assert prefetcher.completed == 0
+    assert not prefetcher.has_entries("s1")
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.agents.resilience import CallPolicy, CircuitBreaker, LLMUnavailable, ResilientChatModel
+from app.metrics import Trace, start_trace
+
+COOLDOWN = 0.05
+
+class ProviderError(Exception):
+    code = 503
+
+class ScriptedLLM:
+    """Each call takes the next (delay, outcome) step; outcome is reply text or an exception."""
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.calls = 0
+
+    async def ainvoke(self, messages, **kwargs):
+        delay, outcome = self.steps[min(self.calls, len(self.steps) - 1)]
+        self.calls += 1
+        await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return AIMessage(content=outcome)
+
+def _policy(**settings) -> CallPolicy:
+    policy = CallPolicy()
+    policy.call_timeout = 1.0
+    policy.turn_budget = 5.0
+    policy.max_retries = 0
+    policy.base_delay = 0
+    policy.hedge = False
+    policy.breaker = CircuitBreaker(1, COOLDOWN)
+    for name, value in settings.items():
+        setattr(policy, name, value)
+    return policy
+
+def _call(llm, policy):
+    return asyncio.run(ResilientChatModel(llm, policy).ainvoke([HumanMessage(content="hi")]))
+
+def _open_breaker(policy):
+    with pytest.raises(LLMUnavailable):
+        _call(ScriptedLLM((0, ProviderError("503"))), policy)
+    assert policy.breaker.state == "open"
+    time.sleep(COOLDOWN * 2)
+
+def test_half_open_trial_that_succeeds_closes_the_breaker():
+    policy = _policy()
+    _open_breaker(policy)
+    assert _call(ScriptedLLM((0, "ok")), policy).content == "ok"
+    assert policy.breaker.state == "closed"
+
+def test_half_open_trial_that_fails_reopens_the_breaker():
+    policy = _policy()
+    _open_breaker(policy)
+    with pytest.raises(LLMUnavailable):
+        _call(ScriptedLLM((0, ProviderError("503"))), policy)
+    assert policy.breaker.state == "open"
+    llm = ScriptedLLM((0, "ok"))
+    with pytest.raises(LLMUnavailable, match="circuit breaker is open"):
+        _call(llm, policy)
+    assert llm.calls == 0
+
+def test_spent_budget_does_not_take_the_half_open_trial():
+    policy = _policy()
+    _open_breaker(policy)
+    trace = Trace()
+    trace.started -= policy.turn_budget + 1
+    with start_trace(trace):
+        with pytest.raises(LLMUnavailable, match="budget"):
+            _call(ScriptedLLM((0, "ok")), policy)
+    # The trial is still free for the next caller
+    assert _call(ScriptedLLM((0, "ok")), policy).content == "ok"
+    assert policy.breaker.state == "closed"
+
+def test_budget_running_out_during_the_trial_reopens_the_breaker():
+    policy = _policy(turn_budget=0.1)
+    _open_breaker(policy)
+    with pytest.raises(LLMUnavailable):
+        _call(ScriptedLLM((1.0, "late")), policy)
+    assert policy.breaker.state == "open"
+    time.sleep(COOLDOWN * 2)
+    assert _call(ScriptedLLM((0, "ok")), policy).content == "ok"
+
+def test_transient_failure_is_retried():
+    policy = _policy(max_retries=2)
+    policy.breaker = CircuitBreaker(5, COOLDOWN)
+    llm = ScriptedLLM((0, ProviderError("503")), (0, "ok"))
+    assert _call(llm, policy).content == "ok"
+    assert (llm.calls, policy.retries, policy.breaker.state) == (2, 1, "closed")
+
+def test_slow_call_is_hedged_and_the_duplicate_wins():
+    policy = _policy(hedge=True, hedge_after=0.05)
+    llm = ScriptedLLM((0.5, "primary"), (0, "hedge"))
+    started = time.perf_counter()
+    assert _call(llm, policy).content == "hedge"
+    assert time.perf_counter() - started < 0.4
+    assert (llm.calls, policy.hedges, policy.hedge_wins) == (2, 1, 1)
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.session_store import InMemorySessionStore
+
+def test_get_returns_a_copy():
+    store = InMemorySessionStore(max_entries=10, max_bytes=1024 * 1024, ttl_seconds=60)
+    store.set("s1", {"session_id": "s1", "messages": [{"role": "user", "content": "hi"}]})
+    state = store.get("s1")
+    state["messages"].append({"role": "assistant", "content": "hello"})
+    state["patient_data"] = {"id": 1}
+    assert store.get("s1") == {"session_id": "s1", "messages": [{"role": "user", "content": "hi"}]}
@@ -0,0 +1,77 @@
+import datetime
+import os
+import sys
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.db import SessionLocal
+from app.models import Interaction, Session as DbSession
+from app.snapshots import interactions_after, load_snapshot, snapshot_writer
+
+START = datetime.datetime(2024, 1, 1, 9, 0)
+
+def _at(minutes):
+    return START + datetime.timedelta(minutes=minutes)
+
+def _apply(*items):
+    db = SessionLocal()
+    try:
+        for item in items:
+            if callable(item):
+                item(db)
+            else:
+                db.add(item)
+            db.flush()
+        db.commit()
+    finally:
+        db.close()
+
+def _load(session_id):
+    db = SessionLocal()
+    try:
+        return load_snapshot(db, session_id)
+    finally:
+        db.close()
+
+def _state(*texts):
+    return {"session_id": "s1", "messages": [{"role": "user", "content": t} for t in texts],
+            "handoff_to_clinical": False}
+
+def test_snapshot_is_created_then_updated_with_a_new_version(database):
+    _apply(DbSession(id="s1", started_at=START), snapshot_writer("s1", _state("hi"), _at(1)))
+    _apply(snapshot_writer("s1", _state("hi", "I'm John Smith"), _at(2)))
+    snapshot = _load("s1")
+    assert snapshot.version == 2
+    assert snapshot.last_interaction_at == _at(2)
+    assert [m["content"] for m in snapshot.state["messages"]] == ["hi", "I'm John Smith"]
+
+def test_older_snapshot_never_overwrites_a_newer_one(database):
+    _apply(DbSession(id="s1", started_at=START), snapshot_writer("s1", _state("hi", "newer"), _at(2)))
+    _apply(snapshot_writer("s1", _state("hi"), _at(1)))
+    snapshot = _load("s1")
+    assert (snapshot.version, snapshot.last_interaction_at) == (1, _at(2))
+
+def test_writer_keeps_the_state_as_it_was_when_queued(database):
+    state = _state("hi")
+    write = snapshot_writer("s1", state, _at(1))
+    state["messages"].append({"role": "user", "content": "added later"})
+    _apply(DbSession(id="s1", started_at=START), write)
+    assert len(_load("s1").state["messages"]) == 1
+
+def test_snapshot_in_an_old_format_is_ignored(database, monkeypatch):
+    _apply(DbSession(id="s1", started_at=START), snapshot_writer("s1", _state("hi"), _at(1)))
+    monkeypatch.setattr("app.snapshots.SNAPSHOT_FORMAT", 2)
+    assert _load("s1") is None
+
+def test_interactions_after_returns_only_the_tail_in_order(database):
+    _apply(DbSession(id="s1", started_at=START), *[
+        Interaction(session_id="s1", role="user" if i % 2 == 0 else "assistant", message=f"m{i}", timestamp=_at(i))
+        for i in (3, 1, 2, 4)
+    ])
+    db = SessionLocal()
+    try:
+        assert [i.message for i in interactions_after(db, "s1")] == ["m1", "m2", "m3", "m4"]
+        assert [i.message for i in interactions_after(db, "s1", _at(2))] == ["m3", "m4"]
+    finally:
+        db.close()
@@ -0,0 +1,113 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.rag.vector_index import MmapVectorIndex, build_index, current_build
+
+class FakeEmbeddings:
+    """Maps each query string to a fixed vector."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+def _corpus(n=40, dim=8, seed=1):
+    # Four well separated clusters so IVF partitions are predictable
+    rng = np.random.default_rng(seed)
+    centers = np.eye(dim, dtype=np.float32)[:4]
+    embeddings = np.stack([centers[i % 4] + rng.normal(0, 0.05, dim) for i in range(n)]).astype(np.float32)
+    ids = [f"chunk-{i}" for i in range(n)]
+    texts = [f"text {i}" for i in range(n)]
+    metadatas = [{"source": f"doc-{i % 4}"} for i in range(n)]
+    return ids, texts, metadatas, embeddings
+
+def _nearest(embeddings, query):
+    unit = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return int(np.argmax(unit @ (query / np.linalg.norm(query))))
+
+def test_missing_index_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        MmapVectorIndex(str(tmp_path / "none"), FakeEmbeddings({}))
+
+def test_flat_search_returns_nearest_chunk(tmp_path):
+    ids, texts, metadatas, embeddings = _corpus()
+    build_index(str(tmp_path), ids, texts, metadatas, embeddings)
+    query = embeddings[7] + 0.01
+    index = MmapVectorIndex(str(tmp_path), FakeEmbeddings({"q": query}))
+
+    assert len(index) == len(ids)
+    results = index.similarity_search_with_relevance_scores("q", k=3)
+    doc, score = results[0]
+    assert doc.metadata["chunk_id"] == ids[_nearest(embeddings, query)]
+    assert doc.page_content == texts[_nearest(embeddings, query)]
+    assert score == pytest.approx(1.0, abs=0.01)
+    assert [s for _, s in results] == sorted((s for _, s in results), reverse=True)
+
+def test_ivf_search_matches_flat_search(tmp_path):
+    ids, texts, metadatas, embeddings = _corpus()
+    flat = tmp_path / "flat"
+    ivf = tmp_path / "ivf"
+    build_index(str(flat), ids, texts, metadatas, embeddings)
+    build_dir = build_index(str(ivf), ids, texts, metadatas, embeddings, nlist=4)
+    assert os.path.exists(os.path.join(build_dir, "centroids.npy"))
+
+    queries = {f"q{i}": embeddings[i] for i in (0, 5, 13, 22)}
+    flat_index = MmapVectorIndex(str(flat), FakeEmbeddings(queries))
+    ivf_index = MmapVectorIndex(str(ivf), FakeEmbeddings(queries), nprobe=4)
+    for query in queries:
+        expected = [d.metadata["chunk_id"] for d in flat_index.similarity_search(query, k=5)]
+        assert [d.metadata["chunk_id"] for d in ivf_index.similarity_search(query, k=5)] == expected
+
+def test_small_corpus_skips_ivf(tmp_path):
+    ids, texts, metadatas, embeddings = _corpus(n=6)
+    build_dir = build_index(str(tmp_path), ids, texts, metadatas, embeddings, nlist=4)
+
+    assert not os.path.exists(os.path.join(build_dir, "centroids.npy"))
+    assert MmapVectorIndex(str(tmp_path), FakeEmbeddings({})).header["nlist"] == 0
+
+def test_float16_build_searches(tmp_path):
+    ids, texts, metadatas, embeddings = _corpus()
+    build_index(str(tmp_path), ids, texts, metadatas, embeddings, dtype="float16")
+    index = MmapVectorIndex(str(tmp_path), FakeEmbeddings({"q": embeddings[3]}))
+
+    assert index._vectors.dtype == np.float16
+    assert index.similarity_search("q", k=1)[0].metadata["chunk_id"] == "chunk-3"
+
+def test_get_returns_every_chunk(tmp_path):
+    ids, texts, metadatas, embeddings = _corpus(n=12)
+    build_index(str(tmp_path), ids, texts, metadatas, embeddings, nlist=2)
+    data = MmapVectorIndex(str(tmp_path), FakeEmbeddings({})).get(include=["documents", "metadatas"])
+
+    # IVF builds store rows grouped by partition, so compare as sets
+    assert sorted(zip(data["ids"], data["documents"])) == sorted(zip(ids, texts))
+    assert {m["source"] for m in data["metadatas"]} == {m["source"] for m in metadatas}
+
+def test_rebuild_publishes_new_build_and_keeps_old_mapping(tmp_path):
+    ids, texts, metadatas, embeddings = _corpus(n=8)
+    first = build_index(str(tmp_path), ids, texts, metadatas, embeddings)
+    old = MmapVectorIndex(str(tmp_path), FakeEmbeddings({"q": embeddings[0]}))
+
+    second = build_index(str(tmp_path), ids[:4], texts[:4], metadatas[:4], embeddings[:4])
+
+    assert current_build(str(tmp_path)) == second != first
+    assert not os.path.exists(first)
+    assert not os.path.exists(os.path.join(str(tmp_path), "CURRENT.tmp"))
+    assert len(MmapVectorIndex(str(tmp_path), FakeEmbeddings({}))) == 4
+    # A worker that mapped the old build keeps serving from it
+    assert len(old) == 8
+    assert old.similarity_search("q", k=1)[0].metadata["chunk_id"] == "chunk-0"
+
+def test_empty_build(tmp_path):
+    build_index(str(tmp_path), [], [], [], np.zeros((0, 8), dtype=np.float32))
+    index = MmapVectorIndex(str(tmp_path), FakeEmbeddings({"q": np.ones(8)}))
+
+    assert len(index) == 0
+    assert index.similarity_search("q") == []
+    assert index.get()["ids"] == []
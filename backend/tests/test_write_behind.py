@@ -0,0 +1,90 @@
+import datetime
+import os
+import sys
+import time
+
+from sqlalchemy import update
+
+# Add backend directory to path so we can import app modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.db import SessionLocal
+from app.models import AgentEvent, Patient, Session as DbSession
+from app.write_behind import WriteBehindWriter
+
+def _writer():
+    return WriteBehindWriter(batch_size=200, flush_interval=1.0, max_queue=100, enqueue_timeout=1.0)
+
+def _setup():
+    db = SessionLocal()
+    db.add(Patient(id=7, name="Test Patient", discharge_date=datetime.date(2024, 1, 1),
+                   primary_diagnosis="CKD Stage 3", medications=[]))
+    db.commit()
+    db.close()
+
+def _patient_link(session_id: str):
+    db = SessionLocal()
+    try:
+        return db.get(DbSession, session_id).patient_id
+    finally:
+        db.close()
+
+def test_flush_keeps_fifo_order_with_a_batch_being_collected(database):
+    _setup()
+    writer = _writer()
+    try:
+        # The writer thread picks up the session row and waits for its batch to fill
+        writer.submit(DbSession(id="s1", started_at=datetime.datetime.utcnow()))
+        time.sleep(0.1)
+        # The patient link queued after it must not be committed first
+        writer.submit(update(DbSession).where(DbSession.id == "s1", DbSession.patient_id.is_(None))
+                      .values(patient_id=7))
+        writer.flush()
+        assert _patient_link("s1") == 7
+    finally:
+        writer.stop()
+
+def test_writer_thread_commits_in_order(database):
+    _setup()
+    writer = _writer()
+    try:
+        for i in range(20):
+            writer.submit(DbSession(id=f"s{i}", started_at=datetime.datetime.utcnow()))
+            writer.submit(update(DbSession).where(DbSession.id == f"s{i}").values(patient_id=7))
+        deadline = time.monotonic() + 5
+        while writer.stats()["written"] < 40 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert all(_patient_link(f"s{i}") == 7 for i in range(20))
+    finally:
+        writer.stop()
+
+def _stalled_writer(monkeypatch):
+    # No writer thread, so the one-slot queue stays full
+    writer = WriteBehindWriter(batch_size=200, flush_interval=1.0, max_queue=1, enqueue_timeout=0.05)
+    monkeypatch.setattr(writer, "_ensure_started", lambda: None)
+    return writer
+
+def test_full_queue_writes_transcript_rows_through_in_order(database, monkeypatch):
+    _setup()
+    writer = _stalled_writer(monkeypatch)
+    writer.submit(DbSession(id="s1", started_at=datetime.datetime.utcnow()))
+    writer.submit(update(DbSession).where(DbSession.id == "s1").values(patient_id=7))
+    # Written in the caller's thread, after the session row queued before it
+    assert _patient_link("s1") == 7
+    assert writer.stats()["written_through"] == 1 and writer.stats()["dropped"] == 0
+
+def test_full_queue_drops_telemetry(database, monkeypatch):
+    _setup()
+    writer = _stalled_writer(monkeypatch)
+    writer.submit(DbSession(id="s1", started_at=datetime.datetime.utcnow()))
+    writer.submit(AgentEvent(session_id="s1", agent="clinical", event_type="turn_timing", details={}), droppable=True)
+    writer.submit_nowait(AgentEvent(session_id="s1", agent="clinical", event_type="turn_timing", details={}))
+    assert writer.stats()["dropped"] == 2
+
+def test_sync_mode_writes_on_every_submit_path(database):
+    _setup()
+    writer = WriteBehindWriter(batch_size=200, flush_interval=1.0, max_queue=100, enqueue_timeout=1.0, sync=True)
+    writer.submit(DbSession(id="s1", started_at=datetime.datetime.utcnow()))
+    writer.submit_nowait(update(DbSession).where(DbSession.id == "s1").values(patient_id=7))
+    assert _patient_link("s1") == 7
+    assert writer._thread is None